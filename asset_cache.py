@@ -0,0 +1,156 @@
+import argparse
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+# --- COMPILED ASSET CACHE ---
+# trains.json and schedules.json are parsed once into Parquet files under CACHE_DIR.
+# The API (lifespan), the simulator and the network map builder load those instead of
+# the raw Kaggle JSON, and the cache is rebuilt whenever the source files change.
+SOURCE_FILES = ('trains.json', 'schedules.json')
+ASSET_TABLES = ('trains', 'schedules', 'clean_schedules')
+CACHE_DIR = "compiled_assets"
+MANIFEST_FILE = "manifest.json"
+# Bump when the compiled layout or the cleaning rules change, so old caches are rebuilt.
+CACHE_FORMAT_VERSION = 1
+
+# Same rules as int(parts[0]) / int(parts[1]) after time_str.split(':'): anything else is unparseable.
+SCHEDULE_TIME_PATTERN = r'^\s*([+-]?\d+)\s*:\s*([+-]?\d+)\s*(?::|$)'
+
+def schedule_times_to_minutes(time_strings, days):
+    """Vectorized 'HH:MM:SS' on day N -> minutes since 00:00 of day 1; NaN for 'None' or bad input."""
+    # A timetable has at most a few thousand distinct time strings, so parse those once and broadcast.
+    codes, unique_times = pd.factorize(time_strings.astype(str), use_na_sentinel=False)
+    hours_minutes = pd.Series(unique_times).str.extract(SCHEDULE_TIME_PATTERN)
+    time_of_day = (pd.to_numeric(hours_minutes[0]) * 60 + pd.to_numeric(hours_minutes[1])).to_numpy()
+    return ((days - 1) * 1440) + pd.Series(time_of_day[codes], index=time_strings.index)
+
+def clean_schedules(schedules_df):
+    """
+    Adds arrival_minutes / departure_minutes to the raw schedules.json frame, fills gaps
+    within each train (departures forward, arrivals backward, then from each other) and
+    drops the stops that still have no usable time.
+    """
+    schedules_df['train_number'] = schedules_df['train_number'].astype(str)
+    schedules_df['arrival_minutes'] = schedule_times_to_minutes(schedules_df['arrival'], schedules_df['day'])
+    schedules_df['departure_minutes'] = schedule_times_to_minutes(schedules_df['departure'], schedules_df['day'])
+
+    by_train = schedules_df.groupby('train_number')
+    schedules_df['departure_minutes'] = by_train['departure_minutes'].ffill()
+    schedules_df['arrival_minutes'] = by_train['arrival_minutes'].bfill()
+
+    schedules_df['arrival_minutes'] = schedules_df['arrival_minutes'].fillna(schedules_df['departure_minutes'])
+    schedules_df['departure_minutes'] = schedules_df['departure_minutes'].fillna(schedules_df['arrival_minutes'])
+
+    return schedules_df.dropna(subset=['arrival_minutes', 'departure_minutes'])
+
+def parse_trains(trains_data):
+    """One row per train with a number: number, type (defaulting to 'Express' like the API) and zone."""
+    rows = [
+        {
+            'number': None if train['properties']['number'] is None else str(train['properties']['number']),
+            'type': train['properties'].get('type', 'Express'),
+            'zone': train['properties'].get('zone'),
+        }
+        for train in trains_data['features'] if 'number' in train['properties']
+    ]
+    return pd.DataFrame(rows, columns=['number', 'type', 'zone'])
+
+def source_fingerprint(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _read_manifest(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, MANIFEST_FILE), 'r') as f: return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+def _cache_is_current(manifest, source_dir):
+    """
+    Compares the manifest against the source files. File size and mtime are checked first
+    so an unchanged boot skips hashing; a touched-but-identical file still matches by hash.
+    """
+    if not manifest or manifest.get('format_version') != CACHE_FORMAT_VERSION: return False
+    for name in SOURCE_FILES:
+        recorded, path = manifest['sources'].get(name), os.path.join(source_dir, name)
+        if recorded is None: return False
+        stat = os.stat(path)
+        if (stat.st_size, stat.st_mtime_ns) == (recorded['size'], recorded['mtime_ns']): continue
+        if source_fingerprint(path) != recorded['sha256']: return False
+    return True
+
+def parse_sources(source_dir="."):
+    """The uncached path: parses the raw Kaggle JSON into the same tables the cache holds."""
+    with open(os.path.join(source_dir, 'trains.json'), 'r', encoding='utf-8') as f:
+        trains_df = parse_trains(json.load(f))
+    schedules_df = pd.read_json(os.path.join(source_dir, 'schedules.json'))
+    schedules_df['train_number'] = schedules_df['train_number'].astype(str)
+    return {'trains': trains_df, 'schedules': schedules_df, 'clean_schedules': clean_schedules(schedules_df.copy())}
+
+def compile_assets(source_dir=".", cache_dir=CACHE_DIR):
+    """Parses the raw Kaggle JSON once and writes the derived tables to Parquet."""
+    print("  -> Compiling trains.json and schedules.json into the asset cache...")
+    sources = {}
+    for name in SOURCE_FILES:
+        path = os.path.join(source_dir, name)
+        stat = os.stat(path)
+        sources[name] = {'sha256': source_fingerprint(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    assets = parse_sources(source_dir)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    try:
+        for name, df in assets.items():
+            # Write-then-rename, so workers compiling at the same time never see a half-written file.
+            path = os.path.join(cache_dir, f'{name}.parquet')
+            df.to_parquet(f"{path}.{os.getpid()}.tmp")
+            os.replace(f"{path}.{os.getpid()}.tmp", path)
+    except ImportError as e:
+        print(f"  -> [Warning] Could not write the asset cache (Parquet support missing: {e}). Using the parsed JSON directly.")
+        return assets
+
+    # The manifest is written last, so an interrupted compile is never mistaken for a valid cache.
+    manifest_path = os.path.join(cache_dir, MANIFEST_FILE)
+    with open(f"{manifest_path}.{os.getpid()}.tmp", 'w') as f:
+        json.dump({'format_version': CACHE_FORMAT_VERSION, 'sources': sources}, f, indent=2)
+    os.replace(f"{manifest_path}.{os.getpid()}.tmp", manifest_path)
+    print(f"  -> Asset cache written to '{cache_dir}' ({len(assets['trains'])} trains, {len(assets['schedules'])} schedule entries).")
+    return assets
+
+def load_compiled_assets(source_dir=".", cache_dir=CACHE_DIR, tables=ASSET_TABLES):
+    """
+    Returns the requested tables out of 'trains', 'schedules' and 'clean_schedules' as
+    DataFrames, memory-mapped from the Parquet cache when it matches the source files and
+    recompiled when it does not. If the raw JSON is not deployed at all, an existing cache
+    is used as-is. Pass only the tables you use: each one costs a read and its memory per process.
+    """
+    unknown = set(tables) - set(ASSET_TABLES)
+    if unknown: raise ValueError(f"Unknown asset tables {sorted(unknown)}; expected some of {ASSET_TABLES}.")
+    manifest = _read_manifest(cache_dir)
+    sources_present = all(os.path.isfile(os.path.join(source_dir, name)) for name in SOURCE_FILES)
+    if manifest and not sources_present:
+        print("  -> Source JSON not found; using the existing asset cache as-is.")
+    elif not _cache_is_current(manifest, source_dir):
+        assets = compile_assets(source_dir, cache_dir)
+        return {name: assets[name] for name in tables}
+
+    return {
+        name: pd.read_parquet(os.path.join(cache_dir, f'{name}.parquet'), memory_map=True)
+        for name in tables
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile trains.json / schedules.json into the Parquet asset cache.")
+    parser.add_argument("--source-dir", default=".")
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    parser.add_argument("--force", action="store_true", help="Rebuild even if the cache matches the source files.")
+    args = parser.parse_args()
+    if args.force or not _cache_is_current(_read_manifest(args.cache_dir), args.source_dir):
+        compile_assets(args.source_dir, args.cache_dir)
+    else:
+        print(f"  -> Asset cache in '{args.cache_dir}' is up to date.")
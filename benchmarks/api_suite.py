@@ -0,0 +1,146 @@
+"""
+End-to-end benchmark of train_and_serve on synthetic fixtures.
+
+Builds a throwaway working directory with synthetic trains.json / schedules.json (see
+benchmarks.fixtures), trains small models there, then measures:
+  - simulate_realistic_data and API startup (the lifespan handler),
+  - get_full_prediction called directly,
+  - /predict/all, /propose_reroute, /compare_efficiency and /optimize_departure through
+    an in-process TestClient, one request at a time for --seconds each.
+Each row reports calls/s and p50/p95/p99 latency, followed by the per-stage totals from the
+API's /metrics histograms. Inputs are drawn from a seeded RNG, so runs are comparable.
+
+The prediction cache is disabled unless --with-cache is given, so repeated inputs still
+measure the models. Other settings (MICRO_BATCH_WINDOW_MS, INFERENCE_EXECUTOR, ...) are
+read from the environment as usual.
+
+Usage: python -m benchmarks.api_suite [--trains 300] [--seconds 3] [--json results.json]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import time
+
+import numpy as np
+
+from benchmarks.fixtures import synthetic_workdir
+from simulation_constants import SIM_DAYS, SIM_WEATHER_CONDITIONS
+
+
+def summarize(name, durations):
+    """Throughput of back-to-back calls and latency percentiles."""
+    p50, p95, p99 = np.percentile(np.array(durations) * 1000, [50, 95, 99])
+    return {"name": name, "calls": len(durations), "per_second": len(durations) / float(np.sum(durations)), "p50_ms": p50, "p95_ms": p95, "p99_ms": p99}
+
+
+def run_for(seconds, call, make_input, min_calls=5):
+    """Calls call(make_input()) back to back for `seconds` (at least min_calls times); returns per-call durations."""
+    durations, stop_at = [], time.perf_counter() + seconds
+    while time.perf_counter() < stop_at or len(durations) < min_calls:
+        payload = make_input()
+        start = time.perf_counter()
+        call(payload)
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def quietly(fn, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return fn(*args, **kwargs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trains", type=int, default=300, help="Synthetic trains in the fixture files.")
+    parser.add_argument("--training-trains", type=int, default=300, help="Simulated journeys used to train the models.")
+    parser.add_argument("--seconds", type=float, default=3.0, help="Measurement time per endpoint.")
+    parser.add_argument("--startups", type=int, default=5, help="Number of timed API startups.")
+    parser.add_argument("--with-cache", action="store_true", help="Keep the prediction cache enabled.")
+    parser.add_argument("--json", help="Also write the results to this file.")
+    args = parser.parse_args()
+
+    if not args.with_cache: os.environ["PREDICTION_CACHE_SIZE"] = "0"
+    json_path = os.path.abspath(args.json) if args.json else None
+    results = []
+    with synthetic_workdir(args.trains) as workdir:
+        import train_and_serve as service
+        from fastapi.testclient import TestClient
+
+        with open("network_map.json") as f: network_map = json.load(f)
+        random.seed(0)
+        sim_durations = []
+        for _ in range(3):
+            start = time.perf_counter()
+            quietly(service.simulate_realistic_data, network_map, 500, 5)
+            sim_durations.append(time.perf_counter() - start)
+        results.append(summarize("simulate_realistic_data(500 trains)", sim_durations))
+
+        print(f"Training models on {args.training_trains} simulated journeys in {workdir} ...")
+        random.seed(0)
+        np.random.seed(0)
+        quietly(service.train_all_models, args.training_trains)
+
+        startup_durations = []
+        for _ in range(args.startups):
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()), TestClient(service.app):
+                startup_durations.append(time.perf_counter() - start)
+        results.append(summarize("lifespan startup", startup_durations))
+
+        rng = random.Random(0)
+        stations = sorted(network_map)
+        train_numbers = [str(10000 + i) for i in range(args.trains)]
+
+        def train_info():
+            return {
+                "train_number": rng.choice(train_numbers), "track_section": rng.choice(stations),
+                "day_of_week": rng.choice(SIM_DAYS), "hour_of_day": rng.randrange(24),
+                "weather_condition": rng.choice(SIM_WEATHER_CONDITIONS), "trains_in_section_hour": rng.randint(1, 9),
+            }
+
+        with contextlib.redirect_stdout(io.StringIO()), TestClient(service.app) as client:
+            schedule_index = service.models['schedule_index']
+            routable = [number for number, schedule in schedule_index.items() if len(schedule['stations']) >= 4]
+
+            def route_request():
+                number = rng.choice(routable)
+                stations_in_order = list(schedule_index[number]['stations'])
+                first = rng.randrange(len(stations_in_order) - 2)
+                return {"route": stations_in_order[first:first + 3], "train_info": {**train_info(), "train_number": number}}
+
+            def departure_request():
+                return {"conflicting_train_1": train_info(), "conflicting_train_2": train_info(), "next_section": rng.choice(stations)}
+
+            def post(path):
+                def call(payload):
+                    response = client.post(path, json=payload)
+                    assert response.status_code == 200 and "error" not in response.json(), response.text
+                return call
+
+            results.append(summarize("get_full_prediction", run_for(args.seconds, service.get_full_prediction, lambda: service.TrainInfo(**train_info()))))
+            for path, make_input in [
+                ("/predict/all", train_info),
+                ("/propose_reroute", train_info),
+                ("/compare_efficiency", route_request),
+                ("/optimize_departure", departure_request),
+            ]:
+                results.append(summarize(path, run_for(args.seconds, post(path), make_input)))
+            stages = service.stage_seconds.summary()
+
+    print(f"\n{'benchmark':<38} {'calls':>6} {'per s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for row in results:
+        print(f"{row['name']:<38} {row['calls']:>6} {row['per_second']:>9.1f} {row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f} {row['p99_ms']:>9.2f}")
+    print(f"\n{'stage (from /metrics)':<38} {'calls':>6} {'mean ms':>9}")
+    for stage, (count, total) in sorted(stages.items()):
+        print(f"{stage:<38} {count:>6} {total / count * 1000:>9.3f}")
+
+    if json_path:
+        with open(json_path, "w") as f:
+            json.dump({"results": results, "stages": {stage: {"calls": c, "seconds": s} for stage, (c, s) in stages.items()}}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
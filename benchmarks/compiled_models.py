@@ -0,0 +1,114 @@
+"""
+Original vs compiled congestion / anomaly models (see compiled_models.py) on synthetic
+fixtures: trains small models in a throwaway working directory (train_all_models also
+exports compiled_models.pkl there), then scores freshly simulated rows with both and
+reports disagreeing rows, size, and latency per batch size, then what each serving
+configuration costs a worker in private (non-shared) resident memory, measured in a fresh
+process that loads the model set and scores one small and one large batch.
+
+The compiled models win on small batches only. Measured on 1 CPU, the forest breaks even at
+about 128 rows and the IsolationForest at about 192-256 rows; at 2048 rows they are 2.2x and
+4x slower. The API therefore serves batches above COMPILED_MODEL_MAX_ROWS (default 128,
+model_registry.COMPILED_MAX_ROWS) from the originals, which a worker only loads once such a
+batch arrives; the "served" column shows that routing and the last line of each table the
+measured crossover.
+
+Usage: python -m benchmarks.compiled_models [--training-trains 500] [--batch-sizes 1 8 32 128 512 2048]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+
+import joblib
+import numpy as np
+
+from benchmarks.fixtures import REPO_ROOT, synthetic_workdir
+
+# Run in a fresh interpreter per configuration: argv is runtime, compiled_max_rows (0 = None), large batch rows.
+MEMORY_PROBE = """
+import json, sys
+import joblib, lightgbm, sklearn.ensemble, sklearn.preprocessing
+from model_registry import ModelRegistry, private_memory_bytes
+
+runtime, max_rows, large_rows = sys.argv[1], int(sys.argv[2]) or None, int(sys.argv[3])
+rows = joblib.load("probe_rows.pkl")
+baseline = private_memory_bytes()
+registry = ModelRegistry(runtime=runtime, compiled_max_rows=max_rows)
+registry.load()
+model_set, usage = registry.current(), {}
+for label, n in (("loaded", 0), ("small batch", 1), ("large batch", large_rows)):
+    if n:
+        model_set['congestion'].predict(rows['X'][:n])
+        model_set['anomaly'].predict(model_set['scaler'].transform(rows['anomaly_features'][:n]))
+    usage[label] = (private_memory_bytes() - baseline) / 1e6
+print(json.dumps(usage))
+"""
+
+
+def private_memory_per_worker(runtime, max_rows, large_rows):
+    """{stage: private MB over a bare interpreter} for one serving configuration."""
+    result = subprocess.run(
+        [sys.executable, "-W", "ignore", "-c", MEMORY_PROBE, runtime, str(max_rows), str(large_rows)],
+        capture_output=True, text=True, check=True, env={**os.environ, "PYTHONPATH": REPO_ROOT},
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trains", type=int, default=300, help="Synthetic trains in the fixture files.")
+    parser.add_argument("--training-trains", type=int, default=500, help="Simulated journeys used to train the models.")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32, 128, 512, 2048])
+    args = parser.parse_args()
+
+    with synthetic_workdir(args.trains) as workdir:
+        import train_and_serve as service
+        from compiled_models import check_agreement
+        from model_registry import COMPILED_MAX_ROWS, COMPILED_MODEL_FILE, MODEL_FILES
+
+        print(f"Training models on {args.training_trains} simulated journeys in {workdir} ...")
+        random.seed(0)
+        np.random.seed(0)
+        with contextlib.redirect_stdout(io.StringIO()):
+            service.train_all_models(args.training_trains)
+            with open("network_map.json") as f: network_map = json.load(f)
+            rows = service.simulate_realistic_data(network_map, max(args.batch_sizes) // 5 + 1, 5)
+
+        originals = {name: joblib.load(filename) for name, filename in MODEL_FILES.items()}
+        service.prepare_model_set(originals)
+        compiled = joblib.load(COMPILED_MODEL_FILE)['models']
+        X = originals['feature_encoder'].encode(rows[service.CAT_FEATURES + service.NUM_FEATURES].to_dict('records'))
+        anomaly_features = rows[['delay_minutes', 'trains_in_section_hour']]
+
+        reports = [check_agreement(originals, compiled, X, anomaly_features, batch_rows=size) for size in args.batch_sizes]
+
+        joblib.dump({'X': X, 'anomaly_features': anomaly_features}, "probe_rows.pkl")
+        configurations = [("sklearn", 0), ("compiled", 0), ("compiled", COMPILED_MAX_ROWS)]
+        memory = {(runtime, max_rows): private_memory_per_worker(runtime, max_rows, max(args.batch_sizes)) for runtime, max_rows in configurations}
+
+    first = reports[0]
+    print(f"\nDisagreeing rows out of {first['rows']}: congestion {first['congestion_mismatches']}, anomaly {first['anomaly_mismatches']}")
+    for name in ("congestion", "anomaly"):
+        print(f"\n{name}: {first[f'{name}_original_bytes'] / 1e6:.2f} MB pickled -> {first[f'{name}_compiled_bytes'] / 1e6:.2f} MB of compiled arrays")
+        print(f"{'rows':>6} {'original ms':>12} {'compiled ms':>12} {'speedup':>8} {'served ms':>10}")
+        for report in reports:
+            original, compiled_ms = report[f'{name}_original_batch_ms'], report[f'{name}_compiled_batch_ms']
+            served = compiled_ms if report['batch_rows'] <= COMPILED_MAX_ROWS else original
+            print(f"{report['batch_rows']:>6} {original:>12.2f} {compiled_ms:>12.2f} {original / compiled_ms:>7.2f}x {served:>10.2f}")
+        slower = [report['batch_rows'] for report in reports if report[f'{name}_compiled_batch_ms'] >= report[f'{name}_original_batch_ms']]
+        print(f"compiled no longer faster from {slower[0]} rows (served compiled up to {COMPILED_MAX_ROWS})" if slower else "compiled faster at every batch size measured")
+
+    print(f"\nPrivate resident memory per worker, MB (large batch: {max(args.batch_sizes)} rows)")
+    print(f"{'configuration':<50} {'loaded':>8} {'small batch':>12} {'large batch':>12}")
+    for (runtime, max_rows), usage in memory.items():
+        name = f"MODEL_RUNTIME={runtime}" + (f" COMPILED_MODEL_MAX_ROWS={max_rows}" if runtime == "compiled" else "")
+        print(f"{name:<50} {usage['loaded']:>8.1f} {usage['small batch']:>12.1f} {usage['large batch']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Departure sequencing for N = 2..12 contending trains: Held-Karp DP vs beam search on
+seeded random delay tables shaped like the ones /sequence_departures scores. Reports the
+model rows one batch needs, search time for both methods, and the beam's mean and
+worst gap to the optimum. Up to 8 trains the DP result is also checked against every
+permutation.
+
+Usage: python -m benchmarks.departure_sequencing [--instances 20] [--beam-width 64]
+"""
+import argparse
+import itertools
+import time
+
+import numpy as np
+
+from departure_sequencer import beam_search, held_karp, order_cost
+
+
+def random_tables(rng, n):
+    """Delays like the model's: per-train base delay, plus noise for the traffic each order implies."""
+    base = rng.uniform(0, 25, n)
+    first_costs = np.round(base + rng.normal(0, 2, n).clip(-base, None), 2)
+    follow_costs = np.round(base[None, :] + rng.uniform(0, 8, (n, n)), 2)
+    return first_costs, follow_costs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--instances", type=int, default=20)
+    parser.add_argument("--beam-width", type=int, default=64)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'N':>3} {'rows':>5} {'exact ms':>9} {'beam ms':>8} {'mean gap':>9} {'max gap':>8}")
+    for n in range(2, 13):
+        exact_seconds, beam_seconds, gaps = [], [], []
+        for _ in range(args.instances):
+            first_costs, follow_costs = random_tables(rng, n)
+
+            start = time.perf_counter()
+            order, cost = held_karp(first_costs, follow_costs)
+            exact_seconds.append(time.perf_counter() - start)
+            assert sorted(order) == list(range(n)) and abs(order_cost(order, first_costs, follow_costs) - cost) < 1e-9
+            if n <= 8:
+                brute_force = min(order_cost(list(p), first_costs, follow_costs) for p in itertools.permutations(range(n)))
+                assert abs(brute_force - cost) < 1e-9
+
+            start = time.perf_counter()
+            _, beam_cost = beam_search(first_costs, follow_costs, args.beam_width)
+            beam_seconds.append(time.perf_counter() - start)
+            gaps.append(max(0.0, beam_cost / cost - 1) if cost else 0.0)
+
+        # n first-departure rows plus one "after train i" row per ordered pair (before de-duplication)
+        rows = n + n * (n - 1)
+        print(f"{n:>3} {rows:>5} {np.median(exact_seconds) * 1e3:>9.2f} {np.median(beam_seconds) * 1e3:>8.2f} {np.mean(gaps):>8.2%} {max(gaps):>7.2%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+The nightly efficiency report two ways on synthetic fixtures: one /compare_efficiency call per
+SR/SWR train over its whole timetable, as the reports job does today, versus a single streamed
+/efficiency_report (NDJSON and Parquet). Both run with the same fixed conditions (hour 10, Friday,
+Rain), so the NDJSON rows are also checked against the per-route answers.
+
+Usage: python -m benchmarks.efficiency_report [--trains 2000] [--training-trains 300]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import time
+
+import numpy as np
+
+from benchmarks.fixtures import synthetic_workdir
+
+REPORT_KEYS = ['railway_scheduled_time_minutes', 'ai_predicted_travel_time_minutes', 'ai_predicted_delay_minutes', 'efficiency_score']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trains", type=int, default=2000, help="Synthetic trains in the fixture files.")
+    parser.add_argument("--training-trains", type=int, default=300, help="Simulated journeys used to train the models.")
+    args = parser.parse_args()
+
+    os.environ["PREDICTION_CACHE_SIZE"] = "0"
+    rows = []
+    with synthetic_workdir(args.trains) as workdir:
+        import train_and_serve as service
+        from fastapi.testclient import TestClient
+
+        print(f"Training models on {args.training_trains} simulated journeys in {workdir} ...")
+        random.seed(0)
+        np.random.seed(0)
+        with contextlib.redirect_stdout(io.StringIO()):
+            service.train_all_models(args.training_trains)
+
+        with contextlib.redirect_stdout(io.StringIO()), TestClient(service.app) as client:
+            report_request = {"hour_of_day": 10, "day_of_week": "Friday", "weather_condition": "Rain", "trains_in_section_hour": 3}
+            for report_format in ("ndjson", "parquet"):
+                start = time.perf_counter()
+                response = client.post("/efficiency_report", json={**report_request, "format": report_format})
+                rows.append((f"/efficiency_report ({report_format})", int(response.headers["X-Report-Trains"]), time.perf_counter() - start, len(response.content)))
+                if report_format == "ndjson": bulk = [json.loads(line) for line in response.text.splitlines()]
+
+            schedule_index, per_route, start = service.models['schedule_index'], {}, time.perf_counter()
+            for row in bulk:
+                train_info = {**report_request, "train_number": row["train_number"], "track_section": row["origin"]}
+                route = list(schedule_index[row["train_number"]]['stations'])
+                per_route[row["train_number"]] = client.post("/compare_efficiency", json={"route": route, "train_info": train_info}).json()
+            rows.insert(0, ("/compare_efficiency per train", len(per_route), time.perf_counter() - start, None))
+
+    mismatches = sum(any(abs(per_route[row["train_number"]].get(key, np.nan) - row[key]) > 1e-9 for key in REPORT_KEYS) for row in bulk)
+    print(f"\nTrains whose bulk row differs from /compare_efficiency: {mismatches} of {len(bulk)}")
+    print(f"{'run':<34} {'trains':>7} {'seconds':>9} {'trains/s':>10} {'bytes':>10}")
+    for name, trains, seconds, size in rows:
+        print(f"{name:<34} {trains:>7} {seconds:>9.2f} {trains / seconds:>10.0f} {size if size is not None else '':>10}")
+
+
+if __name__ == "__main__":
+    main()
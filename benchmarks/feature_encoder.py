@@ -0,0 +1,62 @@
+"""
+Per-row encode cost: DataFrame + OneHotEncoder.transform + hstack vs FeatureEncoder.
+Both outputs are checked for exact equality first, including unknown categories and
+zero-valued numerical features.
+
+Usage: python -m benchmarks.feature_encoder
+"""
+import random
+import timeit
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import hstack
+from sklearn.preprocessing import OneHotEncoder
+
+from benchmarks.fixtures import load_repo_network_map
+from feature_encoder import FeatureEncoder
+from simulation_constants import SIM_DAYS, SIM_TRAIN_TYPES, SIM_WEATHER_CONDITIONS
+from train_and_serve import CAT_FEATURES, NUM_FEATURES
+
+
+def random_rows(rng, stations, n):
+    return [{
+        'train_type': rng.choice(SIM_TRAIN_TYPES + ["Unknown"]), 'track_section': rng.choice(stations + ["NOT_A_STATION"]),
+        'day_of_week': rng.choice(SIM_DAYS), 'hour_of_day': rng.randrange(24),
+        'weather_condition': rng.choice(SIM_WEATHER_CONDITIONS), 'trains_in_section_hour': rng.randrange(10),
+    } for _ in range(n)]
+
+
+def dataframe_encode(encoder, rows):
+    """The path get_full_prediction used to take."""
+    input_df = pd.DataFrame(rows)
+    return hstack([input_df[NUM_FEATURES].values, encoder.transform(input_df[CAT_FEATURES])])
+
+
+def main():
+    rng = random.Random(0)
+    stations = sorted(load_repo_network_map())
+    training_rows = pd.DataFrame([
+        {'train_type': t, 'track_section': s, 'day_of_week': d, 'weather_condition': w}
+        for t, s, d, w in zip(SIM_TRAIN_TYPES * 1000, stations, SIM_DAYS * 1000, SIM_WEATHER_CONDITIONS * 1000)
+    ])
+    encoder = OneHotEncoder(handle_unknown='ignore', sparse_output=True).fit(training_rows[CAT_FEATURES])
+    feature_encoder = FeatureEncoder(encoder, CAT_FEATURES, NUM_FEATURES)
+
+    rows = random_rows(rng, stations, 5000)
+    expected, actual = dataframe_encode(encoder, rows).tocsr(), feature_encoder.encode(rows)
+    assert expected.shape == actual.shape and expected.dtype == actual.dtype
+    assert (expected != actual).nnz == 0
+    assert np.array_equal(expected.indices, actual.indices) and np.array_equal(expected.indptr, actual.indptr)
+    print(f"  -> Outputs identical on {len(rows)} rows ({feature_encoder.n_columns} columns).")
+
+    for batch_size in [1, 16, 256]:
+        batch = rows[:batch_size]
+        for name, encode in [("DataFrame+transform", lambda: dataframe_encode(encoder, batch)), ("FeatureEncoder", lambda: feature_encoder.encode(batch))]:
+            number = max(20, 2000 // batch_size)
+            seconds = min(timeit.repeat(encode, number=number, repeat=3)) / (number * batch_size)
+            print(f"  -> batch {batch_size:>4} {name:>20}: {seconds * 1e6:9.2f} us/row")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Synthetic stand-ins for the Kaggle trains.json / schedules.json files.
+
+The benchmarks must not depend on the (large, unshipped) Kaggle dataset, so
+these helpers generate files with the same layout, walking the real
+network_map.json so that routes, schedules and the network map agree.
+"""
+import contextlib
+import json
+import os
+import random
+import sys
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TRAIN_TYPES = ["Exp", "SF", "Pass", "Raj", "Shatabdi", "Mail"]
+
+
+def load_repo_network_map():
+    with open(os.path.join(REPO_ROOT, "network_map.json"), "r") as f:
+        return json.load(f)
+
+
+def make_synthetic_dataset(network_map, num_trains=300, min_stops=8, max_stops=30, seed=7):
+    """
+    Returns (trains_data, schedule_records) shaped like trains.json and
+    schedules.json. Every train walks the network map, so each consecutive
+    pair of stops is a real edge.
+    """
+    rng = random.Random(seed)
+    stations = sorted(network_map.keys())
+    features, records = [], []
+    record_id = 0
+
+    for i in range(num_trains):
+        number = str(10000 + i)
+        zone = rng.choice(["SR", "SWR", "SR", "SWR", "CR"])
+        features.append({
+            "type": "Feature", "geometry": None,
+            "properties": {"number": number, "name": f"SYNTHETIC EXP {i}", "type": rng.choice(TRAIN_TYPES), "zone": zone},
+        })
+
+        route = [rng.choice(stations)]
+        for _ in range(rng.randint(min_stops, max_stops) - 1):
+            possible_next = [s for s in network_map.get(route[-1], []) if s not in route]
+            if not possible_next: break
+            route.append(rng.choice(possible_next))
+
+        clock = rng.randint(0, 1439)
+        for stop, station in enumerate(route):
+            arrival = None if stop == 0 else clock
+            clock += rng.randint(1, 10) if stop > 0 else 0
+            departure = None if stop == len(route) - 1 else clock
+            records.append({
+                "arrival": _fmt_time(arrival), "day": (arrival if arrival is not None else clock) // 1440 + 1,
+                "train_name": f"SYNTHETIC EXP {i}", "station_name": station, "station_code": station,
+                "id": record_id, "train_number": number, "departure": _fmt_time(departure),
+            })
+            record_id += 1
+            clock += rng.randint(10, 90)
+
+    return {"type": "FeatureCollection", "features": features}, records
+
+
+def _fmt_time(minutes):
+    if minutes is None: return "None"
+    minutes %= 1440
+    return f"{minutes // 60:02d}:{minutes % 60:02d}:00"
+
+
+def write_synthetic_dataset(directory, num_trains=300, seed=7):
+    """Writes trains.json, schedules.json, an empty stations.json and a copy of network_map.json into `directory`."""
+    network_map = load_repo_network_map()
+    trains_data, records = make_synthetic_dataset(network_map, num_trains=num_trains, seed=seed)
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, "trains.json"), "w", encoding="utf-8") as f:
+        json.dump(trains_data, f)
+    with open(os.path.join(directory, "schedules.json"), "w", encoding="utf-8") as f:
+        json.dump(records, f)
+    with open(os.path.join(directory, "stations.json"), "w", encoding="utf-8") as f:
+        json.dump({"type": "FeatureCollection", "features": []}, f)
+    with open(os.path.join(directory, "network_map.json"), "w") as f:
+        json.dump(network_map, f)
+    return directory
+
+@contextlib.contextmanager
+def synthetic_workdir(num_trains=300):
+    """
+    A throwaway directory holding write_synthetic_dataset's files, as the working directory
+    (train_and_serve reads and writes everything relative to it) with the repo importable.
+    The previous working directory is restored even if the benchmark fails.
+    """
+    original_cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        write_synthetic_dataset(workdir, num_trains=num_trains)
+        if REPO_ROOT not in sys.path: sys.path.insert(0, REPO_ROOT)
+        os.chdir(workdir)
+        try:
+            yield workdir
+        finally:
+            os.chdir(original_cwd)
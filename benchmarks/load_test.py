@@ -0,0 +1,83 @@
+"""
+Closed-loop HTTP load generator for a running API (stdlib only).
+
+Each of --concurrency client threads keeps one connection open and posts /predict/all
+requests back to back for --seconds, then throughput and latency percentiles are reported.
+
+Usage:
+    uvicorn train_and_serve:app --workers 1 &
+    python -m benchmarks.load_test --url http://127.0.0.1:8000 --concurrency 32 --seconds 20
+"""
+import argparse
+import http.client
+import json
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+import numpy as np
+
+from benchmarks.fixtures import load_repo_network_map
+from simulation_constants import SIM_DAYS, SIM_WEATHER_CONDITIONS
+
+
+def random_train_info(rng, stations):
+    return {
+        "train_number": str(10000 + rng.randrange(300)), "track_section": rng.choice(stations),
+        "day_of_week": rng.choice(SIM_DAYS), "hour_of_day": rng.randrange(24),
+        "weather_condition": rng.choice(SIM_WEATHER_CONDITIONS), "trains_in_section_hour": rng.randint(1, 9),
+    }
+
+
+def run_client(url, path, stations, seed, stop_at, latencies, errors):
+    target, rng = urlparse(url), random.Random(seed)
+    conn = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=30)
+    while time.perf_counter() < stop_at:
+        body = json.dumps(random_train_info(rng, stations))
+        start = time.perf_counter()
+        try:
+            conn.request("POST", path, body=body, headers={"Content-Type": "application/json"})
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200: errors.append(response.status)
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(repr(e))
+            conn.close()
+            conn = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=30)
+            continue
+        latencies.append(time.perf_counter() - start)
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--path", default="/predict/all")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=20.0)
+    args = parser.parse_args()
+
+    stations = sorted(load_repo_network_map())
+    latencies, errors = [], []
+    stop_at = time.perf_counter() + args.seconds
+    clients = [
+        threading.Thread(target=run_client, args=(args.url, args.path, stations, seed, stop_at, latencies, errors))
+        for seed in range(args.concurrency)
+    ]
+    started = time.perf_counter()
+    for client in clients: client.start()
+    for client in clients: client.join()
+    elapsed = time.perf_counter() - started
+
+    latencies_ms = np.array(latencies) * 1000
+    print(f"{args.path} with {args.concurrency} concurrent clients for {elapsed:.1f} s")
+    print(f"  -> Requests: {len(latencies)} ok, {len(errors)} failed")
+    if len(latencies):
+        print(f"  -> Throughput: {len(latencies) / elapsed:.1f} req/s")
+        p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99])
+        print(f"  -> Latency: p50 {p50:.1f} ms, p95 {p95:.1f} ms, p99 {p99:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
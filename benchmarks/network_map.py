@@ -0,0 +1,106 @@
+"""
+Network map build and load: the per-train loop with its linear neighbour-list scan vs the
+vectorized shift-based edge build, json.load of network_map.json vs the CSR graph file, and
+the peak traced memory (tracemalloc) of the in-memory vs the streaming (--stream) build of
+network_map.json from the Kaggle files. Both pairs of builds are checked for identical maps
+(including neighbour order) first.
+
+Usage: python -m benchmarks.network_map [--trains 5000] [--chunk-size 1048576]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import tempfile
+import time
+import timeit
+import tracemalloc
+
+import pandas as pd
+
+from benchmarks.fixtures import load_repo_network_map, make_synthetic_dataset, synthetic_workdir
+from network_graph import load_network_graph, load_network_map, save_network_graph
+from network_map_builder import build_network_map, create_network_map_from_kaggle_data
+
+
+def legacy_build_network_map(filtered_schedules):
+    """The loop create_network_map_from_kaggle_data used to run."""
+    network_map = {}
+    filtered_schedules = filtered_schedules.assign(arrival_clean=filtered_schedules['arrival'].replace({'None': '00:00:00'}))
+    for train_number, schedule in filtered_schedules.sort_values(by=['day', 'arrival_clean']).groupby('train_number'):
+        stations = schedule['station_code'].tolist()
+        for i in range(len(stations) - 1):
+            current_station, next_station = stations[i], stations[i + 1]
+            if current_station and next_station:
+                if current_station not in network_map:
+                    network_map[current_station] = []
+                if next_station not in network_map[current_station]:
+                    network_map[current_station].append(next_station)
+    return network_map
+
+
+def traced_peak(fn, *args, **kwargs):
+    """(seconds, peak bytes traced by tracemalloc) of fn(*args, **kwargs), with its output captured."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            fn(*args, **kwargs)
+        return time.perf_counter() - start, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trains", type=int, default=5000)
+    parser.add_argument("--chunk-size", type=int, default=1 << 20, help="Characters read per chunk by the streaming build.")
+    args = parser.parse_args()
+
+    _, records = make_synthetic_dataset(load_repo_network_map(), num_trains=args.trains, seed=11)
+    schedules = pd.DataFrame(records)
+    print(f"Build from {len(schedules)} schedule rows ({args.trains} trains)")
+
+    timings = {}
+    for name, build in [("per-train loop", legacy_build_network_map), ("vectorized", lambda df: build_network_map(df)[0])]:
+        start = time.perf_counter()
+        timings[name] = build(schedules)
+        print(f"  -> {name:>15}: {time.perf_counter() - start:8.3f} s")
+    legacy, vectorized = timings.values()
+    assert list(legacy.items()) == [(station, vectorized[station]) for station in legacy] and len(legacy) == len(vectorized)
+    print(f"  -> Maps identical ({len(legacy)} stations).")
+
+    print("Load of the repo network map")
+    with tempfile.TemporaryDirectory() as directory:
+        json_path, graph_path = os.path.join(directory, "network_map.json"), os.path.join(directory, "network_graph.npz")
+        with open(json_path, "w") as f: json.dump(load_repo_network_map(), f, indent=2, sort_keys=True)
+        save_network_graph(load_repo_network_map(), graph_path, json_path)
+        print(f"  -> File size: JSON {os.path.getsize(json_path) / 1024:.0f} KiB, CSR graph {os.path.getsize(graph_path) / 1024:.0f} KiB")
+
+        def load_json():
+            with open(json_path, "r") as f: return json.load(f)
+        for name, load in [
+            ("json.load", load_json),
+            ("CSR arrays", lambda: load_network_graph(graph_path, json_path)),
+            ("CSR -> dict", lambda: load_network_map(json_path, graph_path)),
+        ]:
+            seconds = min(timeit.repeat(load, number=20, repeat=3)) / 20
+            print(f"  -> {name:>15}: {seconds * 1e3:8.2f} ms")
+
+    # tracemalloc sees Python objects and numpy buffers, not Arrow's allocations, so the in-memory
+    # figure is dominated by parsing schedules.json whole into the (cold) Parquet asset cache.
+    print(f"Build of network_map.json from the Kaggle files, peak traced memory (chunk size {args.chunk_size})")
+    with synthetic_workdir(args.trains) as workdir:
+        print(f"  -> schedules.json: {os.path.getsize('schedules.json') / 2**20:.1f} MiB in {workdir}")
+        maps = {}
+        for name, streaming in [("in-memory", False), ("streaming", True)]:
+            seconds, peak = traced_peak(create_network_map_from_kaggle_data, streaming=streaming, chunk_size=args.chunk_size)
+            with open("network_map.json") as f: maps[name] = list(json.load(f).items())
+            print(f"  -> {name:>15}: {seconds:8.3f} s, peak {peak / 2**20:8.1f} MiB")
+        assert maps["in-memory"] == maps["streaming"]
+        print(f"  -> Maps identical ({len(maps['streaming'])} stations).")
+
+
+if __name__ == "__main__":
+    main()
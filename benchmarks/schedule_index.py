@@ -0,0 +1,66 @@
+"""
+Route validation + duration lookup: full schedules_df scan vs the per-train index.
+
+Usage: python -m benchmarks.schedule_index [num_trains]
+"""
+import random
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.fixtures import load_repo_network_map, make_synthetic_dataset
+from train_and_serve import build_schedule_index
+
+
+def synthetic_schedules_df(num_trains):
+    _, records = make_synthetic_dataset(load_repo_network_map(), num_trains=num_trains)
+    schedules_df = pd.DataFrame(records)
+    for column in ['arrival', 'departure']:
+        parts = schedules_df[column].str.split(':', expand=True)
+        minutes = (schedules_df['day'] - 1) * 1440 + pd.to_numeric(parts[0], errors='coerce') * 60 + pd.to_numeric(parts[1], errors='coerce')
+        schedules_df[f'{column}_minutes'] = minutes
+    schedules_df['arrival_minutes'] = schedules_df['arrival_minutes'].fillna(schedules_df['departure_minutes'])
+    schedules_df['departure_minutes'] = schedules_df['departure_minutes'].fillna(schedules_df['arrival_minutes'])
+    return schedules_df
+
+
+def scan_lookup(schedules, train_number, route):
+    """The lookup compare_efficiency used to do on every request."""
+    train_schedule = schedules[schedules['train_number'] == train_number].sort_values('departure_minutes').reset_index()
+    station_indices = {station: i for i, station in enumerate(train_schedule['station_code'])}
+    route_indices = [station_indices[station] for station in route]
+    return train_schedule.iloc[route_indices[-1]]['arrival_minutes'] - train_schedule.iloc[route_indices[0]]['departure_minutes']
+
+
+def index_lookup(schedule_index, train_number, route):
+    train_schedule = schedule_index[train_number]
+    route_indices = [train_schedule['positions'][station] for station in route]
+    return train_schedule['arrival_minutes'][route_indices[-1]] - train_schedule['departure_minutes'][route_indices[0]]
+
+
+def main(num_trains=5000, num_queries=200):
+    schedules_df = synthetic_schedules_df(num_trains)
+    print(f"Synthetic schedule table: {len(schedules_df)} rows, {num_trains} trains")
+
+    start = timeit.default_timer()
+    schedule_index = build_schedule_index(schedules_df)
+    print(f"  -> Index build: {(timeit.default_timer() - start) * 1000:.1f} ms")
+
+    rng = random.Random(0)
+    queries = []
+    for train_number in rng.sample(sorted(schedule_index), num_queries):
+        stations = schedule_index[train_number]['stations']
+        queries.append((train_number, stations[:max(2, len(stations) // 2)]))
+
+    for train_number, route in queries:
+        assert np.isclose(scan_lookup(schedules_df, train_number, route), index_lookup(schedule_index, train_number, route))
+
+    for name, lookup, table in [("full scan", scan_lookup, schedules_df), ("per-train index", index_lookup, schedule_index)]:
+        seconds = timeit.timeit(lambda: [lookup(table, t, r) for t, r in queries], number=3) / (3 * num_queries)
+        print(f"  -> {name:>16}: {seconds * 1e6:10.1f} us/lookup")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
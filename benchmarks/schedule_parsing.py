@@ -0,0 +1,53 @@
+"""
+Startup cost of cleaning schedules.json: the old row-wise apply/transform(lambda)
+path vs clean_schedules. Both outputs are checked for equality first.
+
+Usage: python -m benchmarks.schedule_parsing [num_trains]
+"""
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.fixtures import load_repo_network_map, make_synthetic_dataset
+from asset_cache import clean_schedules
+
+
+def legacy_clean_schedules(schedules_df):
+    """The cleaning lifespan used to run, row by row."""
+    schedules_df['train_number'] = schedules_df['train_number'].astype(str)
+
+    def time_to_minutes(row, column):
+        time_str = row[column]
+        day = row['day']
+        if time_str == 'None' or pd.isna(day): return np.nan
+        try:
+            parts = time_str.split(':')
+            return ((day - 1) * 1440) + (int(parts[0]) * 60) + int(parts[1])
+        except (ValueError, AttributeError): return np.nan
+
+    schedules_df['arrival_minutes'] = schedules_df.apply(time_to_minutes, column='arrival', axis=1)
+    schedules_df['departure_minutes'] = schedules_df.apply(time_to_minutes, column='departure', axis=1)
+    schedules_df['departure_minutes'] = schedules_df.groupby('train_number')['departure_minutes'].transform(lambda x: x.ffill())
+    schedules_df['arrival_minutes'] = schedules_df.groupby('train_number')['arrival_minutes'].transform(lambda x: x.bfill())
+    schedules_df['arrival_minutes'] = schedules_df['arrival_minutes'].fillna(schedules_df['departure_minutes'])
+    schedules_df['departure_minutes'] = schedules_df['departure_minutes'].fillna(schedules_df['arrival_minutes'])
+    return schedules_df.dropna(subset=['arrival_minutes', 'departure_minutes'])
+
+
+def main(num_trains=5000):
+    _, records = make_synthetic_dataset(load_repo_network_map(), num_trains=num_trains)
+    raw_df = pd.DataFrame(records)
+    print(f"Synthetic schedules.json: {len(raw_df)} rows, {num_trains} trains")
+
+    pd.testing.assert_frame_equal(legacy_clean_schedules(raw_df.copy()), clean_schedules(raw_df.copy()))
+    print("  -> Outputs identical.")
+
+    for name, clean in [("row-wise apply", legacy_clean_schedules), ("vectorized", clean_schedules)]:
+        seconds = min(timeit.repeat(lambda: clean(raw_df.copy()), number=1, repeat=3))
+        print(f"  -> {name:>15}: {seconds * 1000:10.1f} ms")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
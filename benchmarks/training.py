@@ -0,0 +1,87 @@
+"""
+Full training vs warm-start retraining on synthetic fixtures, in a throwaway working directory:
+  - train_all_models once per --cpu-budgets value (same data and seeds each time), timing
+    the whole run and each model,
+  - then /predict/batch is called until --logged-rows predictions are in the log, simulated
+    outcomes for as many rows are posted to /observations, and retrain_from_logs (the nightly
+    --warm-start path) is timed on them.
+
+Usage: python -m benchmarks.training [--training-trains 500] [--cpu-budgets 1 4] [--logged-rows 5000]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import re
+import time
+
+import numpy as np
+
+from benchmarks.fixtures import synthetic_workdir
+from simulation_constants import SIM_DAYS, SIM_WEATHER_CONDITIONS
+
+
+def timed_quietly(fn, *args, **kwargs):
+    """(seconds, captured stdout) of fn(*args, **kwargs)."""
+    output = io.StringIO()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(output):
+        fn(*args, **kwargs)
+    return time.perf_counter() - start, output.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trains", type=int, default=300, help="Synthetic trains in the fixture files.")
+    parser.add_argument("--training-trains", type=int, default=500, help="Simulated journeys used for full training.")
+    parser.add_argument("--cpu-budgets", type=int, nargs="+", default=sorted({1, os.cpu_count() or 1}))
+    parser.add_argument("--logged-rows", type=int, default=5000, help="Logged predictions the warm start retrains on.")
+    args = parser.parse_args()
+
+    os.environ["PREDICTION_CACHE_SIZE"] = "0"
+    rows = []
+    with synthetic_workdir(args.trains):
+        import train_and_serve as service
+        from fastapi.testclient import TestClient
+
+        for cpu_budget in args.cpu_budgets:
+            random.seed(0)
+            np.random.seed(0)
+            seconds, output = timed_quietly(service.train_all_models, args.training_trains, cpu_budget=cpu_budget)
+            per_model = re.search(r"Training time: (.*)", output).group(1)
+            rows.append((f"train_all_models (budget {cpu_budget})", seconds, per_model))
+
+        rng = random.Random(0)
+        with open("network_map.json") as f: network_map = json.load(f)
+        stations = sorted(network_map)
+        def train_info():
+            return {
+                "train_number": str(10000 + rng.randrange(args.trains)), "track_section": rng.choice(stations),
+                "day_of_week": rng.choice(SIM_DAYS), "hour_of_day": rng.randrange(24),
+                "weather_condition": rng.choice(SIM_WEATHER_CONDITIONS), "trains_in_section_hour": rng.randint(0, 9),
+            }
+        with contextlib.redirect_stdout(io.StringIO()), TestClient(service.app) as client:
+            for _ in range(0, args.logged_rows, 50):
+                client.post("/predict/batch", json={"trains": [train_info() for _ in range(50)]})
+            simulated = service.simulate_realistic_data(network_map, args.logged_rows // 5 + 1, 5).head(args.logged_rows)
+            observations = [{
+                "train_number": str(row.train_number), "track_section": row.track_section, "day_of_week": row.day_of_week,
+                "hour_of_day": int(row.hour_of_day), "weather_condition": row.weather_condition, "trains_in_section_hour": int(row.trains_in_section_hour),
+                "actual_delay_minutes": float(row.delay_minutes), "actual_congestion_level": row.congestion_level,
+            } for row in simulated.itertuples()]
+            for start in range(0, len(observations), 500):
+                client.post("/observations", json={"observations": observations[start:start + 500]})
+
+        seconds, output = timed_quietly(service.retrain_from_logs, args.cpu_budgets[-1])
+        per_model = re.search(r"Training time: (.*)", output)
+        rows.append((f"retrain_from_logs ({args.logged_rows} rows)", seconds, per_model.group(1) if per_model else output.strip().splitlines()[-1]))
+
+    print(f"\n{'run':<40} {'seconds':>8}  per model")
+    for name, seconds, per_model in rows:
+        print(f"{name:<40} {seconds:>8.1f}  {per_model}")
+
+
+if __name__ == "__main__":
+    main()
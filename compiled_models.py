@@ -0,0 +1,394 @@
+import pickle
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+# --- COMPILED INFERENCE MODELS ---
+# The forest models, flattened into plain NumPy arrays: all trees of an ensemble share three
+# node arrays (split feature, threshold, right child) laid out depth-first, plus a table of
+# the distinct leaf values, and a batch is evaluated by walking all (row, tree) pairs down
+# together. The compiled objects keep the predict interface of the sklearn models they
+# replace, reproduce them exactly (same float32 input rounding, same split rule, trees summed
+# in the same order), and weigh a fraction of the pickled originals.
+# Supported: RandomForestClassifier, IsolationForest, StandardScaler.
+# The walk costs grow faster with the batch than sklearn's per-tree Cython loops do: measured
+# with benchmarks.compiled_models, the forest breaks even at about 128 rows and the
+# IsolationForest at about 192-256, and both are 2-4x slower at 2048 rows. Serving therefore
+# routes larger batches to the original models (see BatchSizeRouter), which are only loaded
+# once such a batch arrives.
+LEAF, CHAIN = -1, -2
+# Shorter runs of one-hot splits are cheaper to walk split by split than to look up
+MIN_CHAIN_LENGTH = 4
+_HASH_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+class TreeEnsemble:
+    """
+    Nodes are stored depth-first, so the left child of split i is node i + 1. At a split
+    (feature[i] >= 0) a row goes left when x[feature[i]] <= threshold[i], else to right[i].
+    At a leaf (feature[i] == LEAF) right[i] is the leaf's row in leaf_values.
+
+    One-hot columns make trees deep: a split per station, each sending the rows without that
+    station on to the next one. Runs of such "indicator column is 0 -> go left" splits are
+    compiled into chains (feature[i] == CHAIN, right[i] = chain id), and a row crosses a whole
+    chain in one step: it leaves at the first chain node testing one of its own nonzero
+    indicator columns, looked up in a hash table keyed by (chain, column). indicator_groups
+    lists the columns of each one-hot feature (at most one of them is nonzero in a row); a
+    row's column from a group is only looked up in chains that test that group at all.
+    """
+    def __init__(self, roots, feature, threshold, right, leaf_values, input_dtype, n_features, indicator_groups=()):
+        self.roots, self.feature, self.threshold, self.right = roots, feature, threshold, right
+        self.leaf_values, self.input_dtype, self.n_features = leaf_values, input_dtype, n_features
+        # One-hot group of each indicator column, -1 for the other columns
+        self.n_groups = len(indicator_groups)
+        self.column_group = np.full(n_features, -1, dtype=_smallest_int(self.n_groups))
+        for group, columns in enumerate(indicator_groups): self.column_group[np.asarray(list(columns), dtype=np.int64)] = group
+        self._build_chains()
+
+    def _build_chains(self):
+        is_split = self.feature >= 0
+        # A split can join a chain if it tests an indicator column for 0 (left) vs 1 (right)
+        is_indicator = self.column_group[np.where(is_split, self.feature, 0)] >= 0
+        chainable = is_split & is_indicator & (self.threshold >= 0) & (self.threshold < 1)
+        continues_chain = np.zeros(len(self.feature) + 1, dtype=bool)
+        continues_chain[np.flatnonzero(chainable) + 1] = True
+        heads = np.flatnonzero(chainable & ~continues_chain[:-1])
+
+        # chain_exits[chain_start[c]:chain_start[c + 1]] lists where a row goes from chain c:
+        # the right child of each chain node, then the left child of the last one (fall-through)
+        chain_start, chain_exits, chain_groups, keys, positions = [0], [], [], [], []
+        feature, right, column_group = self.feature.tolist(), self.right.tolist(), self.column_group.tolist()
+        chainable = chainable.tolist()
+        for head in heads.tolist():
+            end = head
+            while chainable[end]: end += 1
+            if end - head < MIN_CHAIN_LENGTH: continue
+            chain_id, seen = len(chain_start) - 1, set()
+            chain_groups.append(sorted({column_group[feature[node]] for node in range(head, end)}))
+            for position, node in enumerate(range(head, end)):
+                # Only the first test of a column can send a row right; a repeat of it never fires
+                if feature[node] not in seen:
+                    seen.add(feature[node])
+                    keys.append(chain_id * self.n_features + feature[node])
+                    positions.append(position)
+                chain_exits.append(right[node])
+            chain_exits.append(end)
+            chain_start.append(len(chain_exits))
+            # The head now stands for the whole chain; its own split is reached through chain_exits
+            self.feature[head], self.right[head] = CHAIN, chain_id
+
+        self.chain_start = np.array(chain_start, dtype=np.int32)
+        self.chain_exits = np.array(chain_exits, dtype=np.int32)
+        self.chain_tests_group = np.zeros((len(chain_groups), self.n_groups), dtype=bool)
+        for chain_id, groups in enumerate(chain_groups): self.chain_tests_group[chain_id, groups] = True
+        self._build_chain_table(np.array(keys, dtype=np.int64), np.array(positions, dtype=np.int64))
+
+    def _build_chain_table(self, keys, positions):
+        """
+        Hash table from chain key to chain position: keys sorted by hash bucket, with
+        bucket_start[b]:bucket_start[b + 1] holding bucket b. About one key per bucket, so a
+        lookup checks a few keys at most.
+        """
+        self.table_bits = max(int(np.ceil(np.log2(max(len(keys), 2)))), 1)
+        bucket = self._hash(keys)
+        order = np.argsort(bucket, kind='stable')
+        self.bucket_start = np.searchsorted(bucket[order], np.arange((1 << self.table_bits) + 1)).astype(np.int32)
+        self.table_keys = keys[order].astype(np.int32 if keys.max(initial=0) < np.iinfo(np.int32).max else np.int64)
+        self.table_positions = positions[order].astype(_smallest_int(positions.max(initial=0)))
+
+    def _hash(self, keys):
+        return ((keys.astype(np.uint64) * _HASH_MULTIPLIER) >> np.uint64(64 - self.table_bits)).astype(np.int64)
+
+    def _chain_position(self, keys):
+        """Chain position of each key, or -1 where the chain does not test that column."""
+        found = np.full(len(keys), -1, dtype=np.int64)
+        bucket = self._hash(keys)
+        slot, end = self.bucket_start[bucket].astype(np.int64), self.bucket_start[bucket + 1]
+        pending = np.flatnonzero(slot < end)
+        while pending.size:
+            hit = self.table_keys[slot[pending]] == keys[pending]
+            found[pending[hit]] = self.table_positions[slot[pending[hit]]]
+            slot[pending] += 1
+            pending = pending[~hit & (slot[pending] < end[pending])]
+        return found
+
+    @property
+    def nbytes(self):
+        arrays = [
+            self.roots, self.feature, self.threshold, self.right, self.leaf_values, self.column_group,
+            self.chain_start, self.chain_exits, self.chain_tests_group, self.bucket_start, self.table_keys, self.table_positions,
+        ]
+        return sum(a.nbytes for a in arrays)
+
+    def apply(self, X):
+        """Leaf row (into leaf_values) reached by each (row, tree): an (n_rows, n_trees) int array."""
+        X = _as_csr(X, self.input_dtype, self.n_features)
+        n_rows, n_trees = X.shape[0], len(self.roots)
+        # Sorted (row, column) keys of the nonzeros, for vectorized x[row, column] lookups
+        entry_rows = np.repeat(np.arange(n_rows, dtype=np.int64), np.diff(X.indptr))
+        entry_keys = entry_rows * self.n_features + X.indices
+        # Each row's nonzero column in every one-hot group (-1 if none), the only ones that can end a chain
+        indicator = self.column_group[X.indices] >= 0
+        entry_groups = self.column_group[X.indices[indicator]]
+        if np.any(np.bincount(entry_rows[indicator] * self.n_groups + entry_groups, minlength=1) > 1):
+            raise ValueError("More than one nonzero column in a one-hot group.")
+        group_column = np.full((n_rows, self.n_groups), -1, dtype=np.int64)
+        group_column[entry_rows[indicator], entry_groups] = X.indices[indicator]
+
+        # Walkers ordered tree by tree, so each step reads one tree's nodes at a time
+        rows = np.tile(np.arange(n_rows), n_trees)
+        node = np.repeat(self.roots, n_rows).astype(np.int64)
+        position = np.arange(n_rows * n_trees)
+        leaves = np.empty(n_rows * n_trees, dtype=np.int64)
+        while position.size:
+            feature = self.feature[node]
+            at_leaf = feature == LEAF
+            if at_leaf.any():
+                leaves[position[at_leaf]] = self.right[node[at_leaf]]
+                walking = ~at_leaf
+                position, node, rows, feature = position[walking], node[walking], rows[walking], feature[walking]
+
+            at_chain = feature == CHAIN
+            if at_chain.any():
+                node[at_chain] = self._cross_chains(group_column, rows[at_chain], self.right[node[at_chain]])
+            step = ~at_chain
+            node[step] = self._split(X, entry_keys, rows[step], node[step], feature[step])
+        return leaves.reshape(n_trees, n_rows).T
+
+    def _split(self, X, entry_keys, rows, node, feature):
+        keys = rows * self.n_features + feature
+        found = np.minimum(np.searchsorted(entry_keys, keys), max(len(entry_keys) - 1, 0))
+        values = np.where(entry_keys[found] == keys, X.data[found], 0) if len(entry_keys) else np.zeros(len(keys), self.input_dtype)
+        return np.where(values <= self.threshold[node], node + 1, self.right[node])
+
+    def _cross_chains(self, group_column, rows, chain):
+        """Node each walker reaches after the chain it stands at the head of."""
+        columns = group_column[rows]
+        walker, group = np.nonzero(self.chain_tests_group[chain] & (columns >= 0))
+        chain_position = self._chain_position(chain[walker].astype(np.int64) * self.n_features + columns[walker, group])
+        hit = chain_position >= 0
+
+        # No hit: the fall-through exit, one past the last chain node
+        exit_position = (self.chain_start[chain + 1] - self.chain_start[chain] - 1).astype(np.int64)
+        np.minimum.at(exit_position, walker[hit], chain_position[hit])
+        return self.chain_exits[self.chain_start[chain] + exit_position]
+
+    def accumulate(self, X):
+        """Sum of each row's leaf values over the trees, added one tree at a time in tree order."""
+        per_tree = self.leaf_values[self.apply(X)]
+        return np.cumsum(per_tree, axis=1)[:, -1]
+
+def _as_csr(X, dtype, n_features):
+    if isinstance(X, pd.DataFrame): X = X.to_numpy()
+    X = sparse.csr_matrix(X, dtype=dtype)
+    if X.shape[1] != n_features: raise ValueError(f"Expected {n_features} features, got {X.shape[1]}.")
+    X.eliminate_zeros()
+    X.sort_indices()
+    return X
+
+def _as_dense(X, dtype):
+    if sparse.issparse(X): return X.toarray().astype(dtype, copy=False)
+    if isinstance(X, pd.DataFrame): X = X.to_numpy()
+    return np.asarray(X, dtype=dtype)
+
+def _smallest_int(max_value):
+    return np.int16 if max_value < np.iinfo(np.int16).max else np.int32
+
+def _float32_floor(threshold):
+    """
+    sklearn compares float32 inputs against float64 thresholds. For a float32 x, x <= t holds
+    exactly when x <= (the largest float32 not above t), so the thresholds can be stored as float32.
+    """
+    rounded = threshold.astype(np.float32)
+    above = rounded.astype(np.float64) > threshold
+    rounded[above] = np.nextafter(rounded[above], np.float32(-np.inf))
+    return rounded
+
+def _flatten_sklearn_trees(trees, leaf_value_fn, n_features, indicator_groups=(), feature_maps=None):
+    """
+    Concatenates fitted sklearn Tree objects (which sklearn builds depth-first);
+    leaf_value_fn(tree_index, tree_, leaf_nodes) gives their leaf values, stored once per distinct value.
+    """
+    roots, features, thresholds, rights, leaf_values = [], [], [], [], []
+    node_offset = leaf_offset = 0
+    for t, tree in enumerate(trees):
+        is_leaf = tree.children_left < 0
+        if np.any(tree.children_left[~is_leaf] != np.flatnonzero(~is_leaf) + 1):
+            raise ValueError("Tree nodes are not stored depth-first (e.g. grown best-first with max_leaf_nodes); the model cannot be compiled.")
+        leaf_nodes = np.flatnonzero(is_leaf)
+        leaf_row = np.full(tree.node_count, -1, dtype=np.int64)
+        leaf_row[leaf_nodes] = leaf_offset + np.arange(len(leaf_nodes))
+
+        feature = tree.feature.astype(np.int64)
+        if feature_maps is not None: feature = np.asarray(feature_maps[t])[np.maximum(feature, 0)]
+        roots.append(node_offset)
+        features.append(np.where(is_leaf, LEAF, feature))
+        thresholds.append(tree.threshold)
+        rights.append(np.where(is_leaf, leaf_row, tree.children_right + node_offset))
+        leaf_values.append(leaf_value_fn(t, tree, leaf_nodes))
+        node_offset += tree.node_count
+        leaf_offset += len(leaf_nodes)
+
+    feature, right = np.concatenate(features), np.concatenate(rights)
+    # Most leaves repeat a handful of values (pure leaves of a classifier), so keep each value once
+    distinct_values, value_row = np.unique(np.concatenate(leaf_values), axis=0, return_inverse=True)
+    is_leaf = feature == LEAF
+    right[is_leaf] = value_row.reshape(-1)[right[is_leaf]]
+    return TreeEnsemble(
+        np.array(roots, dtype=np.int32), feature.astype(_smallest_int(feature.max(initial=0))),
+        _float32_floor(np.concatenate(thresholds)), right.astype(np.int32),
+        distinct_values, np.float32, n_features, indicator_groups,
+    )
+
+class CompiledForestClassifier:
+    def __init__(self, forest, indicator_groups=()):
+        if getattr(forest, 'n_outputs_', 1) != 1: raise ValueError("Only single-output forests can be compiled.")
+        def leaf_probabilities(t, tree, leaf_nodes):
+            # DecisionTreeClassifier.predict_proba: the leaf's class weights, normalized
+            proba = tree.value[leaf_nodes, 0, :].astype(np.float64)
+            normalizer = proba.sum(axis=1)
+            normalizer[normalizer == 0.0] = 1.0
+            return proba / normalizer[:, None]
+        self.ensemble = _flatten_sklearn_trees([e.tree_ for e in forest.estimators_], leaf_probabilities, forest.n_features_in_, indicator_groups)
+        self.classes_, self.n_estimators = forest.classes_, len(forest.estimators_)
+
+    def predict_proba(self, X):
+        return self.ensemble.accumulate(X) / self.n_estimators
+
+    def predict(self, X):
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1), axis=0)
+
+def _sklearn_private(obj, name):
+    """A private attribute of a fitted sklearn model, or a ValueError saying the installed sklearn cannot be compiled."""
+    value = getattr(obj, name, None)
+    if value is None:
+        import sklearn
+        raise ValueError(f"{type(obj).__name__}.{name} is not available in sklearn {sklearn.__version__}; the model cannot be compiled.")
+    return value
+
+class CompiledIsolationForest:
+    def __init__(self, forest):
+        # IsolationForest scoring is not public API: these are the internals _compute_score_samples uses
+        try:
+            from sklearn.ensemble._iforest import _average_path_length
+        except ImportError as e:
+            raise ValueError(f"sklearn.ensemble._iforest._average_path_length is not available ({e}); the model cannot be compiled.")
+        path_lengths = _sklearn_private(forest, '_decision_path_lengths')
+        average_path_lengths = _sklearn_private(forest, '_average_path_length_per_tree')
+        max_samples = _sklearn_private(forest, '_max_samples')
+        subsample_features = _sklearn_private(forest, '_max_features') != forest.n_features_in_
+        def leaf_depths(t, tree, leaf_nodes):
+            # The per-tree term IsolationForest._compute_score_samples adds for a leaf
+            return path_lengths[t][leaf_nodes] + average_path_lengths[t][leaf_nodes] - 1.0
+        self.ensemble = _flatten_sklearn_trees(
+            [e.tree_ for e in forest.estimators_], leaf_depths, forest.n_features_in_,
+            feature_maps=forest.estimators_features_ if subsample_features else None,
+        )
+        self.denominator = len(forest.estimators_) * _average_path_length([max_samples])
+        self.offset_ = forest.offset_
+
+    def score_samples(self, X):
+        depths = self.ensemble.accumulate(X)
+        return -(2 ** (-np.divide(depths, self.denominator, out=np.ones_like(depths), where=self.denominator != 0)))
+
+    def decision_function(self, X):
+        return self.score_samples(X) - self.offset_
+
+    def predict(self, X):
+        is_inlier = np.ones(X.shape[0], dtype=int)
+        is_inlier[self.decision_function(X) < 0] = -1
+        return is_inlier
+
+class CompiledStandardScaler:
+    def __init__(self, scaler):
+        self.mean_ = scaler.mean_ if scaler.with_mean else None
+        self.scale_ = scaler.scale_ if scaler.with_std else None
+        self.nbytes = sum(a.nbytes for a in (self.mean_, self.scale_) if a is not None)
+
+    def transform(self, X):
+        X = _as_dense(X, np.float64).copy()
+        if self.mean_ is not None: X -= self.mean_
+        if self.scale_ is not None: X /= self.scale_
+        return X
+
+class BatchSizeRouter:
+    """
+    A model that answers batches of up to max_rows rows with the compiled model and larger
+    ones with the original it was compiled from; both give the same answers.
+    The original is loaded by load_original() when the first larger batch arrives, so a worker
+    that never sees one never holds it in memory. If load_original() returns None, larger
+    batches stay on the compiled model.
+    """
+    def __init__(self, compiled, load_original, max_rows):
+        self.compiled, self.max_rows = compiled, max_rows
+        self.original, self._load_original, self._load_lock = None, load_original, threading.Lock()
+
+    def _model(self, X):
+        if X.shape[0] <= self.max_rows: return self.compiled
+        if self._load_original is not None:
+            with self._load_lock:
+                if self._load_original is not None:
+                    self.original, self._load_original = self._load_original(), None
+        return self.compiled if self.original is None else self.original
+
+    def predict(self, X):
+        return self._model(X).predict(X)
+
+    def predict_proba(self, X):
+        return self._model(X).predict_proba(X)
+
+    def decision_function(self, X):
+        return self._model(X).decision_function(X)
+
+    def score_samples(self, X):
+        return self._model(X).score_samples(X)
+
+    def transform(self, X):
+        return self._model(X).transform(X)
+
+def compile_models(model_set):
+    """
+    Compiled stand-ins for the 'congestion', 'anomaly' and 'scaler' entries of a model set.
+    The LightGBM delay model already predicts from its own native tree arrays and stays as it is.
+    """
+    feature_encoder = model_set.get('feature_encoder')
+    one_hot_groups = [list(column_map.values()) for column_map in feature_encoder.column_maps] if feature_encoder else []
+    return {
+        'congestion': CompiledForestClassifier(model_set['congestion'], one_hot_groups),
+        'anomaly': CompiledIsolationForest(model_set['anomaly']),
+        'scaler': CompiledStandardScaler(model_set['scaler']),
+    }
+
+def _best_time(fn, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def check_agreement(originals, compiled, X_processed, anomaly_features, batch_rows=256):
+    """
+    Runs originals and compiled models on the same rows. Returns a report with the number of
+    disagreeing rows per model (all must be 0 to serve the compiled set), their sizes and
+    latency for one row and for a batch of batch_rows rows.
+    """
+    scaled = originals['scaler'].transform(anomaly_features)
+    report = {
+        'rows': X_processed.shape[0], 'batch_rows': min(batch_rows, X_processed.shape[0], scaled.shape[0]),
+        'congestion_mismatches': int(np.sum(originals['congestion'].predict(X_processed) != compiled['congestion'].predict(X_processed))),
+        'scaler_max_abs_diff': float(np.max(np.abs(scaled - compiled['scaler'].transform(anomaly_features)), initial=0.0)),
+        'anomaly_mismatches': int(np.sum(originals['anomaly'].predict(scaled) != compiled['anomaly'].predict(scaled))),
+    }
+    report['agrees'] = report['congestion_mismatches'] == 0 and report['scaler_max_abs_diff'] == 0 and report['anomaly_mismatches'] == 0
+
+    for name in ('congestion', 'anomaly'):
+        inputs = scaled if name == 'anomaly' else X_processed
+        report[f'{name}_original_bytes'] = len(pickle.dumps(originals[name], protocol=pickle.HIGHEST_PROTOCOL))
+        report[f'{name}_compiled_bytes'] = compiled[name].ensemble.nbytes
+        for label, model in (('original', originals[name]), ('compiled', compiled[name])):
+            report[f'{name}_{label}_row_ms'] = _best_time(lambda: model.predict(inputs[:1])) * 1000
+            report[f'{name}_{label}_batch_ms'] = _best_time(lambda: model.predict(inputs[:report['batch_rows']]), repeat=3) * 1000
+    return report
@@ -0,0 +1,103 @@
+import heapq
+import itertools
+
+import numpy as np
+
+# --- DEPARTURE SEQUENCING ---
+# Orders N trains contending for one section. As in optimize_departure, the train that departs
+# first is scored with its own traffic, and each following train with the traffic of the train
+# right ahead of it plus one. Two tables are therefore all the model has to score, in one
+# batch: first_costs[i] (train i departs first) and follow_costs[i, j] (train j departs right
+# after train i). The best order is then a shortest Hamiltonian path over those costs:
+# exact Held-Karp DP over subsets for small N, and a beam search beyond that.
+EXACT_SEQUENCING_MAX_TRAINS = 12
+
+def order_cost(order, first_costs, follow_costs):
+    """Combined predicted delay of departing in `order`."""
+    if not order: return 0.0
+    return float(first_costs[order[0]] + sum(follow_costs[a, b] for a, b in zip(order, order[1:])))
+
+def held_karp(first_costs, follow_costs):
+    """
+    Exact minimum-cost order by DP over subsets, O(2^N * N^2) vectorized over each subset size.
+    best[mask, j] is the cheapest way to depart exactly the trains in mask, ending with j.
+    Ties go to the lower train index. Returns (order, cost).
+    """
+    n = len(first_costs)
+    if n == 0: return [], 0.0
+    masks = np.arange(1 << n)
+    best = np.full((1 << n, n), np.inf)
+    parent = np.full((1 << n, n), -1, dtype=np.int64)
+    best[1 << np.arange(n), np.arange(n)] = first_costs
+
+    popcount = np.array([bin(mask).count("1") for mask in range(1 << n)])
+    for size in range(2, n + 1):
+        layer = masks[popcount == size]
+        for j in range(n):
+            with_j = layer[(layer >> j) & 1 == 1]
+            candidates = best[with_j ^ (1 << j)] + follow_costs[:, j]
+            previous = candidates.argmin(axis=1)
+            best[with_j, j] = candidates[np.arange(len(with_j)), previous]
+            parent[with_j, j] = previous
+
+    mask, last = (1 << n) - 1, int(best[-1].argmin())
+    cost, order = float(best[-1, last]), []
+    while last >= 0:
+        order.append(last)
+        mask, last = mask ^ (1 << last), int(parent[mask, last])
+    return order[::-1], cost
+
+def beam_search(first_costs, follow_costs, beam_width=64):
+    """
+    Keeps the beam_width cheapest partial orders of each length and extends every one by every
+    remaining train. Partial orders over the same trains ending with the same train have the
+    same future, so only the cheapest of them is kept. The result is polished with
+    improve_order; it is not guaranteed optimal. Ties are broken by the order itself.
+    Returns (order, cost).
+    """
+    n = len(first_costs)
+    beam = heapq.nsmallest(beam_width, [(float(first_costs[i]), (i,), 1 << i) for i in range(n)])
+    for _ in range(n - 1):
+        expanded = {}
+        for cost, order, mask in beam:
+            for j in range(n):
+                if mask >> j & 1: continue
+                state = (cost + float(follow_costs[order[-1], j]), order + (j,), mask | 1 << j)
+                key = (state[2], j)
+                if key not in expanded or state < expanded[key]: expanded[key] = state
+        beam = heapq.nsmallest(beam_width, expanded.values())
+    cost, order, _ = beam[0]
+    return improve_order(list(order), first_costs, follow_costs)
+
+def improve_order(order, first_costs, follow_costs):
+    """
+    Local search after the beam: moves one train to another position whenever that lowers the
+    combined delay, scanning moves in a fixed order, until no single move helps. Returns (order, cost).
+    """
+    cost, improved = order_cost(order, first_costs, follow_costs), True
+    while improved:
+        improved = False
+        for i, j in itertools.permutations(range(len(order)), 2):
+            candidate = order[:i] + order[i + 1:]
+            candidate.insert(j, order[i])
+            candidate_cost = order_cost(candidate, first_costs, follow_costs)
+            if candidate_cost < cost - 1e-9:
+                order, cost, improved = candidate, candidate_cost, True
+                break
+    return order, cost
+
+def sequence_departures(first_costs, follow_costs, beam_width=64, exact_max_trains=EXACT_SEQUENCING_MAX_TRAINS):
+    """
+    Returns (order, cost, method): Held-Karp up to exact_max_trains trains, beam search above.
+    The trains keep their given order (0..N-1) unless another order is strictly cheaper, which
+    for two trains is optimize_departure's "train 1 first on a tie".
+    """
+    first_costs, follow_costs = np.asarray(first_costs, dtype=np.float64), np.asarray(follow_costs, dtype=np.float64)
+    if len(first_costs) <= exact_max_trains:
+        order, cost, method = *held_karp(first_costs, follow_costs), "exact"
+    else:
+        order, cost, method = *beam_search(first_costs, follow_costs, beam_width), "beam"
+    given_order = list(range(len(first_costs)))
+    given_cost = order_cost(given_order, first_costs, follow_costs)
+    if given_cost <= cost + 1e-9: return given_order, given_cost, method
+    return order, cost, method
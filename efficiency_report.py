@@ -0,0 +1,121 @@
+import numpy as np
+import pandas as pd
+
+# --- BULK SCHEDULE EFFICIENCY REPORT ---
+# /compare_efficiency answers for one route per request; the nightly report wants every train's
+# whole timetable. Here the spans come from one groupby over the cleaned schedules, every stop of
+# a batch of trains is scored in a single delay-model call, and the per-train sums come from
+# np.add.reduceat. Batches are yielded as they finish so callers can stream them out.
+
+# Same names and meaning as the /compare_efficiency response.
+REPORT_COLUMNS = [
+    'train_number', 'train_type', 'origin', 'destination', 'stops',
+    'railway_scheduled_time_minutes', 'ai_predicted_travel_time_minutes', 'ai_predicted_delay_minutes', 'efficiency_score',
+]
+
+def schedule_spans(schedules_df, train_numbers):
+    """
+    The stops of the given trains, ordered by train and then departure time, and one row per
+    train with its first and last station and scheduled duration (departure from the first
+    stop to arrival at the last, as /compare_efficiency measures a route). Trains with fewer
+    than two stops or a non-positive duration are left out of both. Returns (stops, trains).
+    """
+    stops = schedules_df.loc[schedules_df['train_number'].isin(train_numbers), ['train_number', 'station_code', 'arrival_minutes', 'departure_minutes']]
+    stops = stops.sort_values(['train_number', 'departure_minutes'], kind='stable')
+    by_train = stops.groupby('train_number', sort=False)
+    trains = pd.DataFrame({
+        'origin': by_train['station_code'].first(),
+        'destination': by_train['station_code'].last(),
+        'stops': by_train.size(),
+        'railway_scheduled_time_minutes': by_train['arrival_minutes'].last() - by_train['departure_minutes'].first(),
+    })
+    trains = trains[(trains['stops'] >= 2) & (trains['railway_scheduled_time_minutes'] > 0)].rename_axis('train_number').reset_index()
+    stops = stops[stops['train_number'].isin(trains['train_number'])].reset_index(drop=True)
+    return stops, trains
+
+def efficiency_report_batches(stops, trains, predict_delays, conditions, batch_trains=1000):
+    """
+    Yields the report for (stops, trains) from schedule_spans as DataFrames of up to
+    batch_trains trains with REPORT_COLUMNS. `trains` also needs a train_type column.
+    predict_delays(features) returns the rounded predicted delay of each row of a DataFrame
+    with the model's feature columns. conditions holds day_of_week, weather_condition and
+    trains_in_section_hour for every stop, and hour_of_day, where None means each stop's
+    scheduled departure hour.
+    """
+    stop_ends = np.cumsum(trains['stops'].to_numpy())
+    stop_starts = stop_ends - trains['stops'].to_numpy()
+    departure_hours = (stops['departure_minutes'].to_numpy() // 60 % 24).astype(np.int64)
+
+    for first in range(0, len(trains), batch_trains):
+        batch = trains.iloc[first:first + batch_trains]
+        begin, end = stop_starts[first], stop_ends[first + len(batch) - 1]
+        features = pd.DataFrame({
+            'train_type': np.repeat(batch['train_type'].to_numpy(dtype=object), batch['stops'].to_numpy()),
+            'track_section': stops['station_code'].to_numpy(dtype=object)[begin:end],
+            'day_of_week': conditions['day_of_week'],
+            'weather_condition': conditions['weather_condition'],
+            'hour_of_day': departure_hours[begin:end] if conditions.get('hour_of_day') is None else conditions['hour_of_day'],
+            'trains_in_section_hour': conditions['trains_in_section_hour'],
+        })
+        delays = predict_delays(features)
+        total_delays = np.add.reduceat(delays, stop_starts[first:first + len(batch)] - begin)
+
+        scheduled = batch['railway_scheduled_time_minutes'].to_numpy()
+        predicted = scheduled + total_delays
+        with np.errstate(divide='ignore', invalid='ignore'):
+            efficiency = np.where(predicted > 0, np.round(scheduled / predicted * 100, 2), 0.0)
+        yield batch.assign(
+            ai_predicted_travel_time_minutes=np.round(predicted, 2),
+            ai_predicted_delay_minutes=np.round(total_delays, 2),
+            efficiency_score=efficiency,
+        )[REPORT_COLUMNS]
+
+def ndjson_chunks(batches):
+    """One JSON object per train and line, encoded a batch at a time."""
+    for batch in batches:
+        yield batch.to_json(orient='records', lines=True).encode()
+
+class _StreamSink:
+    """Write-only file that hands out what was written since the last drain(); tell() stays absolute for the Parquet footer."""
+    closed = False
+
+    def __init__(self):
+        self.chunks, self.position = [], 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data, self.chunks = b''.join(self.chunks), []
+        return data
+
+def parquet_chunks(batches):
+    """A single Parquet file, one row group per batch, yielded as each row group is written."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sink, writer = _StreamSink(), None
+    for batch in batches:
+        table = pa.Table.from_pandas(batch, schema=writer.schema if writer else None, preserve_index=False)
+        if writer is None: writer = pq.ParquetWriter(sink, table.schema)
+        writer.write_table(table)
+        yield sink.drain()
+    if writer is not None:
+        writer.close()
+        yield sink.drain()
+
+REPORT_FORMATS = {
+    'ndjson': (ndjson_chunks, 'application/x-ndjson'),
+    'parquet': (parquet_chunks, 'application/vnd.apache.parquet'),
+}
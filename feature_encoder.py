@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+
+# --- PRECOMPILED FEATURE ENCODER ---
+# At serving time the six model inputs are plain Python values, so building a DataFrame and
+# running OneHotEncoder.transform + scipy hstack costs far more than the lookup it amounts to.
+# FeatureEncoder compiles the fitted encoder into category -> column dicts once and writes the
+# CSR arrays directly. The matrix layout is the one train_all_models builds:
+# [numerical features..., one-hot block of each categorical feature in order].
+
+class FeatureEncoder:
+    def __init__(self, one_hot_encoder, cat_features, num_features):
+        if one_hot_encoder.handle_unknown != 'ignore' or one_hot_encoder.drop is not None:
+            raise ValueError("FeatureEncoder only supports OneHotEncoder(handle_unknown='ignore', drop=None).")
+        if getattr(one_hot_encoder, '_infrequent_enabled', False):
+            raise ValueError("FeatureEncoder does not support infrequent-category grouping.")
+        if list(one_hot_encoder.feature_names_in_) != list(cat_features):
+            raise ValueError(f"Encoder was fitted on {list(one_hot_encoder.feature_names_in_)}, not {list(cat_features)}.")
+
+        self.cat_features, self.num_features = list(cat_features), list(num_features)
+        self.column_maps, offset = [], len(self.num_features)
+        for categories in one_hot_encoder.categories_:
+            self.column_maps.append({category: offset + i for i, category in enumerate(categories.tolist())})
+            offset += len(categories)
+        self.n_columns = offset
+
+    def encode(self, rows):
+        """
+        rows: list of dicts holding the categorical and numerical features as plain values.
+        Returns a float64 CSR matrix equal to hstack([numerical, encoder.transform(categorical)]).
+        Zero numerical values are left implicit and unknown categories add no column, as there.
+        """
+        indptr, indices, data = [0], [], []
+        for row in rows:
+            for column, feature in enumerate(self.num_features):
+                value = row[feature]
+                if value != 0:
+                    indices.append(column)
+                    data.append(value)
+            for feature, column_map in zip(self.cat_features, self.column_maps):
+                column = column_map.get(row[feature])
+                if column is not None:
+                    indices.append(column)
+                    data.append(1.0)
+            indptr.append(len(indices))
+        return csr_matrix(
+            (np.array(data, dtype=np.float64), np.array(indices, dtype=np.int32), np.array(indptr, dtype=np.int32)),
+            shape=(len(indptr) - 1, self.n_columns),
+        )
+
+    def encode_frame(self, df):
+        """
+        encode() for a DataFrame holding the feature columns, one column at a time instead of
+        one dict per row, for bulk jobs that score thousands of rows. Returns the same matrix.
+        """
+        n_rows = len(df)
+        columns = np.empty((n_rows, len(self.num_features) + len(self.cat_features)), dtype=np.int64)
+        values = np.ones(columns.shape, dtype=np.float64)
+        for column, feature in enumerate(self.num_features):
+            values[:, column] = df[feature].to_numpy(dtype=np.float64)
+            columns[:, column] = np.where(values[:, column] != 0, column, -1)
+        for position, (feature, column_map) in enumerate(zip(self.cat_features, self.column_maps), start=len(self.num_features)):
+            columns[:, position] = pd.Series(df[feature].to_numpy(dtype=object)).map(column_map).fillna(-1).to_numpy(dtype=np.int64)
+        # Columns increase left to right within a row, so the row-major mask is already CSR order.
+        present = columns >= 0
+        indptr = np.concatenate([[0], np.cumsum(present.sum(axis=1))])
+        return csr_matrix(
+            (values[present], columns[present].astype(np.int32), indptr.astype(np.int32)),
+            shape=(n_rows, self.n_columns),
+        )
@@ -0,0 +1,76 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+# --- INFERENCE EXECUTOR & MICRO-BATCHING ---
+# Model inference is CPU-bound, so it runs on a dedicated pool instead of the event loop or
+# FastAPI's shared threadpool. Requests arriving within a short window are merged into one
+# batch, which costs a single encoder pass and one call per model.
+
+def create_inference_executor(kind="thread", workers=1, initializer=None):
+    """
+    kind="thread": a thread pool sharing the models already loaded in this process.
+    kind="process": a process pool; `initializer` runs once in each worker to load its models.
+    """
+    if kind == "process":
+        return ProcessPoolExecutor(max_workers=workers, initializer=initializer)
+    if kind == "thread":
+        return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="inference")
+    raise ValueError(f"Unknown inference executor kind: {kind!r} (expected 'thread' or 'process')")
+
+class MicroBatcher:
+    def __init__(self, predict_fn, executor, window_seconds=0.002, max_rows=256):
+        """
+        predict_fn: list of inputs -> list of results (same length, same order); it must be
+            picklable when the executor is a process pool. If it raises on a merged batch, each
+            request of the batch is scored again on its own, so only the request holding the
+            bad input sees the exception.
+        window_seconds: how long the first request of a batch waits for others (0 disables batching).
+        max_rows: a batch is dispatched immediately once it holds this many rows.
+        """
+        self.predict_fn, self.executor = predict_fn, executor
+        self.window_seconds, self.max_rows = window_seconds, max_rows
+        self._pending, self._pending_rows, self._flush_handle = [], 0, None
+        self.batches_dispatched, self.requests_batched, self.batches_split = 0, 0, 0
+
+    async def predict(self, inputs):
+        if not inputs: return []
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((inputs, future))
+        self._pending_rows += len(inputs)
+        if self._pending_rows >= self.max_rows or self.window_seconds <= 0:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.window_seconds, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        pending, self._pending, self._pending_rows = self._pending, [], 0
+        if not pending: return
+
+        self.batches_dispatched += 1
+        self.requests_batched += len(pending)
+        self._dispatch(pending)
+
+    def _dispatch(self, pending):
+        all_inputs = [item for inputs, _ in pending for item in inputs]
+        batch_future = asyncio.get_running_loop().run_in_executor(self.executor, self.predict_fn, all_inputs)
+        batch_future.add_done_callback(lambda done: self._distribute(done, pending))
+
+    def _distribute(self, done, pending):
+        if done.exception() is not None:
+            if len(pending) > 1:
+                self.batches_split += 1
+                for request in pending: self._dispatch([request])
+                return
+            _, future = pending[0]
+            if not future.done(): future.set_exception(done.exception())
+            return
+        results, start = done.result(), 0
+        for inputs, future in pending:
+            # A caller that gave up (e.g. the client disconnected) leaves a cancelled future behind.
+            if not future.done(): future.set_result(results[start:start + len(inputs)])
+            start += len(inputs)
@@ -0,0 +1,81 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# --- LATENCY METRICS ---
+# Minimal Prometheus text-format metrics (no client library needed): latency histograms with
+# one label, plus collector callbacks for values other modules already count (cache hits,
+# dropped log rows, ...). Rendered by the API's /metrics endpoint.
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _format_value(value):
+    return repr(value) if isinstance(value, float) else str(value)
+
+class Histogram:
+    def __init__(self, name, documentation, label, buckets=DEFAULT_BUCKETS):
+        self.name, self.documentation, self.label, self.buckets = name, documentation, label, tuple(buckets)
+        self._series = {}  # label value -> [per-bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, label_value, seconds):
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None: series = self._series[label_value] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += seconds
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, label_value):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(label_value, time.perf_counter() - start)
+
+    def summary(self):
+        """{label value: (count, total seconds)}, e.g. for benchmark reports."""
+        with self._lock:
+            return {label_value: (series[-1], series[-2]) for label_value, series in self._series.items()}
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_value, series in sorted(self._series.items()):
+                label = f'{self.label}="{_escape(label_value)}"'
+                cumulative = 0
+                for bound, count in zip(self.buckets, series[:len(self.buckets)]):
+                    cumulative += count
+                    lines.append(f'{self.name}_bucket{{{label},le="{_format_value(bound)}"}} {cumulative}')
+                lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {series[-1]}')
+                lines.append(f"{self.name}_sum{{{label}}} {series[-2]!r}")
+                lines.append(f"{self.name}_count{{{label}}} {series[-1]}")
+        return lines
+
+class MetricsRegistry:
+    def __init__(self):
+        self._histograms, self._collectors = [], []
+
+    def histogram(self, name, documentation, label, buckets=DEFAULT_BUCKETS):
+        histogram = Histogram(name, documentation, label, buckets)
+        self._histograms.append(histogram)
+        return histogram
+
+    def add_collector(self, collect):
+        """collect() returns (name, type, documentation, value) tuples, read at every render."""
+        self._collectors.append(collect)
+
+    def render(self):
+        lines = []
+        for histogram in self._histograms: lines.extend(histogram.render())
+        for collect in self._collectors:
+            for name, metric_type, documentation, value in collect():
+                lines += [f"# HELP {name} {documentation}", f"# TYPE {name} {metric_type}", f"{name} {_format_value(value)}"]
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,248 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+import joblib
+
+from compiled_models import BatchSizeRouter
+
+# --- MODEL REGISTRY & HOT RELOAD ---
+# The serving models live in an immutable "model set" dict. Loading a new set happens off to
+# the side and the registry then swaps a single reference, so every prediction batch sees one
+# consistent set: batches that started before a swap finish on the old models.
+# A training run writes MODEL_MANIFEST_FILE after all of its model files, and the registry
+# versions and loads model sets by that manifest alone, so it never picks up a set whose
+# files are still being replaced one by one.
+# Models are loaded with mmap_mode='r', which only shares plain numpy payloads (the arrays of
+# the compiled ensembles) through the page cache across uvicorn workers. sklearn trees are
+# still copied into each worker by Tree.__setstate__, and LightGBM boosters are rebuilt from
+# their model string, so those cost their full size in every worker.
+MODEL_FILES = {
+    'delay': "delay_predictor_model.pkl",
+    'encoder': "data_encoder.pkl",
+    'congestion': "congestion_model.pkl",
+    'anomaly': "anomaly_model.pkl",
+    'scaler': "anomaly_scaler.pkl",
+}
+# Compiled stand-ins for some of the models above (see compiled_models.py), exported by
+# train_all_models together with the source_version they were compiled from.
+COMPILED_MODEL_FILE = "compiled_models.pkl"
+# Lists the files of the last complete model set with their sizes and modification times
+MODEL_MANIFEST_FILE = "model_manifest.json"
+# Batch size up to which the compiled models are faster than their originals (measured with
+# benchmarks.compiled_models: the forest breaks even at about 128 rows)
+COMPILED_MAX_ROWS = 128
+
+def dump_model(obj, path):
+    """
+    joblib.dump via a temporary file and rename. Serving processes may have the previous file
+    memory-mapped; writing into it in place would corrupt (or SIGBUS) the models they are using.
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    joblib.dump(obj, tmp_path)
+    os.replace(tmp_path, path)
+
+def private_memory_bytes():
+    """
+    Resident memory private to this process (RssAnon in /proc/self/status), or None where that
+    is unavailable. This is what every extra worker costs: memory-mapped file pages shared
+    through the page cache are not included.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("RssAnon:"): return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+def _private_growth_mb(rss_before):
+    rss_after = private_memory_bytes()
+    return None if rss_before is None or rss_after is None else round((rss_after - rss_before) / 1e6, 1)
+
+def _file_stats(model_dir, filenames):
+    stats = {}
+    for filename in filenames:
+        stat = os.stat(os.path.join(model_dir, filename))
+        stats[filename] = [stat.st_size, stat.st_mtime_ns]
+    return stats
+
+def write_model_manifest(model_dir="."):
+    """
+    Records the model files now on disk (and COMPILED_MODEL_FILE if present) as one complete
+    model set. Call it last, after every file of a training run is written. Returns the version.
+    """
+    filenames = list(MODEL_FILES.values())
+    if os.path.exists(os.path.join(model_dir, COMPILED_MODEL_FILE)): filenames.append(COMPILED_MODEL_FILE)
+    files = _file_stats(model_dir, filenames)
+    version = hashlib.sha1(json.dumps(files, sort_keys=True).encode()).hexdigest()[:12]
+    path = os.path.join(model_dir, MODEL_MANIFEST_FILE)
+    with open(f"{path}.{os.getpid()}.tmp", "w") as f:
+        json.dump({'version': version, 'files': files, 'written_at': time.strftime('%Y-%m-%dT%H:%M:%S')}, f, indent=2)
+    os.replace(f"{path}.{os.getpid()}.tmp", path)
+    return version
+
+class ModelRegistry:
+    def __init__(self, model_dir=".", prepare=None, max_history=10, runtime="sklearn", compiled_max_rows=COMPILED_MAX_ROWS):
+        """
+        prepare: optional callable(model_set) run on every freshly loaded set before it is
+            swapped in, for derived objects such as the precompiled feature encoder.
+        runtime: "compiled" serves the models in COMPILED_MODEL_FILE when that file matches the
+            model files on disk; "sklearn" always serves the originals.
+        compiled_max_rows: with the compiled runtime, batches above this many rows go to the
+            original models, which are loaded when the first such batch arrives. None serves
+            every batch compiled and never loads the originals (slower large batches).
+        """
+        if runtime not in ("compiled", "sklearn"): raise ValueError(f"Unknown model runtime '{runtime}'.")
+        self.model_dir, self.prepare, self.max_history, self.runtime = model_dir, prepare, max_history, runtime
+        self.compiled_max_rows = compiled_max_rows
+        self._current = None
+        self._load_lock = threading.Lock()
+        self._swap_listeners = []
+        self._watcher, self._watcher_stop = None, threading.Event()
+        self.history = []
+
+    def current(self):
+        """The model set serving right now (None before the first load). Read it once per batch."""
+        return self._current
+
+    def add_swap_listener(self, callback):
+        """callback(new_set, old_set) runs after every swap, e.g. to invalidate caches."""
+        self._swap_listeners.append(callback)
+
+    def _fingerprint(self, files):
+        digest = hashlib.sha1()
+        for name, filename in sorted(files.items()):
+            stat = os.stat(os.path.join(self.model_dir, filename))
+            digest.update(f"{name}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+        return digest.hexdigest()[:12]
+
+    def source_fingerprint(self):
+        """Version id of the trained model files alone, which a compiled export records as its source."""
+        return self._fingerprint(MODEL_FILES)
+
+    def _read_manifest(self):
+        try:
+            with open(os.path.join(self.model_dir, MODEL_MANIFEST_FILE)) as f: return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def fingerprint(self):
+        """
+        Version id of the model set on disk: the version in MODEL_MANIFEST_FILE. Model
+        directories trained before the manifest existed fall back to a hash of the model
+        files' names, sizes and modification times.
+        """
+        manifest = self._read_manifest()
+        if manifest is not None: return manifest['version']
+        files = dict(MODEL_FILES)
+        if self.runtime == "compiled" and os.path.exists(os.path.join(self.model_dir, COMPILED_MODEL_FILE)):
+            files['compiled'] = COMPILED_MODEL_FILE
+        return self._fingerprint(files)
+
+    def _check_manifest(self, manifest):
+        """Raises unless the files on disk are exactly the ones the manifest lists."""
+        if manifest is None: return
+        try:
+            matches = _file_stats(self.model_dir, manifest['files']) == manifest['files']
+        except FileNotFoundError:
+            matches = False
+        if not matches:
+            raise RuntimeError(f"Model files differ from {MODEL_MANIFEST_FILE} (a training run is still writing them); keeping the current models.")
+
+    def _load_compiled(self, manifest):
+        """The compiled models if COMPILED_MODEL_FILE was exported from the model files now on disk, else None."""
+        path = os.path.join(self.model_dir, COMPILED_MODEL_FILE)
+        listed = manifest is None or COMPILED_MODEL_FILE in manifest['files']
+        if not listed or not os.path.exists(path):
+            print(f"[Model Registry] {COMPILED_MODEL_FILE} not found, serving the original models.")
+            return None
+        export = joblib.load(path, mmap_mode='r')
+        if export['source_version'] != self.source_fingerprint():
+            print(f"[Model Registry] {COMPILED_MODEL_FILE} is older than the model files, serving the original models.")
+            return None
+        return export['models']
+
+    def _original_loader(self, name):
+        """
+        load_original for the BatchSizeRouter of `name`: loads the original model, or returns
+        None if its file was replaced after this set was loaded (the newer file belongs to
+        another model set).
+        """
+        filename = MODEL_FILES[name]
+        expected = _file_stats(self.model_dir, [filename])
+
+        def load_original():
+            rss_before = private_memory_bytes()
+            model = joblib.load(os.path.join(self.model_dir, filename), mmap_mode='r')
+            try:
+                unchanged = _file_stats(self.model_dir, [filename]) == expected
+            except FileNotFoundError:
+                unchanged = False
+            if not unchanged:
+                print(f"[Model Registry] {filename} was replaced after this model set was loaded; its large batches stay compiled.")
+                return None
+            print(f"[Model Registry] Loaded the original {name} model for batches over {self.compiled_max_rows} rows (private memory +{_private_growth_mb(rss_before)} MB).")
+            return model
+        return load_original
+
+    def load(self):
+        """Loads the model files into a new set and swaps it in. Returns the new version."""
+        with self._load_lock:
+            rss_before = private_memory_bytes()
+            version, manifest = self.fingerprint(), self._read_manifest()
+            self._check_manifest(manifest)
+            compiled = (self._load_compiled(manifest) if self.runtime == "compiled" else None) or {}
+            model_set = {name: joblib.load(os.path.join(self.model_dir, filename), mmap_mode='r') for name, filename in MODEL_FILES.items() if name not in compiled}
+            for name, compiled_model in compiled.items():
+                model_set[name] = compiled_model if self.compiled_max_rows is None else BatchSizeRouter(compiled_model, self._original_loader(name), self.compiled_max_rows)
+            if self.prepare: self.prepare(model_set)
+            if version != self.fingerprint():
+                raise RuntimeError("Model files changed while loading; keeping the current models.")
+            self._check_manifest(manifest)
+            model_set['version'], model_set['runtime'] = version, "compiled" if compiled else "sklearn"
+            private_mb = _private_growth_mb(rss_before)
+            print(f"[Model Registry] Serving version {version} ({model_set['runtime']} runtime), private memory +{private_mb} MB.")
+
+            old_set, self._current = self._current, model_set
+            self.history = (self.history + [{'version': version, 'runtime': model_set['runtime'], 'private_mb': private_mb, 'loaded_at': time.strftime('%Y-%m-%dT%H:%M:%S')}])[-self.max_history:]
+        for callback in self._swap_listeners: callback(model_set, old_set)
+        return version
+
+    def reload_if_changed(self):
+        """Loads the files on disk if they differ from the serving version. Returns the new version or None."""
+        current = self._current
+        if current is not None and current['version'] == self.fingerprint(): return None
+        return self.load()
+
+    def start_watcher(self, interval_seconds):
+        """
+        Polls the model version (MODEL_MANIFEST_FILE, see fingerprint) and hot-reloads when it
+        changes. A change must look the same on two consecutive polls before it is loaded.
+        """
+        if self._watcher is not None or interval_seconds <= 0: return
+        self._watcher_stop.clear()
+
+        def watch():
+            last_seen = None
+            while not self._watcher_stop.wait(interval_seconds):
+                try:
+                    seen = self.fingerprint()
+                    current = self._current
+                    if seen == last_seen and (current is None or seen != current['version']):
+                        print(f"[Model Registry] Model files changed on disk, reloading as version {seen}...")
+                        self.load()
+                    last_seen = seen
+                except Exception as e:
+                    print(f"[Model Registry] Reload failed, still serving the previous models: {e}")
+
+        self._watcher = threading.Thread(target=watch, name="model-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self):
+        if self._watcher is None: return
+        self._watcher_stop.set()
+        self._watcher.join()
+        self._watcher = None
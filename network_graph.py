@@ -0,0 +1,100 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+# --- COMPACT NETWORK GRAPH ---
+# network_map.json is a pretty-printed adjacency dict that every process used to parse on start.
+# The same graph is also saved as network_graph.npz: a station code table plus CSR arrays, where
+# the neighbours of station i are codes[indices[indptr[i]:indptr[i + 1]]] in the map's order.
+# The .npz records the hash of the JSON it was built from, so a hand-edited or rebuilt JSON is
+# never shadowed by a stale graph file.
+NETWORK_MAP_FILE = "network_map.json"
+NETWORK_GRAPH_FILE = "network_graph.npz"
+GRAPH_FORMAT_VERSION = 1
+
+def network_map_to_csr(network_map):
+    """
+    Integer-indexed form of the network map: station codes (the map's own keys first, then
+    neighbour-only stations) and CSR arrays where neighbours of station i are
+    indices[indptr[i]:indptr[i + 1]], in the map's order.
+    """
+    codes = list(network_map.keys())
+    code_index = {code: i for i, code in enumerate(codes)}
+    for neighbours in network_map.values():
+        for code in neighbours:
+            if code not in code_index:
+                code_index[code] = len(codes)
+                codes.append(code)
+    indptr = np.zeros(len(codes) + 1, dtype=np.int64)
+    indptr[1:len(network_map) + 1] = np.cumsum([len(neighbours) for neighbours in network_map.values()])
+    indptr[len(network_map) + 1:] = indptr[len(network_map)]
+    indices = np.array([code_index[code] for neighbours in network_map.values() for code in neighbours], dtype=np.int32)
+    return np.array(codes, dtype=object), indptr, indices
+
+def csr_to_network_map(codes, indptr, indices):
+    """Inverse of network_map_to_csr. Stations without outgoing edges are not keys, as in the JSON."""
+    codes = list(codes)
+    neighbour_codes = [codes[i] for i in indices.tolist()]
+    bounds = indptr.tolist()
+    return {code: neighbour_codes[start:end] for code, start, end in zip(codes, bounds, bounds[1:]) if end > start}
+
+def _file_sha256(path):
+    with open(path, 'rb') as f: return hashlib.sha256(f.read()).hexdigest()
+
+def save_network_graph(network_map, graph_path=NETWORK_GRAPH_FILE, source_path=NETWORK_MAP_FILE):
+    """
+    Writes the CSR form of network_map (temp file + rename), stamped with source_path's hash.
+    Stations are ordered by code, like the keys of the JSON dump, so both files load identically.
+    """
+    codes, indptr, indices = network_map_to_csr(dict(sorted(network_map.items())))
+    source_sha256 = _file_sha256(source_path) if source_path and os.path.exists(source_path) else ""
+    tmp_path = f"{graph_path}.{os.getpid()}.tmp.npz"
+    np.savez(
+        tmp_path, codes=np.frombuffer("\n".join(codes.tolist()).encode('utf-8'), dtype=np.uint8),
+        indptr=indptr.astype(np.int32), indices=indices,
+        version=np.int64(GRAPH_FORMAT_VERSION), source_sha256=np.str_(source_sha256),
+    )
+    os.replace(tmp_path, graph_path)
+    return graph_path
+
+def load_network_graph(graph_path=NETWORK_GRAPH_FILE, source_path=NETWORK_MAP_FILE):
+    """
+    Returns (codes, indptr, indices) from graph_path, or None when the file is missing, has an
+    old format, or was built from a different source_path than the one on disk.
+    """
+    if not os.path.exists(graph_path): return None
+    with np.load(graph_path, allow_pickle=False) as graph:
+        if int(graph['version']) != GRAPH_FORMAT_VERSION: return None
+        if source_path and os.path.exists(source_path) and str(graph['source_sha256']) != _file_sha256(source_path):
+            print(f"[Warning] {graph_path} is out of date with {source_path}; reading the JSON instead.")
+            return None
+        # The code table is stored as one newline-separated UTF-8 blob: far cheaper to load than a string array
+        blob = graph['codes'].tobytes().decode('utf-8')
+        codes = np.array(blob.split("\n") if blob else [], dtype=object)
+        return codes, graph['indptr'].astype(np.int64), graph['indices']
+
+def load_network(source_path=NETWORK_MAP_FILE, graph_path=NETWORK_GRAPH_FILE):
+    """
+    Returns (network_map, (codes, indptr, indices)): the adjacency dict and its CSR form, read
+    from the binary graph when it is current and from the JSON otherwise.
+    Raises FileNotFoundError when neither file exists.
+    """
+    graph = load_network_graph(graph_path, source_path)
+    if graph is not None: return csr_to_network_map(*graph), graph
+    with open(source_path, 'r') as f: network_map = json.load(f)
+    return network_map, network_map_to_csr(network_map)
+
+def load_network_map(source_path=NETWORK_MAP_FILE, graph_path=NETWORK_GRAPH_FILE):
+    """The adjacency dict alone; see load_network."""
+    graph = load_network_graph(graph_path, source_path)
+    if graph is not None: return csr_to_network_map(*graph)
+    with open(source_path, 'r') as f: return json.load(f)
+
+
+if __name__ == "__main__":
+    # Converts an existing network_map.json without rebuilding it from the Kaggle data.
+    with open(NETWORK_MAP_FILE, 'r') as f: network_map = json.load(f)
+    save_network_graph(network_map)
+    print(f"  -> Network graph saved to {NETWORK_GRAPH_FILE} ({len(network_map)} stations).")
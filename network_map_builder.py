@@ -1,22 +1,26 @@
+import argparse
 import json
+import math
 import pandas as pd
+from asset_cache import load_compiled_assets
+from network_graph import NETWORK_GRAPH_FILE, save_network_graph
 
-def create_network_map_from_kaggle_data():
+def create_network_map_from_kaggle_data(streaming=False, chunk_size=1 << 20):
     """
     Reads the trains.json and schedules.json files to build and save the network_map.json
     for Southern (SR) and South Western (SWR) railway zones.
+    With streaming=True, schedules.json is parsed incrementally instead of being loaded whole.
     """
     print("--- Starting Network Map Build from Kaggle Data ---")
+    if streaming:
+        return create_network_map_streaming(chunk_size)
 
     # --- Step 1: Load all datasets ---
     try:
-        print("  -> Loading trains.json...")
-        with open('trains.json', 'r', encoding='utf-8') as f:
-            trains_data = json.load(f)
-
-        print("  -> Loading schedules.json...")
-        # schedules.json is very large, so we process it efficiently
-        schedules_df = pd.read_json('schedules.json')
+        print("  -> Loading trains.json and schedules.json (compiled asset cache)...")
+        # schedules.json is very large, so it is parsed once into the Parquet cache and reused
+        assets = load_compiled_assets(tables=('trains', 'schedules'))
+        trains_df, schedules_df = assets['trains'], assets['schedules']
 
         print("  -> Loading stations.json...")
         with open('stations.json', 'r', encoding='utf-8') as f:
@@ -28,11 +32,7 @@ def create_network_map_from_kaggle_data():
 
     # --- Step 2: Identify all trains in the Southern (SR) and South Western (SWR) zones ---
     print("\n--- Filtering for Southern (SR) and South Western (SWR) trains ---")
-    sr_swr_train_numbers = set()
-    for train in trains_data['features']:
-        zone = train['properties'].get('zone')
-        if zone in ['SR', 'SWR']:
-            sr_swr_train_numbers.add(train['properties'].get('number'))
+    sr_swr_train_numbers = set(trains_df.loc[trains_df['zone'].isin(['SR', 'SWR']), 'number'])
     
     print(f"  -> Found {len(sr_swr_train_numbers)} unique trains in SR and SWR zones.")
     if not sr_swr_train_numbers:
@@ -47,30 +47,48 @@ def create_network_map_from_kaggle_data():
 
     # --- Step 4: Reconstruct routes and build the network map ---
     print("\n--- Building network map from schedules ---")
+    network_map, processed_trains = build_network_map(filtered_schedules)
+    print(f"  -> Processed {processed_trains} train routes.")
+    save_network_map(network_map)
+
+def build_network_map(filtered_schedules):
+    """
+    Builds the adjacency dict from schedule rows (train_number, day, arrival, station_code) in
+    one vectorized pass. Returns (network_map, number of train routes).
+    """
     network_map = {}
-    
     # Clean up arrival times for proper sorting
     # Replace 'None' with a very early time to ensure start stations come first
-    filtered_schedules['arrival_clean'] = filtered_schedules['arrival'].replace({'None': '00:00:00'})
+    filtered_schedules = filtered_schedules.assign(arrival_clean=filtered_schedules['arrival'].replace({'None': '00:00:00'}))
     
-    # Group by train number and sort each train's route chronologically
-    grouped = filtered_schedules.sort_values(by=['day', 'arrival_clean']).groupby('train_number')
-    
-    processed_trains = 0
-    for train_number, schedule in grouped:
-        stations = schedule['station_code'].tolist()
-        for i in range(len(stations) - 1):
-            current_station = stations[i]
-            next_station = stations[i+1]
-            if current_station and next_station:
-                if current_station not in network_map:
-                    network_map[current_station] = []
-                if next_station not in network_map[current_station]:
-                    network_map[current_station].append(next_station)
-        processed_trains += 1
+    # Sort each train's route chronologically, then lay the trains out one after another
+    # (stable, so stops with equal times keep their order) in train-number order
+    routes = filtered_schedules.sort_values(by=['day', 'arrival_clean']).sort_values(by='train_number', kind='stable')
 
-    print(f"  -> Processed {processed_trains} train routes.")
+    # Consecutive stops of the same train are the edges; keep the first occurrence of each, so
+    # every station's neighbours come out in the order the trains first reveal them
+    train_numbers = routes['train_number'].to_numpy()
+    stations = routes['station_code'].to_numpy(dtype=object)
+    has_station = pd.notna(stations) & (stations != '')
+    is_edge = (train_numbers[:-1] == train_numbers[1:]) & has_station[:-1] & has_station[1:]
+    edges = pd.DataFrame({'source': stations[:-1][is_edge], 'target': stations[1:][is_edge]}).drop_duplicates()
+    for current_station, next_station in zip(edges['source'].tolist(), edges['target'].tolist()):
+        network_map.setdefault(current_station, []).append(next_station)
 
+    return network_map, routes['train_number'].nunique()
+
+def add_route_to_network_map(network_map, stations, seen_edges):
+    """
+    Adds an edge for every consecutive pair of stops in one train's chronological route.
+    seen_edges is the set of (station, next_station) pairs already in the map, shared across
+    calls, so checking for a duplicate edge does not scan the station's neighbour list.
+    """
+    for current_station, next_station in zip(stations, stations[1:]):
+        if current_station and next_station and (current_station, next_station) not in seen_edges:
+            seen_edges.add((current_station, next_station))
+            network_map.setdefault(current_station, []).append(next_station)
+
+def save_network_map(network_map):
     if not network_map:
         print("\n--- CRITICAL ERROR: FAILED TO BUILD NETWORK MAP ---")
         return
@@ -80,8 +98,112 @@ def create_network_map_from_kaggle_data():
     with open("network_map.json", "w") as f:
         json.dump(network_map, f, indent=2, sort_keys=True)
     print("  -> Network map saved to network_map.json")
+    save_network_graph(network_map)
+    print(f"  -> Compact graph saved to {NETWORK_GRAPH_FILE}")
     print("\n--- MAP BUILD COMPLETE ---")
 
+def iter_json_records(path, chunk_size=1 << 20):
+    """
+    Yields the records of a JSON array file (or of an NDJSON file, one record per line)
+    while holding only about chunk_size characters of the file in memory at a time.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as f:
+        buffer, pos, eof = "", 0, False
+
+        def fill():
+            nonlocal buffer, pos, eof
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buffer, pos = buffer[pos:] + chunk, 0
+
+        def skip(separators):
+            nonlocal pos
+            while True:
+                while pos < len(buffer) and buffer[pos] in separators: pos += 1
+                if pos < len(buffer) or eof: return
+                fill()
+
+        fill()
+        skip(" \t\r\n")
+        is_array = buffer[pos:pos + 1] == "["
+        if is_array: pos += 1
+        while True:
+            skip(" \t\r\n," if is_array else " \t\r\n")
+            if pos >= len(buffer) or (is_array and buffer[pos] == "]"): return
+            try:
+                record, end = decoder.raw_decode(buffer, pos)
+                # A value ending exactly at the buffer edge may be cut short (e.g. a number); read on to be sure.
+                if end == len(buffer) and not eof: raise json.JSONDecodeError("Record may continue in the next chunk", buffer, end)
+            except json.JSONDecodeError:
+                if eof: raise
+                fill()
+                continue
+            yield record
+            pos = end
+
+def _schedule_sort_key(stop):
+    """Orders one train's stops like sort_values(by=['day', 'arrival_clean']): missing values last."""
+    day, arrival_clean, _ = stop
+    day_missing = day is None or (isinstance(day, float) and math.isnan(day))
+    return (day_missing, 0 if day_missing else day, not isinstance(arrival_clean, str), arrival_clean if isinstance(arrival_clean, str) else "")
+
+def create_network_map_streaming(chunk_size=1 << 20):
+    """
+    Streaming build for machines that cannot hold schedules.json in memory. Records are parsed
+    one at a time and only SR/SWR stops are kept, as (day, arrival, station) tuples, so peak memory
+    is bounded by the size of the SR/SWR timetable, not by the size of the input file.
+    """
+    try:
+        print("  -> Loading trains.json...")
+        with open('trains.json', 'r', encoding='utf-8') as f:
+            trains_data = json.load(f)
+    except FileNotFoundError as e:
+        print(f"\n[CRITICAL ERROR] File not found: {e.filename}. Please ensure trains.json and schedules.json are in the same directory.")
+        return
+
+    print("\n--- Filtering for Southern (SR) and South Western (SWR) trains ---")
+    sr_swr_train_numbers = {
+        str(train['properties']['number'])
+        for train in trains_data['features']
+        if train['properties'].get('zone') in ['SR', 'SWR'] and train['properties'].get('number') is not None
+    }
+    del trains_data
+    print(f"  -> Found {len(sr_swr_train_numbers)} unique trains in SR and SWR zones.")
+    if not sr_swr_train_numbers:
+        print("[Warning] No trains found for SR or SWR zones. The map will be empty.")
+        return
+
+    print("\n--- Streaming schedules.json and filtering for target trains ---")
+    routes, scanned, kept = {}, 0, 0
+    try:
+        for record in iter_json_records('schedules.json', chunk_size):
+            scanned += 1
+            train_number = str(record.get('train_number'))
+            if train_number not in sr_swr_train_numbers: continue
+            arrival = record.get('arrival')
+            # Replace 'None' with a very early time to ensure start stations come first
+            arrival_clean = '00:00:00' if arrival == 'None' else arrival
+            routes.setdefault(train_number, []).append((record.get('day'), arrival_clean, record.get('station_code')))
+            kept += 1
+    except FileNotFoundError as e:
+        print(f"\n[CRITICAL ERROR] File not found: {e.filename}. Please ensure trains.json and schedules.json are in the same directory.")
+        return
+    print(f"  -> Scanned {scanned} schedule entries, kept {kept} for our target trains.")
+
+    print("\n--- Building network map from schedules ---")
+    network_map, seen_edges, processed_trains = {}, set(), len(routes)
+    for train_number in sorted(routes):
+        # sorted() is stable, so stops with equal keys keep their file order, as in the in-memory build
+        stops = sorted(routes.pop(train_number), key=_schedule_sort_key)
+        add_route_to_network_map(network_map, [station for _, _, station in stops], seen_edges)
+    print(f"  -> Processed {processed_trains} train routes.")
+    save_network_map(network_map)
+
 
 if __name__ == "__main__":
-    create_network_map_from_kaggle_data()
+    parser = argparse.ArgumentParser(description="Build network_map.json for the SR/SWR zones from the Kaggle dataset.")
+    parser.add_argument("--stream", action="store_true", help="Parse schedules.json incrementally with bounded memory.")
+    parser.add_argument("--chunk-size", type=int, default=1 << 20, help="Characters read per chunk in streaming mode.")
+    args = parser.parse_args()
+    create_network_map_from_kaggle_data(streaming=args.stream, chunk_size=args.chunk_size)
@@ -0,0 +1,61 @@
+import threading
+from collections import OrderedDict
+
+# --- PREDICTION CACHE ---
+# The model inputs form a small discrete space (train type, station, weekday, hour, weather,
+# traffic), and dashboards and what-if endpoints keep asking for the same combinations.
+# PredictionCache is a bounded LRU in front of the models, keyed on that resolved tuple.
+
+class PredictionCache:
+    def __init__(self, max_entries=50_000):
+        """max_entries=0 disables caching (every lookup is a miss and nothing is stored)."""
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.hits = self.misses = self.evictions = 0
+
+    def get_many(self, keys):
+        """
+        Returns (values, generation): a copy of each cached prediction or None, plus the model
+        generation the lookup saw. Pass that generation back to put_many.
+        """
+        values = []
+        with self._lock:
+            for key in keys:
+                value = self._entries.get(key)
+                if value is None:
+                    self.misses += 1
+                    values.append(None)
+                else:
+                    self.hits += 1
+                    self._entries.move_to_end(key)
+                    values.append(dict(value))
+            return values, self._generation
+
+    def put_many(self, keys, values, generation):
+        """Stores the predictions unless the models were swapped since the matching get_many."""
+        if self.max_entries <= 0: return
+        with self._lock:
+            if generation != self._generation: return
+            for key, value in zip(keys, values):
+                self._entries[key] = dict(value)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self):
+        """Drops every entry; call whenever a different model set starts serving."""
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries), "max_entries": self.max_entries, "generation": self._generation,
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
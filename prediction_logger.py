@@ -0,0 +1,125 @@
+import csv
+import io
+import os
+import queue
+import threading
+import time
+
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory file locks, appends are only safe within one process
+    fcntl = None
+
+# --- BUFFERED PREDICTION LOGGING ---
+# Request handlers only put rows on an in-memory queue. A single writer thread per process
+# drains it and appends in batches, flushing when FLUSH_ROWS rows are waiting or FLUSH_SECONDS
+# have passed, so file I/O never sits on the request path.
+_STOP = object()
+
+class PredictionLogger:
+    def __init__(self, csv_path, parquet_dir=None, flush_rows=500, flush_seconds=2.0, max_queue=100_000, on_flush=None):
+        """
+        csv_path: CSV file appended to by every worker (None disables the CSV sink).
+        parquet_dir: optional directory for the columnar sink; each flush writes one
+            part-<pid>-<time>.parquet file, so workers never share a file.
+        on_flush: optional callable(row_count, seconds) run on the writer thread after each flush.
+        """
+        self.csv_path, self.parquet_dir = csv_path, parquet_dir
+        self.flush_rows, self.flush_seconds, self.on_flush = flush_rows, flush_seconds, on_flush
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self.dropped_rows = 0
+
+    def log(self, row: dict):
+        """Never blocks: if the writer has fallen max_queue rows behind, the row is dropped and counted."""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.dropped_rows += 1
+
+    def queued_rows(self):
+        return self._queue.qsize()
+
+    def close(self):
+        """Flushes everything queued so far and stops the writer thread (call at shutdown)."""
+        with self._start_lock:
+            if self._thread is None: return
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+        if self.dropped_rows:
+            print(f"[Prediction Log] {self.dropped_rows} rows were dropped because the log queue was full.")
+
+    def _ensure_started(self):
+        if self._thread is not None: return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="prediction-logger", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        batch, deadline = [], None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                row = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                row = None
+            if row is _STOP:
+                self._flush(batch)
+                return
+            if row is not None:
+                batch.append(row)
+                if deadline is None: deadline = time.monotonic() + self.flush_seconds
+            if len(batch) >= self.flush_rows or (deadline is not None and time.monotonic() >= deadline):
+                self._flush(batch)
+                batch, deadline = [], None
+
+    def _flush(self, rows):
+        if not rows: return
+        start = time.perf_counter()
+        try:
+            if self.csv_path: self._write_csv(rows)
+            if self.parquet_dir: self._write_parquet(rows)
+        except Exception as e:
+            print(f"[Prediction Log Error] Could not write {len(rows)} rows: {e}")
+        if self.on_flush: self.on_flush(len(rows), time.perf_counter() - start)
+
+    def _write_csv(self, rows):
+        with open(self.csv_path, mode='a', newline='', encoding='utf-8') as f:
+            # The exclusive lock keeps batches from different uvicorn workers from interleaving,
+            # and checking the size under it means exactly one worker writes the header.
+            if fcntl: fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+                if f.seek(0, os.SEEK_END) == 0: writer.writeheader()
+                writer.writerows(rows)
+                f.flush()
+            finally:
+                if fcntl: fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _write_parquet(self, rows):
+        os.makedirs(self.parquet_dir, exist_ok=True)
+        path = os.path.join(self.parquet_dir, f"part-{os.getpid()}-{time.time_ns()}.parquet")
+        pd.DataFrame(rows).to_parquet(f"{path}.tmp")
+        os.replace(f"{path}.tmp", path)
+
+def read_logged_rows(csv_path, offset=0):
+    """
+    The rows appended to the CSV log after byte `offset`, as a DataFrame, and the offset to
+    resume from next time. Only complete lines are read, so a batch still being appended is
+    picked up by the next call. A log shorter than `offset` (rotated) is read from the start.
+    """
+    if not os.path.exists(csv_path): return pd.DataFrame(), 0
+    with open(csv_path, 'rb') as f:
+        header = f.readline()
+        if not offset or offset < len(header) or offset > os.fstat(f.fileno()).st_size: offset = len(header)
+        f.seek(offset)
+        chunk = f.read()
+    chunk = chunk[:chunk.rfind(b'\n') + 1]
+    if not chunk: return pd.DataFrame(), offset
+    return pd.read_csv(io.BytesIO(header + chunk), dtype={'train_number': str, 'track_section': str}), offset + len(chunk)
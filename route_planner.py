@@ -0,0 +1,98 @@
+import heapq
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import shortest_path
+
+# --- MULTI-HOP ROUTE PLANNER ---
+# Searches the integer-indexed network graph (network_graph.load_network_graph) for the k
+# lowest-cost simple paths between two stations. Costs live on nodes: entering a station costs
+# its predicted delay plus a fixed per-hop penalty, so the search needs model predictions only
+# for the stations it may visit. That set is the "corridor": stations whose hop distance via
+# them is at most max_detour_hops longer than the shortest route, found with two C-level BFS
+# passes over the graph and scored in one batch. Yen's algorithm then runs A* restricted to the
+# corridor, with (hops to target) x (per-hop penalty) as the admissible heuristic. Every tie is
+# broken by station index, so the same inputs always give the same paths.
+
+class RoutePlanner:
+    def __init__(self, codes, indptr, indices):
+        self.codes = [str(code) for code in codes]
+        self.code_index = {code: i for i, code in enumerate(self.codes)}
+        n = len(self.codes)
+        self.graph = csr_matrix((np.ones(len(indices), dtype=np.float64), indices, indptr), shape=(n, n))
+        self.reverse_graph = self.graph.transpose().tocsr()
+        bounds = indptr.tolist()
+        neighbour_list = indices.tolist()
+        self.neighbours = [neighbour_list[bounds[i]:bounds[i + 1]] for i in range(n)]
+
+    def hop_distances(self, station_index, reverse=False):
+        """Hops from station_index to every station (to it, with reverse=True); -1 where unreachable."""
+        graph = self.reverse_graph if reverse else self.graph
+        distances = shortest_path(graph, method='D', unweighted=True, indices=station_index)
+        return np.where(np.isfinite(distances), distances, -1).astype(np.int64)
+
+    def corridor(self, source, target, max_detour_hops):
+        """
+        Returns (corridor station indices in index order, hops-to-target array), or None when
+        target cannot be reached from source.
+        """
+        from_source = self.hop_distances(source)
+        if from_source[target] < 0: return None
+        to_target = self.hop_distances(target, reverse=True)
+        reachable = (from_source >= 0) & (to_target >= 0)
+        in_corridor = reachable & (from_source + to_target <= from_source[target] + max_detour_hops)
+        return np.flatnonzero(in_corridor), to_target
+
+    def _search(self, source, target, node_cost, heuristic, banned_nodes, banned_edges):
+        """A* over nodes with a finite cost. Returns (cost, path) or None."""
+        best = {source: 0.0}
+        previous = {}
+        heap = [(heuristic[source], 0.0, source)]
+        closed = set()
+        while heap:
+            _, cost, node = heapq.heappop(heap)
+            if node in closed: continue
+            if node == target:
+                path = [node]
+                while node != source:
+                    node = previous[node]
+                    path.append(node)
+                return cost, path[::-1]
+            closed.add(node)
+            for neighbour in self.neighbours[node]:
+                step = node_cost[neighbour]
+                if step == float('inf') or neighbour in closed or neighbour in banned_nodes or (node, neighbour) in banned_edges: continue
+                new_cost = cost + step
+                if new_cost < best.get(neighbour, float('inf')):
+                    best[neighbour], previous[neighbour] = new_cost, node
+                    heapq.heappush(heap, (new_cost + heuristic[neighbour], new_cost, neighbour))
+        return None
+
+    def k_shortest_paths(self, source, target, node_cost, heuristic, k):
+        """
+        Yen's k shortest simple paths. node_cost[i] is the cost of entering station i (inf outside
+        the corridor); heuristic[i] must never exceed the true remaining cost from i.
+        Returns up to k (cost, [station indices]) pairs, cheapest first.
+        """
+        first = self._search(source, target, node_cost, heuristic, set(), set())
+        if first is None: return []
+        accepted, candidates, seen = [first], [], {tuple(first[1])}
+        while len(accepted) < k:
+            _, last_path = accepted[-1]
+            root_cost = 0.0
+            for i, spur in enumerate(last_path[:-1]):
+                root = last_path[:i + 1]
+                banned_edges = {(path[i], path[i + 1]) for _, path in accepted if path[:i + 1] == root}
+                banned_nodes = set(root[:-1])
+                # Most stations on a rail corridor have a single way on; skip spurs with nowhere new to go.
+                if any(node_cost[n] != float('inf') and n not in banned_nodes and (spur, n) not in banned_edges for n in self.neighbours[spur]):
+                    spur_result = self._search(spur, target, node_cost, heuristic, banned_nodes, banned_edges)
+                    if spur_result is not None:
+                        path = root[:-1] + spur_result[1]
+                        if tuple(path) not in seen:
+                            seen.add(tuple(path))
+                            heapq.heappush(candidates, (root_cost + spur_result[0], path))
+                root_cost += node_cost[last_path[i + 1]]
+            if not candidates: break
+            accepted.append(heapq.heappop(candidates))
+        return accepted
@@ -0,0 +1,8 @@
+# --- SIMULATION CONSTANTS ---
+# The condition values the training data is simulated with, and so the only ones the encoder
+# and models have seen. Kept apart from train_and_serve so the benchmarks and load generators
+# can draw realistic inputs without importing (and so starting) the service.
+SIM_TRAIN_TYPES = ["Express", "Passenger", "Goods", "Superfast"]
+SIM_WEATHER_CONDITIONS = ["Clear", "Rain", "Fog", "Storm", "Extreme Heat"]
+SIM_WEATHER_IMPACT = {"Clear": 1.0, "Rain": 1.3, "Fog": 1.9, "Storm": 2.8, "Extreme Heat": 1.4}
+SIM_DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
@@ -0,0 +1,92 @@
+"""
+Compiled models (compiled_models.py) behind a BatchSizeRouter against the sklearn models they
+were compiled from: a small forest, IsolationForest and scaler on the serving feature layout,
+scored at batch sizes on both sides of max_rows, with unknown and missing categories.
+"""
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import IsolationForest, RandomForestClassifier
+from sklearn.preprocessing import StandardScaler
+
+from compiled_models import BatchSizeRouter, compile_models
+from feature_encoder import FeatureEncoder
+from training_pipeline import build_feature_matrix
+
+CAT_FEATURES = ['train_type', 'track_section', 'day_of_week', 'weather_condition']
+NUM_FEATURES = ['hour_of_day', 'trains_in_section_hour']
+STATIONS = [f"ST{i}" for i in range(40)]
+MAX_ROWS = 16
+BATCH_SIZES = [1, MAX_ROWS, MAX_ROWS + 1, 300]
+
+
+def random_rows(rng, n, unknown_share=0.0):
+    """Feature rows; with unknown_share, that share of categorical values is one the encoder never saw."""
+    def pick(values, unknown):
+        return unknown if rng.random() < unknown_share else rng.choice(values)
+    return pd.DataFrame([{
+        'train_type': pick(["Express", "Passenger", "Goods", "Superfast"], "Unknown"), 'track_section': pick(STATIONS, "NOT_A_STATION"),
+        'day_of_week': pick(["Monday", "Friday", "Sunday"], "Holiday"), 'weather_condition': pick(["Clear", "Rain", "Fog"], "Hail"),
+        'hour_of_day': rng.randrange(24), 'trains_in_section_hour': rng.randrange(10),
+    } for _ in range(n)])
+
+
+@pytest.fixture(scope="module")
+def models():
+    """(sklearn models, compiled models, scoring rows as (X, anomaly features))."""
+    rng = random.Random(0)
+    train = random_rows(rng, 1500)
+    X_train, encoder = build_feature_matrix(train, CAT_FEATURES, NUM_FEATURES)
+    # Congestion driven by the station and the hour, so the trees split on many one-hot columns
+    score = train['track_section'].map({station: i % 7 for i, station in enumerate(STATIONS)}) + train['hour_of_day'] / 6 + np.random.default_rng(0).normal(0, 1, len(train))
+    congestion = pd.cut(score, [-np.inf, 3, 6, np.inf], labels=["Low", "Medium", "High"]).astype(str)
+    anomaly_train = np.column_stack([np.random.default_rng(1).exponential(15, len(train)), train['trains_in_section_hour']])
+    scaler = StandardScaler().fit(anomaly_train)
+
+    originals = {
+        'congestion': RandomForestClassifier(n_estimators=20, random_state=0).fit(X_train, congestion),
+        'anomaly': IsolationForest(n_estimators=50, random_state=0).fit(scaler.transform(anomaly_train)),
+        'scaler': scaler,
+        'feature_encoder': FeatureEncoder(encoder, CAT_FEATURES, NUM_FEATURES),
+    }
+    compiled = compile_models(originals)
+
+    # Known values, partly unknown ones, and rows with no known category at all (an all-zero one-hot block)
+    scoring = pd.concat([random_rows(rng, 150), random_rows(rng, 100, unknown_share=0.5), random_rows(rng, 50, unknown_share=1.0)], ignore_index=True)
+    scoring.loc[::10, NUM_FEATURES] = 0
+    X = originals['feature_encoder'].encode(scoring[CAT_FEATURES + NUM_FEATURES].to_dict('records'))
+    anomaly_features = np.column_stack([np.random.default_rng(2).exponential(20, len(scoring)), scoring['trains_in_section_hour']])
+    return originals, compiled, (X, anomaly_features)
+
+
+def routers(originals, compiled):
+    return {name: BatchSizeRouter(compiled[name], lambda name=name: originals[name], MAX_ROWS) for name in compiled}
+
+
+@pytest.mark.parametrize("batch_rows", BATCH_SIZES)
+def test_router_matches_originals_on_both_sides_of_max_rows(models, batch_rows):
+    originals, compiled, (X, anomaly_features) = models
+    served = routers(originals, compiled)
+    assert X[-50:, len(NUM_FEATURES):].nnz == 0  # the last rows have no one-hot column set
+
+    for start in range(0, X.shape[0], batch_rows):
+        rows, features = X[start:start + batch_rows], anomaly_features[start:start + batch_rows]
+        np.testing.assert_array_equal(served['congestion'].predict(rows), originals['congestion'].predict(rows))
+        np.testing.assert_array_equal(served['congestion'].predict_proba(rows), originals['congestion'].predict_proba(rows))
+        scaled = served['scaler'].transform(features)
+        np.testing.assert_array_equal(scaled, originals['scaler'].transform(features))
+        np.testing.assert_array_equal(served['anomaly'].predict(scaled), originals['anomaly'].predict(scaled))
+        np.testing.assert_array_equal(served['anomaly'].score_samples(scaled), originals['anomaly'].score_samples(scaled))
+
+    # The originals are only loaded once a batch is larger than max_rows
+    assert all((router.original is not None) == (batch_rows > MAX_ROWS) for router in served.values())
+
+
+def test_router_stays_compiled_when_the_original_is_unavailable(models):
+    originals, compiled, (X, _) = models
+    router = BatchSizeRouter(compiled['congestion'], lambda: None, MAX_ROWS)
+
+    np.testing.assert_array_equal(router.predict(X), originals['congestion'].predict(X))
+    assert router.original is None
@@ -0,0 +1,54 @@
+"""
+MicroBatcher (inference_executor.py): requests merged into one batch, and a bad input in a
+merged batch failing only the request it came from.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from pydantic import ValidationError
+
+from inference_executor import MicroBatcher
+from train_and_serve import MAX_TRAINS_IN_SECTION_HOUR, TrainInfo
+
+
+def double_or_fail(inputs):
+    if any(value < 0 for value in inputs): raise ValueError("negative input")
+    return [value * 2 for value in inputs]
+
+
+def run_requests(requests, window_seconds=0.05):
+    """Sends every request to one MicroBatcher at once; returns (results or exceptions, batcher)."""
+    async def main():
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            batcher = MicroBatcher(double_or_fail, executor, window_seconds=window_seconds, max_rows=1000)
+            results = await asyncio.gather(*(batcher.predict(inputs) for inputs in requests), return_exceptions=True)
+            return results, batcher
+    return asyncio.run(main())
+
+
+def test_requests_share_one_batch():
+    results, batcher = run_requests([[1, 2], [3], [4, 5, 6]])
+    assert results == [[2, 4], [6], [8, 10, 12]]
+    assert batcher.batches_dispatched == 1 and batcher.requests_batched == 3
+
+
+def test_bad_input_fails_only_its_own_request():
+    results, batcher = run_requests([[1, 2], [-1], [4, 5, 6]])
+    assert results[0] == [2, 4] and results[2] == [8, 10, 12]
+    assert isinstance(results[1], ValueError)
+    assert batcher.batches_split == 1
+
+
+def test_single_request_failure_is_raised():
+    results, batcher = run_requests([[-1]])
+    assert isinstance(results[0], ValueError) and batcher.batches_split == 0
+
+
+@pytest.mark.parametrize("field, value", [
+    ("hour_of_day", 24), ("hour_of_day", -1),
+    ("trains_in_section_hour", -1), ("trains_in_section_hour", MAX_TRAINS_IN_SECTION_HOUR + 1), ("trains_in_section_hour", 10 ** 400),
+])
+def test_train_info_rejects_out_of_range_numbers(field, value):
+    with pytest.raises(ValidationError):
+        TrainInfo(**{field: value})
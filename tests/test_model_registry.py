@@ -0,0 +1,62 @@
+"""
+ModelRegistry versioning by MODEL_MANIFEST_FILE: a model set is only loaded once the manifest
+written after all of its files says so, never while a training run is replacing them.
+"""
+import os
+
+import joblib
+import pytest
+
+from model_registry import MODEL_FILES, MODEL_MANIFEST_FILE, ModelRegistry, dump_model, write_model_manifest
+
+
+def write_models(directory, generation, names=MODEL_FILES):
+    """Stand-in model files: plain dicts recording which training run wrote them."""
+    for name in names:
+        dump_model({'name': name, 'generation': generation}, os.path.join(directory, MODEL_FILES[name]))
+
+
+def generations(model_set):
+    return {model_set[name]['generation'] for name in MODEL_FILES}
+
+
+@pytest.fixture
+def registry(tmp_path):
+    write_models(tmp_path, 1)
+    write_model_manifest(tmp_path)
+    registry = ModelRegistry(model_dir=str(tmp_path))
+    registry.load()
+    return registry
+
+
+def test_half_written_model_set_is_not_picked_up(registry, tmp_path):
+    serving_version = registry.current()['version']
+    # A training run has replaced the delay model and encoder, but not the others yet
+    write_models(tmp_path, 2, names=['delay', 'encoder'])
+
+    assert registry.fingerprint() == serving_version
+    assert registry.reload_if_changed() is None
+    with pytest.raises(RuntimeError):
+        registry.load()
+    assert generations(registry.current()) == {1}
+
+
+def test_complete_model_set_is_loaded_once_its_manifest_is_written(registry, tmp_path):
+    write_models(tmp_path, 2)
+    assert registry.reload_if_changed() is None
+
+    version = write_model_manifest(tmp_path)
+
+    assert registry.reload_if_changed() == version
+    assert generations(registry.current()) == {2}
+
+
+def test_directory_without_manifest_falls_back_to_file_stats(tmp_path):
+    write_models(tmp_path, 1)
+    registry = ModelRegistry(model_dir=str(tmp_path))
+    first_version = registry.load()
+    write_models(tmp_path, 2, names=['delay'])
+
+    assert not os.path.exists(tmp_path / MODEL_MANIFEST_FILE)
+    assert registry.reload_if_changed() not in (None, first_version)
+    assert joblib.load(tmp_path / MODEL_FILES['delay'])['generation'] == registry.current()['delay']['generation'] == 2
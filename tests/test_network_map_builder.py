@@ -0,0 +1,61 @@
+"""
+The streaming network map build (network_map_builder.create_network_map_streaming) against the
+in-memory build on the synthetic fixtures in benchmarks.fixtures, with chunks small enough that
+records and numbers are cut at every possible position.
+"""
+import json
+
+import pytest
+
+from benchmarks.fixtures import write_synthetic_dataset
+from network_map_builder import create_network_map_from_kaggle_data, iter_json_records
+
+CHUNK_SIZES = [1, 7, 64]
+
+
+@pytest.fixture(scope="module")
+def dataset(tmp_path_factory):
+    """Fixture files and the map the in-memory build makes of them: (directory, records, network_map)."""
+    directory = tmp_path_factory.mktemp("kaggle")
+    write_synthetic_dataset(str(directory), num_trains=60, seed=3)
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.chdir(directory)
+        create_network_map_from_kaggle_data()
+    return directory, json.loads((directory / "schedules.json").read_text()), read_map(directory)
+
+
+def read_map(directory):
+    """network_map.json as [(station, neighbours)], so neighbour order and station order both count."""
+    with open(directory / "network_map.json") as f: return list(json.load(f).items())
+
+
+def write_ndjson(path, records):
+    with open(path, "w", encoding="utf-8") as f:
+        for record in records: f.write(json.dumps(record) + "\n")
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+@pytest.mark.parametrize("layout", ["array", "ndjson"])
+def test_streamed_map_matches_in_memory_map(dataset, tmp_path, monkeypatch, layout, chunk_size):
+    directory, records, in_memory_map = dataset
+    for name in ("trains.json", "network_map.json"):
+        (tmp_path / name).write_text((directory / name).read_text())
+    if layout == "array":
+        (tmp_path / "schedules.json").write_text(json.dumps(records, indent=1))
+    else:
+        write_ndjson(tmp_path / "schedules.json", records)
+    monkeypatch.chdir(tmp_path)
+
+    create_network_map_from_kaggle_data(streaming=True, chunk_size=chunk_size)
+
+    assert in_memory_map and read_map(tmp_path) == in_memory_map
+
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+def test_iter_json_records_yields_every_record(tmp_path, chunk_size):
+    records = [{"id": 12345, "name": "A [\"quoted\"], {braces}"}, [1.5e-3, None, True], -7, "None", {}]
+    (tmp_path / "records.json").write_text(" \n" + json.dumps(records) + "\n")
+    write_ndjson(tmp_path / "records.ndjson", records)
+
+    assert list(iter_json_records(tmp_path / "records.json", chunk_size)) == records
+    assert list(iter_json_records(tmp_path / "records.ndjson", chunk_size)) == records
@@ -0,0 +1,154 @@
+"""
+Warm-start retraining (train_and_serve.retrain_from_logs) on small models trained from the
+synthetic fixtures in benchmarks.fixtures, in a throwaway working directory.
+"""
+import json
+import os
+import random
+import shutil
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+import train_and_serve as service
+from benchmarks.fixtures import write_synthetic_dataset
+from model_registry import COMPILED_MODEL_FILE, MODEL_FILES
+
+LOG_ROWS = 300
+
+
+@pytest.fixture(scope="module")
+def trained_dir(tmp_path_factory):
+    """A working directory with fixture data and models trained on 60 simulated journeys."""
+    directory = tmp_path_factory.mktemp("trained")
+    write_synthetic_dataset(str(directory), num_trains=60)
+    original_cwd = os.getcwd()
+    os.chdir(directory)
+    try:
+        random.seed(0)
+        np.random.seed(0)
+        service.train_all_models(60, cpu_budget=1)
+    finally:
+        os.chdir(original_cwd)
+    return directory
+
+
+@pytest.fixture
+def workdir(trained_dir, tmp_path, monkeypatch):
+    """A fresh copy of the trained directory as the working directory."""
+    directory = tmp_path / "work"
+    shutil.copytree(trained_dir, directory)
+    monkeypatch.chdir(directory)
+    return directory
+
+
+def simulated_rows():
+    """LOG_ROWS simulated journey rows: features with the delay and congestion that happened."""
+    with open("network_map.json") as f: network_map = json.load(f)
+    random.seed(1)
+    return service.simulate_realistic_data(network_map, LOG_ROWS // 5 + 1, 5).head(LOG_ROWS)
+
+
+def write_prediction_log(with_outcomes):
+    """Writes LOG_ROWS rows to the prediction CSV the way the API logs them, optionally with observed outcomes."""
+    simulated = simulated_rows()
+    log = simulated[['train_number', 'track_section', 'day_of_week', 'hour_of_day', 'weather_condition', 'trains_in_section_hour']].assign(
+        predicted_delay_minutes=10.0, predicted_congestion_level="Low", is_anomaly=False,
+        train_type_used=simulated['train_type'], recommended_speed_action="MAINTAIN_SPEED",
+    )
+    if with_outcomes:
+        log['actual_delay_minutes'] = simulated['delay_minutes']
+        log['actual_congestion_level'] = simulated['congestion_level']
+    log.to_csv(service.PREDICTIONS_CSV_FILE, index=False)
+
+
+def saved_state():
+    with open(service.RETRAIN_STATE_FILE) as f: return json.load(f)
+
+
+def test_offset_advances_when_compiled_export_fails(workdir, monkeypatch):
+    write_prediction_log(with_outcomes=True)
+
+    def failing_export(model_set, X_check, anomaly_check):
+        raise RuntimeError("simulated export failure")
+    monkeypatch.setattr(service, "export_compiled_models", failing_export)
+
+    with pytest.raises(RuntimeError):
+        service.retrain_from_logs(cpu_budget=1, min_rows=100)
+
+    assert saved_state()['csv_offset'] == os.path.getsize(service.PREDICTIONS_CSV_FILE)
+    # The next run does not train on the same rows again
+    rounds = joblib.load(MODEL_FILES['delay']).booster_.num_trees()
+    service.retrain_from_logs(cpu_budget=1, min_rows=100)
+    assert joblib.load(MODEL_FILES['delay']).booster_.num_trees() == rounds
+
+
+def test_compile_failure_removes_stale_export(workdir, monkeypatch):
+    write_prediction_log(with_outcomes=True)
+    assert os.path.exists(COMPILED_MODEL_FILE)
+
+    def failing_compile(model_set):
+        raise ValueError("simulated compile failure")
+    monkeypatch.setattr(service, "compile_models", failing_compile)
+
+    service.retrain_from_logs(cpu_budget=1, min_rows=100)
+
+    assert not os.path.exists(COMPILED_MODEL_FILE)
+    assert saved_state()['rows'] == LOG_ROWS
+
+
+def test_posted_observations_are_retrained_on(workdir):
+    simulated = simulated_rows()
+    observations = [{
+        'train_number': str(row.train_number), 'track_section': row.track_section, 'day_of_week': row.day_of_week,
+        'hour_of_day': int(row.hour_of_day), 'weather_condition': row.weather_condition, 'trains_in_section_hour': int(row.trains_in_section_hour),
+        'actual_delay_minutes': float(row.delay_minutes), 'actual_congestion_level': row.congestion_level,
+    } for row in simulated.itertuples()]
+    with TestClient(service.app) as client:
+        for start in range(0, LOG_ROWS, 100):
+            assert client.post("/observations", json={'observations': observations[start:start + 100]}).json() == {'recorded': 100}
+        assert client.post("/observations", json={'observations': [{**observations[0], 'actual_congestion_level': "Gridlock"}]}).status_code == 422
+    rounds = joblib.load(MODEL_FILES['delay']).booster_.num_trees()
+
+    service.retrain_from_logs(cpu_budget=1, delay_rounds=5, min_rows=100)
+
+    assert saved_state()['rows'] == LOG_ROWS
+    assert saved_state()['observations_offset'] == os.path.getsize(service.OBSERVATIONS_CSV_FILE)
+    assert joblib.load(MODEL_FILES['delay']).booster_.num_trees() == rounds + 5
+    # The same observations are not trained on twice
+    service.retrain_from_logs(cpu_budget=1, delay_rounds=5, min_rows=100)
+    assert joblib.load(MODEL_FILES['delay']).booster_.num_trees() == rounds + 5
+
+
+def test_log_without_outcomes_is_skipped(workdir):
+    write_prediction_log(with_outcomes=False)
+    model_mtimes = {name: os.stat(filename).st_mtime_ns for name, filename in MODEL_FILES.items()}
+
+    service.retrain_from_logs(cpu_budget=1, min_rows=100)
+
+    assert not os.path.exists(service.RETRAIN_STATE_FILE)
+    assert model_mtimes == {name: os.stat(filename).st_mtime_ns for name, filename in MODEL_FILES.items()}
+
+
+def test_log_without_outcomes_retrains_with_self_labels(workdir):
+    write_prediction_log(with_outcomes=False)
+    rounds = joblib.load(MODEL_FILES['delay']).booster_.num_trees()
+
+    service.retrain_from_logs(cpu_budget=1, delay_rounds=5, min_rows=100, allow_self_labels=True)
+
+    assert saved_state()['rows'] == LOG_ROWS
+    assert joblib.load(MODEL_FILES['delay']).booster_.num_trees() == rounds + 5
+
+
+def test_rows_without_outcomes_are_dropped():
+    logged = pd.DataFrame({
+        'train_type_used': ["Exp", "Exp", "Unknown"], 'track_section': ["SBC"] * 3, 'day_of_week': ["Monday"] * 3,
+        'weather_condition': ["Clear"] * 3, 'hour_of_day': [10] * 3, 'trains_in_section_hour': [5] * 3,
+        'predicted_delay_minutes': [12.0, 8.0, -1], 'predicted_congestion_level': ["Low", "High", "Unknown"],
+        'actual_delay_minutes': [15.0, np.nan, 3.0], 'actual_congestion_level': ["Medium", np.nan, "Low"],
+    })
+    assert service.logged_training_rows(logged)['delay_minutes'].tolist() == [15.0]
+    assert service.logged_training_rows(logged, allow_self_labels=True)['congestion_level'].tolist() == ["Medium", "High"]
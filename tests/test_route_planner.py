@@ -0,0 +1,81 @@
+"""
+RoutePlanner (route_planner.py): Yen's k shortest simple paths with A* spur searches, checked
+against exhaustive enumeration of every simple path on small random graphs, with node costs and
+heuristic built the way /plan_route builds them.
+"""
+import random
+
+import numpy as np
+import pytest
+
+from network_graph import network_map_to_csr
+from route_planner import RoutePlanner
+
+HOP_PENALTY = 1.0
+K = 6
+
+
+def random_network_map(rng, stations=9, edge_probability=0.3):
+    codes = [f"S{i}" for i in range(stations)]
+    return {code: [other for other in codes if other != code and rng.random() < edge_probability] for code in codes}
+
+
+def all_simple_paths(planner, source, target, node_cost):
+    """Every simple path from source to target through finite-cost stations, as (cost, path)."""
+    paths, stack = [], [(0.0, [source])]
+    while stack:
+        cost, path = stack.pop()
+        if path[-1] == target:
+            paths.append((cost, path))
+            continue
+        for neighbour in planner.neighbours[path[-1]]:
+            if neighbour not in path and node_cost[neighbour] != float('inf'):
+                stack.append((cost + node_cost[neighbour], path + [neighbour]))
+    return paths
+
+
+def plan(planner, source, target, max_detour_hops, integer_delays, rng):
+    """(node_cost, heuristic, k shortest paths), as /plan_route computes them for the corridor."""
+    corridor = planner.corridor(source, target, max_detour_hops)
+    if corridor is None: return None
+    corridor_stations, hops_to_target = corridor
+    node_cost = [float('inf')] * len(planner.codes)
+    for i in corridor_stations.tolist():
+        node_cost[i] = HOP_PENALTY + (rng.randrange(3) if integer_delays else rng.uniform(0, 20))
+    heuristic = (np.maximum(hops_to_target, 0) * HOP_PENALTY).tolist()
+    return node_cost, heuristic, planner.k_shortest_paths(source, target, node_cost, heuristic, K)
+
+
+@pytest.mark.parametrize("integer_delays", [False, True])
+@pytest.mark.parametrize("max_detour_hops", [0, 2, 100])
+@pytest.mark.parametrize("seed", range(15))
+def test_k_shortest_paths_match_exhaustive_enumeration(seed, max_detour_hops, integer_delays):
+    rng = random.Random(seed)
+    planner = RoutePlanner(*network_map_to_csr(random_network_map(rng)))
+    checked = 0
+    for source in range(len(planner.codes)):
+        for target in range(len(planner.codes)):
+            if source == target: continue
+            planned = plan(planner, source, target, max_detour_hops, integer_delays, rng)
+            if planned is None: continue
+            node_cost, _, paths = planned
+            expected = sorted(cost for cost, _ in all_simple_paths(planner, source, target, node_cost))
+
+            # Equal-cost paths may come out in either order, so the costs are compared, and each path on its own
+            assert [cost for cost, _ in paths] == pytest.approx(expected[:K])
+            assert len({tuple(path) for _, path in paths}) == len(paths)
+            for cost, path in paths:
+                assert path[0] == source and path[-1] == target and len(set(path)) == len(path)
+                assert all(b in planner.neighbours[a] for a, b in zip(path, path[1:]))
+                assert cost == pytest.approx(sum(node_cost[i] for i in path[1:]))
+            checked += 1
+    assert checked
+
+
+def test_search_is_deterministic():
+    rng = random.Random(0)
+    planner = RoutePlanner(*network_map_to_csr(random_network_map(rng, stations=12, edge_probability=0.4)))
+    node_cost = [HOP_PENALTY] * len(planner.codes)
+    heuristic = [0.0] * len(planner.codes)
+    first = planner.k_shortest_paths(0, 5, node_cost, heuristic, K)
+    assert all(planner.k_shortest_paths(0, 5, node_cost, heuristic, K) == first for _ in range(5))
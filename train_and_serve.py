@@ -3,60 +3,86 @@ import numpy as np
 import random
 from datetime import datetime
 import joblib
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel, Field
 from typing import List, Optional
 import uvicorn
 import lightgbm as lgb
 from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import OneHotEncoder, StandardScaler
+from sklearn.preprocessing import StandardScaler
 from sklearn.ensemble import RandomForestClassifier, IsolationForest
 from sklearn.metrics import mean_absolute_error, accuracy_score, classification_report, roc_auc_score
 import os
-import csv
 import json
+import asyncio
+import time
 from contextlib import asynccontextmanager
 from scipy.sparse import hstack
+from asset_cache import load_compiled_assets
+from prediction_logger import PredictionLogger, read_logged_rows
+from inference_executor import MicroBatcher, create_inference_executor
+from feature_encoder import FeatureEncoder
+from prediction_cache import PredictionCache
+from model_registry import COMPILED_MAX_ROWS, COMPILED_MODEL_FILE, MODEL_FILES, MODEL_MANIFEST_FILE, ModelRegistry, dump_model, private_memory_bytes, write_model_manifest
+from compiled_models import BatchSizeRouter, check_agreement, compile_models
+from training_pipeline import build_feature_matrix, run_concurrently, split_cpu_budget, warm_start_delay_model, warm_start_forest
+from network_graph import load_network, load_network_map, network_map_to_csr
+from route_planner import RoutePlanner
+from departure_sequencer import order_cost, sequence_departures
+from efficiency_report import REPORT_FORMATS, efficiency_report_batches, schedule_spans
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, MetricsRegistry
+from simulation_constants import SIM_DAYS, SIM_TRAIN_TYPES, SIM_WEATHER_CONDITIONS, SIM_WEATHER_IMPACT
 
 # --- PART 1: LARGE-SCALE DATA SIMULATION ---
-def simulate_realistic_data(network_map, num_trains=500, records_per_train=5):
+# The simulated condition values (SIM_TRAIN_TYPES, SIM_DAYS, ...) live in simulation_constants.py.
+
+def sr_swr_trains(trains_df):
+    """Numbers of the Southern / South Western Railway trains in the parsed trains.json."""
+    is_sr_swr = trains_df['zone'].isin(['SR', 'SWR']) & trains_df['number'].fillna('').astype(bool)
+    return trains_df.loc[is_sr_swr, 'number'].tolist()
+
+def load_simulation_inputs(num_trains):
     """
-    Generates a large, realistic dataset based on the real network map,
-    using real train numbers and their scheduled departure times.
+    SR/SWR train numbers to sample from, and a (train_number, station_code, departure_hour)
+    table of real scheduled departures. Falls back to generic numbers and no departures.
     """
-    print(f"Generating simulated data for {num_trains} trains...")
-    
-    stations = list(network_map.keys())
-    if not stations:
-        print("[Error] Network map is empty. Cannot generate data.")
-        return pd.DataFrame()
-
     print("  -> Loading trains.json and schedules.json for realistic simulation...")
     try:
-        with open('trains.json', 'r', encoding='utf-8') as f:
-            trains_data = json.load(f)
-        sr_swr_train_numbers = [
-            train['properties'].get('number')
-            for train in trains_data['features']
-            if train['properties'].get('zone') in ['SR', 'SWR'] and train['properties'].get('number')
-        ]
+        assets = load_compiled_assets(tables=('trains', 'schedules'))
+        sr_swr_train_numbers = sr_swr_trains(assets['trains'])
         
-        schedules_df = pd.read_json('schedules.json')
-        schedules_df['train_number'] = schedules_df['train_number'].astype(str)
+        schedules_df = assets['schedules']
         # Create a quick lookup for departure times
         schedules_df = schedules_df[schedules_df['departure'] != 'None']
         schedules_df['departure_hour'] = schedules_df['departure'].apply(lambda x: int(x.split(':')[0]))
-        departure_times = schedules_df.set_index(['train_number', 'station_code'])['departure_hour'].to_dict()
+        departure_hours = schedules_df[['train_number', 'station_code', 'departure_hour']]
 
         if not sr_swr_train_numbers: raise FileNotFoundError 
         print(f"  -> Found {len(sr_swr_train_numbers)} SR/SWR trains to use for simulation.")
     except Exception as e:
         print(f"  -> [Warning] Could not load Kaggle data for simulation. Using generic values. Error: {e}")
         sr_swr_train_numbers = [f"SR_SWR_{1000 + i}" for i in range(num_trains)]
-        departure_times = {}
+        departure_hours = pd.DataFrame(columns=['train_number', 'station_code', 'departure_hour'])
+    return sr_swr_train_numbers, departure_hours
+
+def simulate_realistic_data(network_map, num_trains=500, records_per_train=5):
+    """
+    Generates a large, realistic dataset based on the real network map,
+    using real train numbers and their scheduled departure times.
+    """
+    print(f"Generating simulated data for {num_trains} trains...")
+    
+    stations = list(network_map.keys())
+    if not stations:
+        print("[Error] Network map is empty. Cannot generate data.")
+        return pd.DataFrame()
+
+    sr_swr_train_numbers, departure_hours = load_simulation_inputs(num_trains)
+    departure_times = departure_hours.set_index(['train_number', 'station_code'])['departure_hour'].to_dict()
 
-    train_types = ["Express", "Passenger", "Goods", "Superfast"]
-    weather_conditions = ["Clear", "Rain", "Fog", "Storm", "Extreme Heat"]
+    train_types = SIM_TRAIN_TYPES
+    weather_conditions = SIM_WEATHER_CONDITIONS
     
     all_journeys = []
     
@@ -78,7 +104,7 @@ def simulate_realistic_data(network_map, num_trains=500, records_per_train=5):
         
         for section in journey:
             for _ in range(records_per_train):
-                day_of_week = random.choice(["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"])
+                day_of_week = random.choice(SIM_DAYS)
                 
                 # --- REALISTIC TIME SIMULATION ---
                 base_hour = departure_times.get((train_number, section), random.randint(0, 23))
@@ -91,8 +117,7 @@ def simulate_realistic_data(network_map, num_trains=500, records_per_train=5):
                 base_delay = 0
                 if 7 <= hour_of_day <= 10 or 17 <= hour_of_day <= 20: base_delay += random.uniform(5, 20)
                 if train_type == "Goods": base_delay += random.uniform(10, 30)
-                weather_impact = {"Clear": 1.0, "Rain": 1.3, "Fog": 1.9, "Storm": 2.8, "Extreme Heat": 1.4}
-                base_delay *= weather_impact.get(weather, 1)
+                base_delay *= SIM_WEATHER_IMPACT.get(weather, 1)
 
                 is_incident = 0
                 trains_in_section_hour = base_traffic + random.randint(-2, 2)
@@ -122,121 +147,487 @@ def simulate_realistic_data(network_map, num_trains=500, records_per_train=5):
     print(f"Simulated data with {len(df)} records saved to 'simulated_train_data.csv'")
     return df
 
+SIM_MAX_JOURNEY_STEPS = 25
+
+def _simulate_shard(shard_id, num_trains, records_per_train, seed_sequence, graph, train_codes, train_numbers, departure_keys, departure_values, output_dir):
+    """Simulates one shard of trains with its own RNG stream and writes it as one Parquet part."""
+    rng = np.random.default_rng(seed_sequence)
+    codes, indptr, indices, num_start_stations = graph
+
+    # Per-train draws: which real train, its type, journey length and base traffic.
+    train_pick = train_codes[rng.integers(len(train_codes), size=num_trains)]
+    train_type = rng.integers(len(SIM_TRAIN_TYPES), size=num_trains)
+    journey_len = rng.integers(5, SIM_MAX_JOURNEY_STEPS + 1, size=num_trains)
+    base_traffic = rng.integers(2, 9, size=num_trains)
+
+    # Random walks over the CSR graph, all trains advancing one step at a time.
+    path = np.full((num_trains, SIM_MAX_JOURNEY_STEPS + 1), -1, dtype=np.int64)
+    current = rng.integers(num_start_stations, size=num_trains)
+    path[:, 0] = current
+    walking = np.ones(num_trains, dtype=bool)
+    for step in range(1, SIM_MAX_JOURNEY_STEPS + 1):
+        degree = indptr[current + 1] - indptr[current]
+        walking &= (step <= journey_len) & (degree > 0)
+        if not walking.any(): break
+        offset = (rng.random(num_trains) * degree).astype(np.int64)
+        next_station = indices[np.minimum(indptr[current] + offset, len(indices) - 1)]
+        current = np.where(walking, next_station, current)
+        path[walking, step] = current[walking]
+
+    # One row per (train, section, record).
+    train_of_row, step_of_row = np.nonzero(path >= 0)
+    train_of_row, section = np.repeat(train_of_row, records_per_train), np.repeat(path[train_of_row, step_of_row], records_per_train)
+    n = len(section)
+    train = train_pick[train_of_row]
+
+    day_of_week = rng.integers(len(SIM_DAYS), size=n)
+    departure_key = train * len(codes) + section
+    position = np.minimum(np.searchsorted(departure_keys, departure_key), max(len(departure_keys) - 1, 0))
+    has_departure = (departure_keys[position] == departure_key) if len(departure_keys) else np.zeros(n, dtype=bool)
+    base_hour = np.where(has_departure, departure_values[position] if len(departure_keys) else 0, rng.integers(0, 24, size=n))
+    hour_of_day = (base_hour + rng.integers(-1, 2, size=n)) % 24
+    weather = rng.integers(len(SIM_WEATHER_CONDITIONS), size=n)
+
+    is_peak = ((7 <= hour_of_day) & (hour_of_day <= 10)) | ((17 <= hour_of_day) & (hour_of_day <= 20))
+    is_goods = np.asarray(SIM_TRAIN_TYPES)[train_type[train_of_row]] == "Goods"
+    base_delay = np.where(is_peak, rng.uniform(5, 20, size=n), 0.0) + np.where(is_goods, rng.uniform(10, 30, size=n), 0.0)
+    base_delay *= np.array([SIM_WEATHER_IMPACT[w] for w in SIM_WEATHER_CONDITIONS])[weather]
+
+    trains_in_section_hour = base_traffic[train_of_row] + rng.integers(-2, 3, size=n)
+    is_incident = rng.random(n) < 0.02
+    base_delay += np.where(is_incident, rng.uniform(180, 300, size=n), 0.0)
+    trains_in_section_hour = np.where(is_incident, 1, trains_in_section_hour)
+
+    delay_minutes = np.maximum(0, base_delay + rng.normal(0, 5, size=n))
+    noisy_traffic = trains_in_section_hour + rng.integers(-1, 2, size=n)
+    congestion = np.select([noisy_traffic > 7, noisy_traffic > 3], ["High", "Medium"], "Low")
+
+    df = pd.DataFrame({
+        "train_number": train_numbers[train], "train_type": np.asarray(SIM_TRAIN_TYPES)[train_type[train_of_row]],
+        "track_section": codes[section], "day_of_week": np.asarray(SIM_DAYS)[day_of_week], "hour_of_day": hour_of_day,
+        "weather_condition": np.asarray(SIM_WEATHER_CONDITIONS)[weather], "is_incident": is_incident.astype(int),
+        "delay_minutes": np.round(delay_minutes, 2), "trains_in_section_hour": trains_in_section_hour,
+        "congestion_level": congestion,
+    })
+    path = os.path.join(output_dir, f"part-{shard_id:05d}.parquet")
+    df.to_parquet(path, index=False)
+    return path, len(df)
+
+def simulate_realistic_data_vectorized(network_map, num_trains=500, records_per_train=5, seed=42,
+                                       trains_per_shard=10_000, num_workers=1, output_dir="simulated_train_data"):
+    """
+    NumPy version of simulate_realistic_data for multi-million-row training sets: the same
+    distributions, drawn as whole arrays (random walks over an index graph, batched weather,
+    incident and delay draws). Trains are split into fixed-size shards, each with its own
+    seeded RNG stream, so the output depends only on `seed` and never on `num_workers`.
+    Writes one Parquet part per shard into output_dir and returns the list of part paths.
+    """
+    print(f"Generating simulated data for {num_trains} trains (vectorized, {num_workers} worker(s))...")
+    if not network_map:
+        print("[Error] Network map is empty. Cannot generate data.")
+        return []
+
+    train_numbers_list, departure_hours = load_simulation_inputs(num_trains)
+    codes, indptr, indices = network_map_to_csr(network_map)
+    train_numbers, train_codes = np.unique(np.asarray(train_numbers_list, dtype=object).astype(str), return_inverse=True)
+    train_numbers = train_numbers.astype(object)
+
+    # Scheduled departure hour per (train, station) as a sorted integer key for searchsorted lookups.
+    departure_train = pd.Index(train_numbers).get_indexer(departure_hours['train_number'])
+    departure_station = pd.Index(codes).get_indexer(departure_hours['station_code'])
+    known = (departure_train >= 0) & (departure_station >= 0)
+    departure_table = pd.Series(
+        departure_hours['departure_hour'].to_numpy()[known],
+        index=departure_train[known].astype(np.int64) * len(codes) + departure_station[known],
+    )
+    departure_table = departure_table[~departure_table.index.duplicated(keep='last')].sort_index()
+    departure_keys, departure_values = departure_table.index.to_numpy(), departure_table.to_numpy()
+
+    os.makedirs(output_dir, exist_ok=True)
+    for stale_part in os.listdir(output_dir):
+        if stale_part.startswith("part-") and stale_part.endswith(".parquet"): os.remove(os.path.join(output_dir, stale_part))
+
+    shard_sizes = [min(trains_per_shard, num_trains - start) for start in range(0, num_trains, trains_per_shard)]
+    seeds = np.random.SeedSequence(seed).spawn(len(shard_sizes))
+    graph = (codes, indptr, indices, len(network_map))
+    shard_args = [
+        (shard_id, size, records_per_train, seeds[shard_id], graph, train_codes, train_numbers, departure_keys, departure_values, output_dir)
+        for shard_id, size in enumerate(shard_sizes)
+    ]
+    if num_workers > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=num_workers) as pool:
+            results = list(pool.map(_simulate_shard, *zip(*shard_args)))
+    else:
+        results = [_simulate_shard(*args) for args in shard_args]
+
+    print(f"Simulated data with {sum(rows for _, rows in results)} records saved to '{output_dir}' ({len(results)} Parquet parts)")
+    return [path for path, _ in results]
+
 # --- PART 2: MODEL TRAINING & EVALUATION ---
-def train_all_models():
+# Threads the three models may use together while training, split between them by split_cpu_budget.
+TRAINING_CPU_BUDGET = int(os.environ.get("TRAINING_CPU_BUDGET", os.cpu_count() or 1))
+# Warm-start retrains (--warm-start): boosting rounds added to the delay model, forest trees
+# replaced by trees grown on the new rows, and the fewest new logged rows worth retraining on.
+WARM_START_DELAY_ROUNDS = int(os.environ.get("WARM_START_DELAY_ROUNDS", 20))
+WARM_START_FOREST_TREES = int(os.environ.get("WARM_START_FOREST_TREES", 20))
+WARM_START_MIN_ROWS = int(os.environ.get("WARM_START_MIN_ROWS", 200))
+# How far into the prediction log the last warm-start retrain read.
+RETRAIN_STATE_FILE = "retrain_state.json"
+ANOMALY_FEATURES = ['delay_minutes', 'trains_in_section_hour']
+
+def train_all_models(num_trains=500, records_per_train=5, vectorized=False, num_workers=1, cpu_budget=TRAINING_CPU_BUDGET):
+    """
+    vectorized=True generates the training set with simulate_realistic_data_vectorized
+    (sharded across num_workers processes) instead of the row-by-row simulator.
+    The feature matrix and its train/test split are built once for both supervised models,
+    and the three models train concurrently within cpu_budget threads.
+    """
     try:
-        with open("network_map.json", "r") as f: network_map = json.load(f)
+        network_map = load_network_map()
     except FileNotFoundError:
         print("\n--- CRITICAL ERROR --- \n'network_map.json' not found. Please run '1_build_map_from_kaggle.py' first.")
         return
 
-    df = simulate_realistic_data(network_map)
+    if vectorized:
+        parts = simulate_realistic_data_vectorized(network_map, num_trains, records_per_train, num_workers=num_workers)
+        df = pd.concat([pd.read_parquet(part) for part in parts], ignore_index=True) if parts else pd.DataFrame()
+    else:
+        df = simulate_realistic_data(network_map, num_trains, records_per_train)
     if df.empty: return
 
     print("\n--- Starting Supervised Model Training & Evaluation ---")
-    
-    features = ['train_type', 'track_section', 'day_of_week', 'hour_of_day', 'weather_condition', 'trains_in_section_hour']
-    categorical_features = ['train_type', 'track_section', 'day_of_week', 'weather_condition']
-    X = df[features]
+    X_processed, encoder = build_feature_matrix(df, CAT_FEATURES, NUM_FEATURES)
+    # One split for both supervised models (the same rows the former per-model splits drew)
+    X_train, X_test, y_train, y_test, y_train_c, y_test_c = train_test_split(
+        X_processed, df['delay_minutes'], df['congestion_level'], test_size=0.2, random_state=42
+    )
 
-    encoder = OneHotEncoder(handle_unknown='ignore', sparse_output=True).fit(X[categorical_features])
-    X_encoded_sparse = encoder.transform(X[categorical_features])
-    
-    X_numerical = X.drop(columns=categorical_features).values
-    X_processed = hstack([X_numerical, X_encoded_sparse])
+    max_workers, n_jobs = split_cpu_budget(cpu_budget)
+    print(f"\n--- Training Delay, Congestion & Anomaly Models (CPU budget {cpu_budget}: {n_jobs['delay']} / {n_jobs['congestion']} / {n_jobs['anomaly']} threads) ---")
+    def train_anomaly_model():
+        scaler = StandardScaler().fit(df[ANOMALY_FEATURES])
+        return scaler, IsolationForest(random_state=42, n_jobs=n_jobs['anomaly']).fit(scaler.transform(df[ANOMALY_FEATURES]))
+    trained = run_concurrently({
+        'delay': lambda: lgb.LGBMRegressor(random_state=42, n_jobs=n_jobs['delay']).fit(X_train, y_train),
+        'congestion': lambda: RandomForestClassifier(random_state=42, n_jobs=n_jobs['congestion']).fit(X_train, y_train_c),
+        'anomaly': train_anomaly_model,
+    }, max_workers)
+    print("  -> Training time: " + ", ".join(f"{name} {seconds:.1f}s" for name, (_, seconds) in trained.items()))
+    lgbm, rf, (scaler, if_anomaly) = (trained[name][0] for name in ('delay', 'congestion', 'anomaly'))
 
-    print("\n--- Training Delay Prediction Model ---")
-    X_train, X_test, y_train, y_test = train_test_split(X_processed, df['delay_minutes'], test_size=0.2, random_state=42)
-    lgbm = lgb.LGBMRegressor(random_state=42).fit(X_train, y_train)
+    # All evaluation happens before the first file is replaced, so the files change in one short burst
     print(f"  -> Delay Model MAE: {mean_absolute_error(y_test, lgbm.predict(X_test)):.2f} minutes")
-    joblib.dump(lgbm, "delay_predictor_model.pkl")
-    joblib.dump(encoder, "data_encoder.pkl")
-    print("  -> Delay model and encoder saved.")
-
-    print("\n--- Training Congestion Prediction Model ---")
-    X_train_c, X_test_c, y_train_c, y_test_c = train_test_split(X_processed, df['congestion_level'], test_size=0.2, random_state=42)
-    rf = RandomForestClassifier(random_state=42, n_jobs=-1).fit(X_train_c, y_train_c)
-    print(f"  -> Congestion Model Accuracy: {accuracy_score(y_test_c, rf.predict(X_test_c)):.2%}")
-    joblib.dump(rf, "congestion_model.pkl")
-    print("  -> Congestion model saved.")
-
-    print("\n--- Training Anomaly Detection Model ---")
-    features_anomaly = ['delay_minutes', 'trains_in_section_hour']
-    scaler = StandardScaler().fit(df[features_anomaly])
-    X_anomaly_scaled = scaler.transform(df[features_anomaly])
-    if_anomaly = IsolationForest(random_state=42).fit(X_anomaly_scaled)
+    print(f"  -> Congestion Model Accuracy: {accuracy_score(y_test_c, rf.predict(X_test)):.2%}")
     if len(df['is_incident'].unique()) > 1:
-        scores = if_anomaly.decision_function(X_anomaly_scaled)
+        scores = if_anomaly.decision_function(scaler.transform(df[ANOMALY_FEATURES]))
         print(f"  -> Anomaly Model AUC: {roc_auc_score(df['is_incident'], scores * -1):.2f}")
-    joblib.dump(if_anomaly, "anomaly_model.pkl")
-    joblib.dump(scaler, "anomaly_scaler.pkl")
-    print("  -> Anomaly model and scaler saved.")
+
+    model_set = {'delay': lgbm, 'encoder': encoder, 'congestion': rf, 'anomaly': if_anomaly, 'scaler': scaler}
+    for name, filename in MODEL_FILES.items(): dump_model(model_set[name], filename)
+    print("  -> Delay model, encoder, congestion model, anomaly model and scaler saved.")
+
+    export_compiled_models(model_set, X_test, df[ANOMALY_FEATURES])
+    # Written last: serving processes only pick up a model set once its manifest exists
+    print(f"  -> Model set {write_model_manifest()} recorded in {MODEL_MANIFEST_FILE}.")
     print("\n--- Models Trained & Evaluated Successfully ---")
 
+def export_compiled_models(model_set, X_check, anomaly_check):
+    """
+    Compiles the saved models and writes COMPILED_MODEL_FILE if they agree with the originals
+    on the check rows. Runs after the model files were replaced, so it never raises: on any
+    failure the previous export is removed and the API serves the originals.
+    """
+    print("\n--- Exporting Compiled Inference Models ---")
+    try:
+        model_set = dict(model_set)
+        prepare_model_set(model_set)
+        compiled = compile_models(model_set)
+        report = check_agreement(model_set, compiled, X_check, anomaly_check)
+        for name in ('congestion', 'anomaly'):
+            print(
+                f"  -> {name}: {report[f'{name}_original_bytes'] / 1e6:.1f} MB pickled -> {report[f'{name}_compiled_bytes'] / 1e6:.1f} MB of compiled arrays, "
+                f"1 row {report[f'{name}_original_row_ms']:.2f} -> {report[f'{name}_compiled_row_ms']:.2f} ms, "
+                f"{report['batch_rows']} rows {report[f'{name}_original_batch_ms']:.2f} -> {report[f'{name}_compiled_batch_ms']:.2f} ms"
+            )
+        if report['agrees']:
+            dump_model({'source_version': model_registry.source_fingerprint(), 'models': compiled}, COMPILED_MODEL_FILE)
+            print(f"  -> Compiled models agree with the originals on {report['rows']} test rows; saved to {COMPILED_MODEL_FILE}.")
+            return
+        print(f"  -> [Warning] Compiled models disagree with the originals ({report['congestion_mismatches']} congestion, "
+              f"{report['anomaly_mismatches']} anomaly rows); not exported, the API will serve the originals.")
+    except Exception as e:
+        print(f"  -> [Warning] Could not compile the models ({e}); the API will serve the originals.")
+    remove_compiled_export()
+
+def remove_compiled_export():
+    """Deletes a COMPILED_MODEL_FILE left from earlier models, so no registry can serve it alongside the new ones."""
+    if os.path.exists(COMPILED_MODEL_FILE):
+        os.remove(COMPILED_MODEL_FILE)
+        print(f"  -> Removed the stale {COMPILED_MODEL_FILE}.")
+
+def logged_training_rows(logged, allow_self_labels=False):
+    """
+    Training rows from logged predictions and observations: the logged features, labelled with
+    the observed actual_delay_minutes / actual_congestion_level. Rows without both are dropped,
+    unless allow_self_labels, which fills the missing labels from the logged predictions instead
+    (the models then mostly relearn their own errors). Rows whose prediction failed are dropped.
+    """
+    if logged.empty: return pd.DataFrame(columns=CAT_FEATURES + NUM_FEATURES + ['delay_minutes', 'congestion_level'])
+    df = logged.rename(columns={'train_type_used': 'train_type'})
+    for column in ('actual_delay_minutes', 'actual_congestion_level', 'predicted_delay_minutes', 'predicted_congestion_level'):
+        if column not in df: df[column] = np.nan
+    df['delay_minutes'] = df['actual_delay_minutes']
+    df['congestion_level'] = df['actual_congestion_level']
+    if allow_self_labels:
+        df['delay_minutes'] = df['delay_minutes'].fillna(df['predicted_delay_minutes'])
+        df['congestion_level'] = df['congestion_level'].fillna(df['predicted_congestion_level'])
+    usable = (df['train_type'] != "Unknown") & (df['congestion_level'] != "Unknown") & df['delay_minutes'].notna() & df['congestion_level'].notna()
+    return df.loc[usable, CAT_FEATURES + NUM_FEATURES + ['delay_minutes', 'congestion_level']].reset_index(drop=True)
+
+def retrain_from_logs(cpu_budget=TRAINING_CPU_BUDGET, delay_rounds=WARM_START_DELAY_ROUNDS, forest_trees=WARM_START_FOREST_TREES, min_rows=WARM_START_MIN_ROWS, allow_self_labels=False):
+    """
+    Warm-start retrain on the predictions and observations (POST /observations) logged since
+    the previous one (tracked in RETRAIN_STATE_FILE) instead of simulating and training from
+    scratch: the delay model gets
+    delay_rounds more boosting rounds and the congestion forest swaps its forest_trees oldest
+    trees for trees grown on the new rows. The encoder, scaler and anomaly model are kept.
+    Only rows with observed outcomes are used unless allow_self_labels (see logged_training_rows).
+    """
+    state = {}
+    if os.path.exists(RETRAIN_STATE_FILE):
+        with open(RETRAIN_STATE_FILE) as f: state = json.load(f)
+    predicted, csv_offset = read_logged_rows(PREDICTIONS_CSV_FILE, state.get('csv_offset', 0))
+    observed, observations_offset = read_logged_rows(OBSERVATIONS_CSV_FILE, state.get('observations_offset', 0))
+    logged = pd.concat([rows for rows in (predicted, observed) if not rows.empty] or [pd.DataFrame()], ignore_index=True)
+    df = logged_training_rows(logged, allow_self_labels)
+    print(f"\n--- Warm-Start Retraining on {len(df)} New Logged Rows ({len(observed)} observations) ---")
+    if allow_self_labels:
+        print("  -> [Warning] Logged predictions fill in missing observed outcomes; the models will reinforce their own errors.")
+    elif not logged.empty and not {'actual_delay_minutes', 'actual_congestion_level'} <= set(logged.columns):
+        print("  -> [Warning] The logs have no observed outcomes (actual_delay_minutes / actual_congestion_level; post them to "
+              "/observations), so there is nothing to learn from; keeping the current models. Use --allow-self-labels to retrain "
+              "on the logged predictions anyway.")
+        return
+    if len(df) < min_rows:
+        print(f"  -> Fewer than {min_rows} new rows with observed outcomes; keeping the current models.")
+        return
+
+    try:
+        model_set = {name: joblib.load(filename) for name, filename in MODEL_FILES.items()}
+    except FileNotFoundError as e:
+        print(f"\n--- CRITICAL ERROR --- \n'{e.filename}' not found. Run a full training first.")
+        return
+    X_processed, _ = build_feature_matrix(df, CAT_FEATURES, NUM_FEATURES, encoder=model_set['encoder'])
+    X_train, X_test, y_train, y_test, y_train_c, y_test_c = train_test_split(
+        X_processed, df['delay_minutes'], df['congestion_level'], test_size=0.2, random_state=42
+    )
+    # Scored before training: the forest is warm-started in place
+    mae_before = mean_absolute_error(y_test, model_set['delay'].predict(X_test))
+    accuracy_before = accuracy_score(y_test_c, model_set['congestion'].predict(X_test))
+
+    max_workers, n_jobs = split_cpu_budget(cpu_budget)
+    def retrain_congestion_model():
+        try:
+            return warm_start_forest(model_set['congestion'], X_train, y_train_c, forest_trees, n_jobs['congestion'])
+        except ValueError as e:
+            print(f"  -> [Warning] Congestion model kept as it is: {e}")
+            return None
+    trained = run_concurrently({
+        'delay': lambda: warm_start_delay_model(model_set['delay'], X_train, y_train, delay_rounds, n_jobs['delay']),
+        'congestion': retrain_congestion_model,
+    }, min(max_workers, 2))
+    print("  -> Training time: " + ", ".join(f"{name} {seconds:.1f}s" for name, (_, seconds) in trained.items()))
+
+    model_set['delay'] = trained['delay'][0]
+    print(f"  -> Delay Model MAE on new rows: {mae_before:.2f} -> {mean_absolute_error(y_test, model_set['delay'].predict(X_test)):.2f} minutes")
+    if trained['congestion'][0] is not None:
+        print(f"  -> Congestion Model Accuracy on new rows: {accuracy_before:.2%} -> {accuracy_score(y_test_c, model_set['congestion'].predict(X_test)):.2%}")
+    dump_model(model_set['delay'], MODEL_FILES['delay'])
+    if trained['congestion'][0] is not None: dump_model(model_set['congestion'], MODEL_FILES['congestion'])
+    print("  -> Retrained models saved.")
+    # Recorded as soon as the new models are live, so a later failure never retrains the same rows twice
+    with open(f"{RETRAIN_STATE_FILE}.tmp", "w") as f:
+        json.dump({'csv_offset': csv_offset, 'observations_offset': observations_offset, 'rows': len(df), 'retrained_at': datetime.now().isoformat(timespec='seconds')}, f)
+    os.replace(f"{RETRAIN_STATE_FILE}.tmp", RETRAIN_STATE_FILE)
+
+    anomaly_check = pd.DataFrame({'delay_minutes': df['delay_minutes'], 'trains_in_section_hour': df['trains_in_section_hour']})
+    try:
+        export_compiled_models(model_set, X_test, anomaly_check)
+    finally:
+        print(f"  -> Model set {write_model_manifest()} recorded in {MODEL_MANIFEST_FILE}.")
+    print("\n--- Warm-Start Retraining Complete ---")
+
 # --- PART 3: API SERVICE ---
 PREDICTIONS_CSV_FILE = "api_predictions.csv"
+# Observed outcomes posted to /observations: complete training rows for --warm-start retraining
+OBSERVATIONS_CSV_FILE = "api_observations.csv"
+# Optional columnar sink for the prediction log, e.g. PREDICTIONS_PARQUET_DIR=api_predictions_parquet
+PREDICTIONS_PARQUET_DIR = os.environ.get("PREDICTIONS_PARQUET_DIR") or None
+PREDICTION_LOG_FLUSH_ROWS = int(os.environ.get("PREDICTION_LOG_FLUSH_ROWS", 500))
+PREDICTION_LOG_FLUSH_SECONDS = float(os.environ.get("PREDICTION_LOG_FLUSH_SECONDS", 2.0))
+# Prometheus-style latency metrics, served at /metrics. With INFERENCE_EXECUTOR=process the model
+# stages run (and are timed) inside the worker processes, so only the thread executor reports them here.
+metrics = MetricsRegistry()
+stage_seconds = metrics.histogram("railway_api_stage_seconds", "Time spent in each prediction stage.", "stage")
+request_seconds = metrics.histogram("railway_api_request_seconds", "Request latency by endpoint.", "path")
+prediction_logger = PredictionLogger(
+    PREDICTIONS_CSV_FILE, parquet_dir=PREDICTIONS_PARQUET_DIR,
+    flush_rows=PREDICTION_LOG_FLUSH_ROWS, flush_seconds=PREDICTION_LOG_FLUSH_SECONDS,
+    on_flush=lambda row_count, seconds: stage_seconds.observe("log_flush", seconds),
+)
+observation_logger = PredictionLogger(OBSERVATIONS_CSV_FILE, flush_rows=PREDICTION_LOG_FLUSH_ROWS, flush_seconds=PREDICTION_LOG_FLUSH_SECONDS)
+# Model inference runs on its own pool: "thread" shares this process's models, "process" loads a copy per worker.
+INFERENCE_EXECUTOR = os.environ.get("INFERENCE_EXECUTOR", "thread")
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", min(4, os.cpu_count() or 1)))
+# Requests arriving within this window are scored together in one model pass (0 disables micro-batching).
+MICRO_BATCH_WINDOW_MS = float(os.environ.get("MICRO_BATCH_WINDOW_MS", 2.0))
+MICRO_BATCH_MAX_ROWS = int(os.environ.get("MICRO_BATCH_MAX_ROWS", 256))
+# Bounded LRU of predictions keyed on the resolved feature tuple (0 disables it).
+PREDICTION_CACHE_SIZE = int(os.environ.get("PREDICTION_CACHE_SIZE", 50_000))
+# Poll the model files and hot-reload them when a retrain replaces them (0 disables the watcher).
+MODEL_WATCH_INTERVAL_SECONDS = float(os.environ.get("MODEL_WATCH_INTERVAL_SECONDS", 0))
+# "compiled" serves the compiled congestion / anomaly models exported by train_all_models (see
+# compiled_models.py) when they match the model files; "sklearn" always loads the originals.
+MODEL_RUNTIME = os.environ.get("MODEL_RUNTIME", "compiled")
+# The compiled models only answer batches up to this many rows; larger ones (/predict/batch, merged
+# micro-batches) go to the originals, where the compiled walk is slower. A worker loads the
+# originals on its first larger batch, so workers serving single rows never pay their memory.
+# 0 serves every batch compiled and never loads the originals.
+COMPILED_MODEL_MAX_ROWS = int(os.environ.get("COMPILED_MODEL_MAX_ROWS", COMPILED_MAX_ROWS))
+# Route planning cost per station entered, on top of its predicted delay; keeps shorter routes ahead on ties.
+ROUTE_HOP_PENALTY_MINUTES = float(os.environ.get("ROUTE_HOP_PENALTY_MINUTES", 1.0))
+# Upper bound accepted for trains_in_section_hour; the simulator never goes past a few dozen
+MAX_TRAINS_IN_SECTION_HOUR = 1000
+# Trains per delay-model call in /efficiency_report and --efficiency-report
+EFFICIENCY_REPORT_BATCH_TRAINS = int(os.environ.get("EFFICIENCY_REPORT_BATCH_TRAINS", 1000))
 TRACK_NETWORK_MAP = {}
 models = {}
+micro_batcher = None
+prediction_cache = PredictionCache(PREDICTION_CACHE_SIZE)
+
+def build_schedule_index(schedules_df):
+    """
+    Builds the per-train lookup used on the request path: train number -> stations in
+    departure order, NumPy arrays of arrival/departure minutes, and a station -> position
+    map. Stops are ordered exactly as sort_values('departure_minutes') orders them.
+    """
+    arrival_all = schedules_df['arrival_minutes'].to_numpy(dtype=float)
+    departure_all = schedules_df['departure_minutes'].to_numpy(dtype=float)
+    station_all = schedules_df['station_code'].to_numpy(dtype=object)
+
+    schedule_index = {}
+    for train_number, rows in schedules_df.groupby('train_number', sort=False).indices.items():
+        rows = rows[np.argsort(departure_all[rows], kind='quicksort')]
+        stations = station_all[rows].tolist()
+        schedule_index[train_number] = {
+            'stations': stations,
+            'arrival_minutes': arrival_all[rows],
+            'departure_minutes': departure_all[rows],
+            'positions': {station: i for i, station in enumerate(stations)},
+        }
+    return schedule_index
+
+def prepare_model_set(model_set):
+    try:
+        model_set['feature_encoder'] = FeatureEncoder(model_set['encoder'], CAT_FEATURES, NUM_FEATURES)
+    except ValueError as e:
+        print(f"  -> [Warning] Precompiled feature encoder unavailable, using OneHotEncoder.transform: {e}")
+        model_set['feature_encoder'] = None
+
+model_registry = ModelRegistry(prepare=prepare_model_set, runtime=MODEL_RUNTIME, compiled_max_rows=COMPILED_MODEL_MAX_ROWS or None)
+model_registry.add_swap_listener(lambda new_set, old_set: prediction_cache.invalidate())
+
+def load_api_assets():
+    global TRACK_NETWORK_MAP
+    # network_graph.npz when it is current, so startup does not parse the JSON map
+    TRACK_NETWORK_MAP, models['network_graph'] = load_network()
+    models['route_planner'] = RoutePlanner(*models['network_graph'])
+    
+    print("  -> Loading compiled trains.json / schedules.json assets...")
+    # The raw 'schedules' table is never used here, so it is not loaded.
+    assets = load_compiled_assets(tables=('trains', 'clean_schedules'))
+    train_map = dict(zip(assets['trains']['number'], assets['trains']['type']))
+    models['train_map'] = train_map
+    models['sr_swr_trains'] = sr_swr_trains(assets['trains'])
+    
+    schedules_df = assets['clean_schedules']
+    models['schedules_df'] = schedules_df
+    models['schedule_index'] = build_schedule_index(schedules_df)
+    print(f"  -> Loaded details for {len(train_map)} trains and {len(schedules_df)} valid schedule entries.")
+
+    model_registry.load()
+
+def _init_inference_process():
+    """Process-pool initializer: gives each inference worker the models and train-type map."""
+    if 'train_map' not in models:
+        trains_df = load_compiled_assets(tables=('trains',))['trains']
+        models['train_map'] = dict(zip(trains_df['number'], trains_df['type']))
+    if model_registry.current() is None: model_registry.load()
+
+def _recycle_inference_processes(new_set, old_set):
+    """Process workers hold their own model copies, so a swap starts a fresh pool; the old one drains its queued batches."""
+    if old_set is None or micro_batcher is None or INFERENCE_EXECUTOR != "process": return
+    old_executor = micro_batcher.executor
+    micro_batcher.executor = create_inference_executor(INFERENCE_EXECUTOR, INFERENCE_WORKERS, initializer=_init_inference_process)
+    old_executor.shutdown(wait=False)
+
+model_registry.add_swap_listener(_recycle_inference_processes)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global TRACK_NETWORK_MAP
+    global micro_batcher
     print("[API] Loading models and network map...")
     try:
-        with open("network_map.json", 'r') as f: TRACK_NETWORK_MAP = json.load(f)
-        
-        print("  -> Loading train number to type map from trains.json...")
-        with open('trains.json', 'r', encoding='utf-8') as f:
-            trains_data = json.load(f)
-        train_map = {
-            train['properties']['number']: train['properties'].get('type', 'Express')
-            for train in trains_data['features'] if 'number' in train['properties']
-        }
-        models['train_map'] = train_map
-        
-        print("  -> Loading and cleaning schedules.json for efficiency calculations...")
-        schedules_df = pd.read_json('schedules.json')
-        schedules_df['train_number'] = schedules_df['train_number'].astype(str)
-        
-        def time_to_minutes(row, column):
-            time_str = row[column]
-            day = row['day']
-            if time_str == 'None' or pd.isna(day): return np.nan
-            try:
-                parts = time_str.split(':')
-                return ((day - 1) * 1440) + (int(parts[0]) * 60) + int(parts[1])
-            except (ValueError, AttributeError): return np.nan
-
-        schedules_df['arrival_minutes'] = schedules_df.apply(time_to_minutes, column='arrival', axis=1)
-        schedules_df['departure_minutes'] = schedules_df.apply(time_to_minutes, column='departure', axis=1)
-
-        schedules_df['departure_minutes'] = schedules_df.groupby('train_number')['departure_minutes'].transform(lambda x: x.ffill())
-        schedules_df['arrival_minutes'] = schedules_df.groupby('train_number')['arrival_minutes'].transform(lambda x: x.bfill())
-        
-        schedules_df['arrival_minutes'].fillna(schedules_df['departure_minutes'], inplace=True)
-        schedules_df['departure_minutes'].fillna(schedules_df['arrival_minutes'], inplace=True)
-        
-        schedules_df.dropna(subset=['arrival_minutes', 'departure_minutes'], inplace=True)
-        models['schedules_df'] = schedules_df
-        print(f"  -> Loaded details for {len(train_map)} trains and {len(schedules_df)} valid schedule entries.")
-
-        models['delay'] = joblib.load("delay_predictor_model.pkl")
-        models['encoder'] = joblib.load("data_encoder.pkl")
-        models['congestion'] = joblib.load("congestion_model.pkl")
-        models['anomaly'] = joblib.load("anomaly_model.pkl")
-        models['scaler'] = joblib.load("anomaly_scaler.pkl")
+        # Loading is blocking file/CPU work, so keep it off the event loop.
+        await asyncio.to_thread(load_api_assets)
         print("[API] All assets loaded successfully.")
     except FileNotFoundError as e:
         print(f"[API CRITICAL] Asset file not found: {e.filename}. Run training script first.")
+
+    executor = create_inference_executor(INFERENCE_EXECUTOR, INFERENCE_WORKERS, initializer=_init_inference_process)
+    micro_batcher = MicroBatcher(score_batch, executor, window_seconds=MICRO_BATCH_WINDOW_MS / 1000, max_rows=MICRO_BATCH_MAX_ROWS)
+    print(f"  -> Inference executor: {INFERENCE_EXECUTOR} x {INFERENCE_WORKERS}, micro-batch window {MICRO_BATCH_WINDOW_MS} ms.")
+    model_registry.start_watcher(MODEL_WATCH_INTERVAL_SECONDS)
     yield
+    model_registry.stop_watcher()
+    executor, micro_batcher = micro_batcher.executor, None
+    executor.shutdown()
+    prediction_logger.close()
+    observation_logger.close()
     print("[API] Application shutdown.")
 
 app = FastAPI(title="Railway Efficiency & Prediction API", lifespan=lifespan)
 
+@app.middleware("http")
+async def time_requests(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    # Label by route template, not the raw URL, so unknown paths cannot grow the series without bound.
+    route = request.scope.get("route")
+    request_seconds.observe(route.path if route is not None else "unmatched", time.perf_counter() - start)
+    return response
+
+def collect_service_metrics():
+    cache = prediction_cache.stats()
+    batcher = micro_batcher
+    return [
+        ("railway_api_prediction_cache_hits_total", "counter", "Prediction cache hits.", cache['hits']),
+        ("railway_api_prediction_cache_misses_total", "counter", "Prediction cache misses.", cache['misses']),
+        ("railway_api_prediction_cache_evictions_total", "counter", "Prediction cache evictions.", cache['evictions']),
+        ("railway_api_prediction_cache_entries", "gauge", "Predictions currently cached.", cache['entries']),
+        ("railway_api_prediction_log_queued_rows", "gauge", "Prediction log rows waiting for the writer.", prediction_logger.queued_rows()),
+        ("railway_api_prediction_log_dropped_rows_total", "counter", "Prediction log rows dropped on a full queue.", prediction_logger.dropped_rows),
+        ("railway_api_micro_batches_total", "counter", "Model batches dispatched by the micro-batcher.", batcher.batches_dispatched if batcher else 0),
+        ("railway_api_micro_batched_requests_total", "counter", "Requests merged into micro-batches.", batcher.requests_batched if batcher else 0),
+    ]
+
+metrics.add_collector(collect_service_metrics)
+
 class TrainInfo(BaseModel):
     train_number: str = "12613"; track_section: str = "SBC"
-    day_of_week: str = "Monday"; hour_of_day: int = 10
-    weather_condition: str = "Clear"; trains_in_section_hour: int = 5
+    day_of_week: str = "Monday"; hour_of_day: int = Field(10, ge=0, le=23)
+    weather_condition: str = "Clear"; trains_in_section_hour: int = Field(5, ge=0, le=MAX_TRAINS_IN_SECTION_HOUR)
 
 class RouteRequest(BaseModel):
     route: List[str] = Field(..., example=["SBC", "KGI", "MYS"]); train_info: TrainInfo
@@ -244,102 +635,289 @@ class RouteRequest(BaseModel):
 class DepartureRequest(BaseModel):
     conflicting_train_1: TrainInfo; conflicting_train_2: TrainInfo; next_section: str
 
-def get_full_prediction(info: TrainInfo):
-    train_type = models.get('train_map', {}).get(info.train_number, "Express")
-    prediction_input = {**info.model_dump(), 'train_type': train_type}
-    input_df = pd.DataFrame([prediction_input])
-    
-    cat_features = ['train_type', 'track_section', 'day_of_week', 'weather_condition']
-    num_features = ['hour_of_day', 'trains_in_section_hour']
+class BatchPredictionRequest(BaseModel):
+    trains: List[TrainInfo]
+
+class Observation(TrainInfo):
+    actual_delay_minutes: float = Field(..., ge=-1440, le=1440, allow_inf_nan=False)
+    actual_congestion_level: str = Field(..., pattern="^(Low|Medium|High)$")
+
+class ObservationRequest(BaseModel):
+    observations: List[Observation] = Field(..., min_length=1)
+
+class RoutePlanRequest(BaseModel):
+    origin: str = Field(..., example="SBC"); destination: str = Field(..., example="MYS"); train_info: TrainInfo
+    k: int = Field(3, ge=1, le=10); max_detour_hops: int = Field(6, ge=0, le=30)
+
+class SequencingRequest(BaseModel):
+    trains: List[TrainInfo] = Field(..., min_length=1, max_length=50); next_section: str
+    beam_width: int = Field(64, ge=1, le=1024)
+
+class EfficiencyReportRequest(BaseModel):
+    train_numbers: Optional[List[str]] = None; train_types: Optional[List[str]] = None
+    day_of_week: str = "Monday"; weather_condition: str = "Clear"; trains_in_section_hour: int = Field(5, ge=0, le=MAX_TRAINS_IN_SECTION_HOUR)
+    hour_of_day: Optional[int] = Field(None, ge=0, le=23, description="Leave empty to use each stop's scheduled departure hour.")
+    format: str = Field("ndjson", pattern="^(ndjson|parquet)$")
+
+CAT_FEATURES = ['train_type', 'track_section', 'day_of_week', 'weather_condition']
+NUM_FEATURES = ['hour_of_day', 'trains_in_section_hour']
+
+def encode_features(input_rows, model_set):
+    """Model input matrix for a batch of feature dicts, via the precompiled encoder when available."""
+    feature_encoder = model_set.get('feature_encoder')
+    if feature_encoder is not None: return feature_encoder.encode(input_rows)
+    return encode_feature_frame(pd.DataFrame(input_rows), model_set)
+
+def encode_feature_frame(input_df, model_set):
+    """encode_features for a DataFrame of feature columns, for bulk jobs."""
+    feature_encoder = model_set.get('feature_encoder')
+    if feature_encoder is not None: return feature_encoder.encode_frame(input_df)
+    return hstack([input_df[NUM_FEATURES].values, model_set['encoder'].transform(input_df[CAT_FEATURES])])
+
+def score_batch(infos: List[TrainInfo], model_set=None):
+    """
+    Scores many sections at once: one encoder pass, one sparse matrix and a single
+    call to each model for the whole batch. The whole batch uses one model set, even
+    if a reload swaps in a new one meanwhile. Raises if any row cannot be scored.
+    """
+    if not infos: return []
+    model_set = model_set or model_registry.current()
+    train_map = models.get('train_map', {})
+    train_types = [train_map.get(info.train_number, "Express") for info in infos]
+    input_rows = [{**info.model_dump(), 'train_type': train_type} for info, train_type in zip(infos, train_types)]
+    with stage_seconds.time("encode"):
+        processed_sparse = encode_features(input_rows, model_set)
+
+    with stage_seconds.time("delay"):
+        predicted_delays = np.round(model_set['delay'].predict(processed_sparse), 2)
+    with stage_seconds.time("congestion"):
+        predicted_congestions = model_set['congestion'].predict(processed_sparse)
+
+    with stage_seconds.time("anomaly"):
+        anomaly_features = pd.DataFrame({'delay_minutes': predicted_delays, 'trains_in_section_hour': [info.trains_in_section_hour for info in infos]})
+        anomaly_scaled = model_set['scaler'].transform(anomaly_features)
+        anomalies = model_set['anomaly'].predict(anomaly_scaled) == -1
+
+    return [
+        {"predicted_delay_minutes": delay, "predicted_congestion_level": congestion, "is_anomaly": bool(is_anomaly), "train_type_used": train_type}
+        for delay, congestion, is_anomaly, train_type in zip(predicted_delays, predicted_congestions, anomalies, train_types)
+    ]
+
+def failed_predictions(count):
+    return [{"predicted_delay_minutes": -1, "predicted_congestion_level": "Unknown", "is_anomaly": False, "train_type_used": "Unknown"} for _ in range(count)]
+
+def get_batch_predictions(infos: List[TrainInfo], model_set=None):
+    """
+    score_batch, with placeholder rows ("Unknown" congestion) instead of an exception when the
+    batch cannot be scored. Row i of the result matches get_full_prediction(infos[i]).
+    """
     try:
-        encoded_cats_sparse = models['encoder'].transform(input_df[cat_features])
-        numerical_vals = input_df[num_features].values
-        processed_sparse = hstack([numerical_vals, encoded_cats_sparse])
+        return score_batch(infos, model_set)
+    except Exception as e:
+        print(f"[Prediction Error] Could not process input: {e}")
+        return failed_predictions(len(infos))
 
-        predicted_delay = round(models['delay'].predict(processed_sparse)[0], 2)
-        predicted_congestion = models['congestion'].predict(processed_sparse)[0]
-        
-        anomaly_features = pd.DataFrame([[predicted_delay, info.trains_in_section_hour]], columns=['delay_minutes', 'trains_in_section_hour'])
-        anomaly_scaled = models['scaler'].transform(anomaly_features)
-        
-        is_anomaly = bool(models['anomaly'].predict(anomaly_scaled)[0] == -1)
-        
-        return {"predicted_delay_minutes": predicted_delay, "predicted_congestion_level": predicted_congestion, "is_anomaly": is_anomaly, "train_type_used": train_type}
+def get_full_prediction(info: TrainInfo):
+    return get_batch_predictions([info])[0]
+
+def get_batch_delays(infos: List[TrainInfo], model_set=None):
+    """
+    Delay model only, for searches that score many sections and need nothing else: the same
+    predicted_delay_minutes as get_batch_predictions, without the congestion and anomaly
+    models that dominate its cost. Returns a float array, or None if prediction failed.
+    """
+    model_set = model_set or model_registry.current()
+    train_map = models.get('train_map', {})
+    input_rows = [{**info.model_dump(), 'train_type': train_map.get(info.train_number, "Express")} for info in infos]
+    try:
+        with stage_seconds.time("encode"):
+            processed_sparse = encode_features(input_rows, model_set)
+        with stage_seconds.time("delay"):
+            return np.round(model_set['delay'].predict(processed_sparse), 2)
     except Exception as e:
         print(f"[Prediction Error] Could not process input: {e}")
-        return {"predicted_delay_minutes": -1, "predicted_congestion_level": "Unknown", "is_anomaly": False, "train_type_used": "Unknown"}
+        return None
+
+def get_frame_delays(input_df, model_set=None):
+    """get_batch_delays for a DataFrame of feature columns; errors are raised, not swallowed."""
+    model_set = model_set or model_registry.current()
+    with stage_seconds.time("encode"):
+        processed_sparse = encode_feature_frame(input_df, model_set)
+    with stage_seconds.time("delay"):
+        return np.round(model_set['delay'].predict(processed_sparse), 2)
+
+async def predict_delays_async(infos: List[TrainInfo]):
+    """Awaitable get_batch_delays on the inference executor."""
+    if micro_batcher is None: return get_batch_delays(infos)
+    return await asyncio.get_running_loop().run_in_executor(micro_batcher.executor, get_batch_delays, infos)
+
+def prediction_cache_key(info: TrainInfo):
+    train_type = models.get('train_map', {}).get(info.train_number, "Express")
+    return (train_type, info.track_section, info.day_of_week, info.hour_of_day, info.weather_condition, info.trains_in_section_hour)
+
+async def predict_batch_async(infos: List[TrainInfo]):
+    """
+    Awaitable get_batch_predictions. Rows already in the prediction cache are answered from it;
+    the rest run on the inference executor, merged with concurrent requests.
+    """
+    keys = [prediction_cache_key(info) for info in infos]
+    results, generation = prediction_cache.get_many(keys)
+    misses = [i for i, cached in enumerate(results) if cached is None]
+    if not misses: return results
+
+    miss_infos = [infos[i] for i in misses]
+    if micro_batcher is None:
+        fresh = get_batch_predictions(miss_infos)
+    else:
+        # A merged batch that fails is re-scored per request, so only this request's own rows can fail here
+        try:
+            fresh = await micro_batcher.predict(miss_infos)
+        except Exception as e:
+            print(f"[Prediction Error] Could not process input: {e}")
+            fresh = failed_predictions(len(miss_infos))
+    # Failed predictions come back as placeholder rows; never cache those.
+    cacheable = [(keys[i], p) for i, p in zip(misses, fresh) if p['predicted_congestion_level'] != "Unknown"]
+    prediction_cache.put_many([key for key, _ in cacheable], [p for _, p in cacheable], generation)
+    for i, predictions in zip(misses, fresh): results[i] = predictions
+    return results
 
 def log_prediction_to_csv(info: TrainInfo, predictions: dict):
-    log_data = {**info.model_dump(), **predictions}
-    fieldnames, file_exists = list(log_data.keys()), os.path.isfile(PREDICTIONS_CSV_FILE)
-    with open(PREDICTIONS_CSV_FILE, mode='a', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        if not file_exists: writer.writeheader()
-        writer.writerow(log_data)
+    with stage_seconds.time("logging"):
+        prediction_logger.log({**info.model_dump(), **predictions})
 
-@app.post("/predict/all", summary="Get comprehensive prediction for a single train section")
-def predict_all(info: TrainInfo):
-    if not models: return {"error": "Models not loaded."}
-    predictions = get_full_prediction(info)
-    speed_action = "MAINTAIN_SPEED"
+def recommend_speed_action(predictions: dict):
     if predictions['predicted_delay_minutes'] > 15 and predictions['predicted_congestion_level'] == 'Low':
-        speed_action = "INCREASE_SPEED"
+        return "INCREASE_SPEED"
     elif predictions['predicted_congestion_level'] == 'High':
-        speed_action = "DECREASE_SPEED"
-    predictions['recommended_speed_action'] = speed_action
+        return "DECREASE_SPEED"
+    return "MAINTAIN_SPEED"
+
+@app.post("/predict/all", summary="Get comprehensive prediction for a single train section")
+async def predict_all(info: TrainInfo):
+    if model_registry.current() is None: return {"error": "Models not loaded."}
+    predictions = (await predict_batch_async([info]))[0]
+    predictions['recommended_speed_action'] = recommend_speed_action(predictions)
     log_prediction_to_csv(info, predictions)
     return predictions
 
+@app.post("/predict/batch", summary="Get comprehensive predictions for many train sections in one model pass")
+async def predict_batch(req: BatchPredictionRequest):
+    if model_registry.current() is None: return {"error": "Models not loaded."}
+    all_predictions = await predict_batch_async(req.trains)
+    for info, predictions in zip(req.trains, all_predictions):
+        predictions['recommended_speed_action'] = recommend_speed_action(predictions)
+        log_prediction_to_csv(info, predictions)
+    return {"predictions": all_predictions}
+
+@app.post("/observations", summary="Record observed delays and congestion levels for warm-start retraining")
+async def record_observations(req: ObservationRequest):
+    # The train type is resolved as the predictions resolve it, so the rows train on the features the models see
+    train_map = models.get('train_map', {})
+    for observation in req.observations:
+        observation_logger.log({**observation.model_dump(), 'train_type_used': train_map.get(observation.train_number, "Express")})
+    return {"recorded": len(req.observations)}
+
+@app.get("/admin/models", summary="Serving model version and reload history")
+def model_versions():
+    current = model_registry.current()
+    private_bytes = private_memory_bytes()
+    return {
+        "serving_version": current['version'] if current else None, "runtime": current['runtime'] if current else None,
+        # Models served compiled with their originals loaded for large batches (by this worker)
+        "originals_loaded": {name: model.original is not None for name, model in (current or {}).items() if isinstance(model, BatchSizeRouter)},
+        "private_memory_mb": None if private_bytes is None else round(private_bytes / 1e6, 1),
+        "history": model_registry.history,
+    }
+
+@app.post("/admin/models/reload", summary="Load the model files on disk in the background and swap them in")
+async def reload_models(force: bool = False):
+    try:
+        version = await asyncio.to_thread(model_registry.load if force else model_registry.reload_if_changed)
+    except Exception as e:
+        return {"error": f"Reload failed, still serving the previous models: {e}"}
+    current = model_registry.current()
+    return {"reloaded": version is not None, "serving_version": current['version'] if current else None}
+
+@app.get("/cache/stats", summary="Prediction cache size and hit/miss/eviction counters")
+def cache_stats():
+    return prediction_cache.stats()
+
+@app.get("/metrics", summary="Prometheus-style stage and request latency metrics")
+def metrics_endpoint():
+    return Response(metrics.render(), media_type=METRICS_CONTENT_TYPE)
+
 @app.post("/propose_reroute", summary="Get best alternative route to avoid congestion/delay")
-def propose_reroute(info: TrainInfo):
+async def propose_reroute(info: TrainInfo):
     if not TRACK_NETWORK_MAP: return {"error": "Network map not loaded."}
     current_section = info.track_section
     alt_sections = TRACK_NETWORK_MAP.get(current_section, [])
     if not alt_sections: return {"message": "No alternative routes available."}
-    results = []
-    original_pred = get_full_prediction(info)
-    original_pred['route'] = f"{current_section} (Original)"
-    results.append(original_pred)
+    what_if_infos, route_labels = [info], [f"{current_section} (Original)"]
     for next_section in alt_sections:
         # FIX: Create a more realistic "what-if" scenario by varying traffic on alternatives
         what_if_info = info.model_copy(update={"track_section": next_section})
         what_if_info.trains_in_section_hour = max(1, info.trains_in_section_hour + random.choice([-2, -1, 0, 1]))
-        
-        predictions = get_full_prediction(what_if_info)
-        predictions['route'] = f"{current_section} -> {next_section}"
-        results.append(predictions)
+        what_if_infos.append(what_if_info)
+        route_labels.append(f"{current_section} -> {next_section}")
+
+    results = await predict_batch_async(what_if_infos)
+    for predictions, route_label in zip(results, route_labels):
+        predictions['route'] = route_label
     best_route = min(results, key=lambda x: x["predicted_delay_minutes"])
     return {"original_route_prediction": results[0], "best_alternative_route": best_route, "all_options_considered": results}
 
+@app.post("/plan_route", summary="Find the k lowest predicted-delay routes between two stations")
+async def plan_route(req: RoutePlanRequest):
+    planner = models.get('route_planner')
+    if planner is None: return {"error": "Network map not loaded."}
+    unknown = [code for code in (req.origin, req.destination) if code not in planner.code_index]
+    if unknown: return {"error": f"Unknown stations: {unknown}"}
+    origin, destination = planner.code_index[req.origin], planner.code_index[req.destination]
+    if origin == destination: return {"error": "Origin and destination are the same station."}
+
+    corridor = planner.corridor(origin, destination, req.max_detour_hops)
+    if corridor is None: return {"error": f"No route from {req.origin} to {req.destination} in the network map."}
+    corridor_stations, hops_to_destination = corridor
+
+    # One batched delay prediction for every station the search may enter: this train's features, that station's section
+    section_infos = [req.train_info.model_copy(update={'track_section': planner.codes[i]}) for i in corridor_stations.tolist()]
+    delays = await predict_delays_async(section_infos)
+    if delays is None: return {"error": "Model prediction failed for the route corridor."}
+    section_delays = dict(zip(corridor_stations.tolist(), np.maximum(delays, 0.0).tolist()))
+
+    node_cost = [float('inf')] * len(planner.codes)
+    for i, delay in section_delays.items(): node_cost[i] = ROUTE_HOP_PENALTY_MINUTES + delay
+    heuristic = (np.maximum(hops_to_destination, 0) * ROUTE_HOP_PENALTY_MINUTES).tolist()
+    paths = await asyncio.to_thread(planner.k_shortest_paths, origin, destination, node_cost, heuristic, req.k)
+
+    return {
+        "origin": req.origin, "destination": req.destination, "corridor_stations": len(section_infos),
+        "routes": [{
+            "stations": [planner.codes[i] for i in path],
+            "hops": len(path) - 1,
+            "predicted_delay_minutes": round(sum(section_delays[i] for i in path[1:]), 2),
+            "route_cost": round(cost, 2),
+        } for cost, path in paths],
+    }
+
 @app.post("/compare_efficiency", summary="Compare scheduled time vs. AI predicted time for a route")
-def compare_efficiency(req: RouteRequest):
-    if 'schedules_df' not in models: return {"error": "Schedules not loaded."}
-    
-    total_predicted_delay = 0
-    current_info = req.train_info.model_copy()
-    for section in req.route:
-        current_info.track_section = section
-        total_predicted_delay += get_full_prediction(current_info)['predicted_delay_minutes']
-    
-    schedules = models['schedules_df']
-    train_schedule = schedules[schedules['train_number'] == req.train_info.train_number].sort_values('departure_minutes').reset_index()
+async def compare_efficiency(req: RouteRequest):
+    if 'schedule_index' not in models: return {"error": "Schedules not loaded."}
+
+    train_schedule = models['schedule_index'].get(req.train_info.train_number)
+    station_indices = train_schedule['positions'] if train_schedule else {}
 
-    all_stations_in_schedule = set(train_schedule['station_code'])
-    if not set(req.route).issubset(all_stations_in_schedule):
-        missing_stations = list(set(req.route) - all_stations_in_schedule)
+    if not set(req.route).issubset(station_indices.keys()):
+        missing_stations = list(set(req.route) - station_indices.keys())
         return {"error": f"The following stations are not part of train {req.train_info.train_number}'s schedule: {missing_stations}"}
 
-    station_indices = {station: i for i, station in enumerate(train_schedule['station_code'])}
     route_indices = [station_indices.get(station) for station in req.route]
 
     if None in route_indices or not all(route_indices[i] < route_indices[i+1] for i in range(len(route_indices) - 1)):
         return {"error": "Invalid route. Stations are not in the correct chronological order for this train's schedule."}
 
-    start_station_info = train_schedule.iloc[route_indices[0]]
-    end_station_info = train_schedule.iloc[route_indices[-1]]
-
-    start_time_mins = start_station_info['departure_minutes']
-    end_time_mins = end_station_info['arrival_minutes']
+    start_time_mins = train_schedule['departure_minutes'][route_indices[0]]
+    end_time_mins = train_schedule['arrival_minutes'][route_indices[-1]]
 
     if pd.isna(start_time_mins) or pd.isna(end_time_mins):
         return {"error": "Incomplete schedule data for this specific route segment after cleaning."}
@@ -349,6 +927,9 @@ def compare_efficiency(req: RouteRequest):
     if scheduled_duration <= 0:
         return {"error": "Invalid route segment. Start and end stations might be the same or have data issues."}
 
+    section_infos = [req.train_info.model_copy(update={'track_section': section}) for section in req.route]
+    total_predicted_delay = sum(p['predicted_delay_minutes'] for p in await predict_batch_async(section_infos))
+
     predicted_duration = scheduled_duration + total_predicted_delay
     efficiency_score = round((scheduled_duration / predicted_duration) * 100, 2) if predicted_duration > 0 else 0
 
@@ -361,17 +942,45 @@ def compare_efficiency(req: RouteRequest):
         "insight": f"The AI predicts this journey will take ~{round(predicted_duration)} minutes, compared to the {scheduled_duration} minutes scheduled by the railway."
     }
 
+def efficiency_report(req: EfficiencyReportRequest, model_set=None):
+    """
+    /compare_efficiency over the whole timetable of every SR/SWR train matching the filters.
+    Returns (number of trains, generator of report DataFrames) with one model set for the
+    whole report; the trains are scored a batch at a time as the generator is consumed.
+    """
+    model_set = model_set or model_registry.current()
+    train_map = models['train_map']
+    train_numbers = models['sr_swr_trains']
+    if req.train_numbers is not None: train_numbers = sorted(set(train_numbers) & set(req.train_numbers))
+    if req.train_types is not None: train_numbers = [number for number in train_numbers if train_map.get(number, "Express") in req.train_types]
+
+    stops, trains = schedule_spans(models['schedules_df'], train_numbers)
+    trains['train_type'] = [train_map.get(number, "Express") for number in trains['train_number']]
+    conditions = req.model_dump(include={'day_of_week', 'weather_condition', 'trains_in_section_hour', 'hour_of_day'})
+    batches = efficiency_report_batches(stops, trains, lambda features: get_frame_delays(features, model_set), conditions, EFFICIENCY_REPORT_BATCH_TRAINS)
+    return len(trains), batches
+
+@app.post("/efficiency_report", summary="Scheduled vs. AI predicted time for every SR/SWR train, streamed as NDJSON or Parquet")
+async def efficiency_report_endpoint(req: EfficiencyReportRequest):
+    if model_registry.current() is None or 'schedules_df' not in models: return {"error": "Models or schedules not loaded."}
+    num_trains, batches = await asyncio.to_thread(efficiency_report, req)
+    if num_trains == 0: return {"error": "No SR/SWR trains with a complete schedule match the filters."}
+    encode_chunks, media_type = REPORT_FORMATS[req.format]
+    # A synchronous iterator, so Starlette runs each batch's prediction in its thread pool.
+    return StreamingResponse(encode_chunks(batches), media_type=media_type, headers={"X-Report-Trains": str(num_trains)})
+
 @app.post("/optimize_departure", summary="Recommend which of two trains should depart first")
-def optimize_departure(req: DepartureRequest):
+async def optimize_departure(req: DepartureRequest):
     info1_first = req.conflicting_train_1.model_copy(update={'track_section': req.next_section})
-    delay1_first = get_full_prediction(info1_first)['predicted_delay_minutes']
     info2_second = req.conflicting_train_2.model_copy(update={'track_section': req.next_section, 'trains_in_section_hour': req.conflicting_train_1.trains_in_section_hour + 1})
-    total_delay1 = delay1_first + get_full_prediction(info2_second)['predicted_delay_minutes']
-    
     info2_first = req.conflicting_train_2.model_copy(update={'track_section': req.next_section})
-    delay2_first = get_full_prediction(info2_first)['predicted_delay_minutes']
     info1_second = req.conflicting_train_1.model_copy(update={'track_section': req.next_section, 'trains_in_section_hour': req.conflicting_train_2.trains_in_section_hour + 1})
-    total_delay2 = delay2_first + get_full_prediction(info1_second)['predicted_delay_minutes']
+
+    delay1_first, delay2_second, delay2_first, delay1_second = (
+        p['predicted_delay_minutes'] for p in await predict_batch_async([info1_first, info2_second, info2_first, info1_second])
+    )
+    total_delay1 = delay1_first + delay2_second
+    total_delay2 = delay2_first + delay1_second
     
     train1_type = models.get('train_map', {}).get(req.conflicting_train_1.train_number)
     train2_type = models.get('train_map', {}).get(req.conflicting_train_2.train_number)
@@ -381,8 +990,70 @@ def optimize_departure(req: DepartureRequest):
     else:
         return {"recommendation": f"Train 2 ({train2_type}) should depart first.", "combined_delay": round(total_delay2, 2)}
 
+@app.post("/sequence_departures", summary="Order N conflicting trains to minimize their combined predicted delay")
+async def sequence_departures_endpoint(req: SequencingRequest):
+    trains, n = req.trains, len(req.trains)
+    # The optimize_departure rule for every pair: a train departing right after another sees that train's traffic + 1.
+    # Every (train, traffic) pair either table needs is scored once, in one batch.
+    scenarios = {(i, info.trains_in_section_hour) for i, info in enumerate(trains)}
+    scenarios |= {(j, trains[i].trains_in_section_hour + 1) for i in range(n) for j in range(n) if i != j}
+    scenarios = sorted(scenarios)
+    scenario_infos = [trains[j].model_copy(update={'track_section': req.next_section, 'trains_in_section_hour': traffic}) for j, traffic in scenarios]
+    delays = await predict_delays_async(scenario_infos)
+    if delays is None: return {"error": "Model prediction failed for the departure scenarios."}
+    delay_of = dict(zip(scenarios, delays.tolist()))
+
+    first_costs = np.array([delay_of[(i, info.trains_in_section_hour)] for i, info in enumerate(trains)])
+    follow_costs = np.array([[delay_of[(j, trains[i].trains_in_section_hour + 1)] if i != j else 0.0 for j in range(n)] for i in range(n)])
+    order, combined_delay, method = await asyncio.to_thread(sequence_departures, first_costs, follow_costs, req.beam_width)
+
+    train_map = models.get('train_map', {})
+    return {
+        "departure_order": [{
+            "position": position + 1, "train_index": i, "train_number": trains[i].train_number, "train_type": train_map.get(trains[i].train_number),
+            "predicted_delay_minutes": round(first_costs[i] if position == 0 else follow_costs[order[position - 1], i], 2),
+        } for position, i in enumerate(order)],
+        "combined_delay": round(combined_delay, 2),
+        "requested_order_combined_delay": round(order_cost(list(range(n)), first_costs, follow_costs), 2),
+        "method": method, "scenarios_scored": len(scenarios),
+    }
+
+def write_efficiency_report(path, req: EfficiencyReportRequest):
+    """CLI side of /efficiency_report: loads the API assets and writes the report to path batch by batch."""
+    print("--- Writing schedule efficiency report ---")
+    load_api_assets()
+    if model_registry.current() is None:
+        print("\n--- CRITICAL ERROR --- \nModels not loaded. Run training first.")
+        return
+    report_format = "parquet" if path.endswith(".parquet") else "ndjson"
+    num_trains, batches = efficiency_report(req.model_copy(update={'format': report_format}))
+    encode_chunks, _ = REPORT_FORMATS[report_format]
+    start = time.perf_counter()
+    with open(f"{path}.tmp", "wb") as f:
+        for chunk in encode_chunks(batches): f.write(chunk)
+    os.replace(f"{path}.tmp", path)
+    print(f"  -> {num_trains} trains written to {path} as {report_format} in {time.perf_counter() - start:.1f}s.")
+
 if __name__ == "__main__":
-    train_all_models()
+    import argparse
+    parser = argparse.ArgumentParser(description="Simulate training data and train the delay, congestion and anomaly models.")
+    parser.add_argument("--trains", type=int, default=500, help="Number of simulated train journeys.")
+    parser.add_argument("--records-per-train", type=int, default=5)
+    parser.add_argument("--vectorized", action="store_true", help="Use the NumPy simulator with chunked Parquet output.")
+    parser.add_argument("--workers", type=int, default=1, help="Processes for the vectorized simulator.")
+    parser.add_argument("--cpu-budget", type=int, default=TRAINING_CPU_BUDGET, help="Threads the three models may use together while training.")
+    parser.add_argument("--warm-start", action="store_true", help="Retrain the current models on the outcomes posted to /observations since the last run instead of from scratch.")
+    parser.add_argument("--allow-self-labels", action="store_true", help="With --warm-start, use the logged predictions as labels where no observed outcome was logged.")
+    parser.add_argument("--efficiency-report", metavar="PATH", help="Write the schedule efficiency report of every SR/SWR train to PATH (.parquet or NDJSON) instead of training.")
+    parser.add_argument("--report-trains", nargs="+", help="Only report these train numbers.")
+    args = parser.parse_args()
+    if args.efficiency_report:
+        write_efficiency_report(args.efficiency_report, EfficiencyReportRequest(train_numbers=args.report_trains))
+        raise SystemExit(0)
+    if args.warm_start:
+        retrain_from_logs(args.cpu_budget, allow_self_labels=args.allow_self_labels)
+    else:
+        train_all_models(args.trains, args.records_per_train, vectorized=args.vectorized, num_workers=args.workers, cpu_budget=args.cpu_budget)
     print("\n--- SETUP COMPLETE ---")
     print("To run the API server, execute this command:")
     print("uvicorn train_and_serve:app --reload")
@@ -0,0 +1,65 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import lightgbm as lgb
+import numpy as np
+from scipy.sparse import hstack
+from sklearn.preprocessing import OneHotEncoder
+
+# --- TRAINING PIPELINE ---
+# Building blocks for train_all_models: the sparse feature matrix is built once and shared by
+# the delay and congestion models, and the three models train concurrently on a thread pool
+# (LightGBM and the sklearn tree builders release the GIL) with their thread counts split
+# from one CPU budget, instead of each one assuming it owns the machine.
+# Warm starts extend the existing models with trees grown on new rows only, for retrains
+# that should not rebuild everything from scratch.
+
+def split_cpu_budget(cpu_budget):
+    """
+    Returns (concurrent jobs, {model: n_jobs}) for a budget of cpu_budget threads. The forest
+    is by far the slowest to train, so it gets what the others do not need; below three
+    cores the models share the budget by taking turns instead.
+    """
+    cpu_budget = max(1, int(cpu_budget))
+    if cpu_budget < 3: return cpu_budget, {'delay': 1, 'congestion': 1, 'anomaly': 1}
+    delay_jobs = max(1, cpu_budget // 4)
+    return 3, {'delay': delay_jobs, 'congestion': cpu_budget - delay_jobs - 1, 'anomaly': 1}
+
+def build_feature_matrix(df, cat_features, num_features, encoder=None):
+    """
+    CSR matrix [numerical features, one-hot categorical features], the layout every model
+    and FeatureEncoder expect. Fits a new OneHotEncoder unless one is given. Returns (X, encoder).
+    """
+    if encoder is None: encoder = OneHotEncoder(handle_unknown='ignore', sparse_output=True).fit(df[cat_features])
+    X = hstack([df[num_features].values, encoder.transform(df[cat_features])], format='csr')
+    return X, encoder
+
+def run_concurrently(jobs, max_workers):
+    """jobs: {name: callable()}. Returns {name: (result, seconds)}; the first exception is re-raised."""
+    def timed(job):
+        start = time.perf_counter()
+        return job(), time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="training") as pool:
+        futures = {name: pool.submit(timed, job) for name, job in jobs.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+def warm_start_delay_model(model, X, y, new_rounds, n_jobs=1):
+    """A LightGBM regressor that continues boosting `model` for new_rounds rounds on (X, y)."""
+    params = {**model.get_params(), 'n_estimators': new_rounds, 'n_jobs': n_jobs}
+    return lgb.LGBMRegressor(**params).fit(X, y, init_model=model.booster_)
+
+def warm_start_forest(forest, X, y, new_trees, n_jobs=1):
+    """
+    Grows new_trees trees on (X, y) and retires the same number of the oldest ones, so the
+    forest keeps its size while following the recent data. Modifies and returns `forest`.
+    The labels in y must be exactly the classes the forest already predicts.
+    """
+    labels = set(np.unique(y).tolist())
+    if labels != set(forest.classes_.tolist()):
+        raise ValueError(f"New rows have classes {sorted(labels)}, the forest predicts {forest.classes_.tolist()}.")
+    forest.set_params(warm_start=True, n_estimators=len(forest.estimators_) + new_trees, n_jobs=n_jobs)
+    forest.fit(X, y)
+    forest.estimators_ = forest.estimators_[new_trees:]
+    forest.set_params(warm_start=False, n_estimators=len(forest.estimators_))
+    return forest